@@ -0,0 +1,265 @@
+"""Request parsing and response shaping shared by server.py and async_server.py.
+
+Nothing here depends on the web framework: functions take the query string
+(``request.args``) or the decoded JSON body and return plain Python values.
+"""
+
+import base64
+import json
+import os
+from datetime import datetime
+
+# Keyset pagination
+PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 50))
+PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 500))
+
+
+def page_limit(args):
+    """Read the ?limit= query parameter clamped to [1, PAGE_SIZE_MAX]"""
+    limit = args.get('limit', PAGE_SIZE_DEFAULT, type=int)
+    return max(1, min(limit, PAGE_SIZE_MAX))
+
+
+def encode_cursor(sort_value, record_id):
+    """Build an opaque page token from the last row's (timestamp, id)"""
+    raw = json.dumps([sort_value.isoformat(), record_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Parse a page token into (timestamp, id); (None, None) for the first page"""
+    if not token:
+        return None, None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        sort_value, record_id = json.loads(raw)
+        return datetime.fromisoformat(sort_value), int(record_id)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+
+def encode_offset_cursor(offset):
+    """Build an opaque page token for offset-paginated (ranked) results"""
+    raw = json.dumps({'offset': offset}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_offset_cursor(token):
+    """Parse an offset page token; 0 for the first page"""
+    if not token:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        offset = int(json.loads(raw)['offset'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+    if offset < 0:
+        raise ValueError('Invalid cursor')
+    return offset
+
+
+def build_page(rows, limit, sort_key, id_key):
+    """Trim a limit+1 fetch to one page and attach the next-page token"""
+    items = rows[:limit]
+    next_token = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_token = encode_cursor(last[sort_key], last[id_key])
+    return {'items': items, 'next': next_token}
+
+
+def offset_page(rows, limit, offset):
+    """Trim a limit+1 fetch of ranked results and attach the next offset token"""
+    next_token = encode_offset_cursor(offset + limit) if len(rows) > limit else None
+    return {'items': rows[:limit], 'next': next_token}
+
+
+# JSON passthrough: list pages are serialized by the *_json procedures and
+# the items array goes into the response body as bytes, without building a
+# dict per row or re-encoding it (JSON_PASSTHROUGH=0 restores the row path)
+JSON_PASSTHROUGH = os.environ.get('JSON_PASSTHROUGH', '1') == '1'
+
+
+def json_page(items, next_token):
+    """Page body around an items array already serialized by the database"""
+    return b''.join((b'{"items":', items.encode(), b',"next":', json.dumps(next_token).encode(), b'}'))
+
+
+def build_json_page(row, sort_key, id_key):
+    """Page body from a keyset *_json procedure row (items, next_<sort>, next_<id>)"""
+    next_token = None
+    if row[id_key] is not None:
+        next_token = encode_cursor(row[sort_key], row[id_key])
+    return json_page(row['items'], next_token)
+
+
+def offset_json_page(row, limit, offset):
+    """Page body from a search_tracks_ranked_json row (items, has_more)"""
+    return json_page(row['items'], encode_offset_cursor(offset + limit) if row['has_more'] else None)
+
+
+# Delta sync of the track list: GET /api/tracks/changes?since=<cursor>.
+# More changes than this since the cursor make the client reload the list.
+TRACK_CHANGES_MAX = int(os.environ.get('TRACK_CHANGES_MAX', 1000))
+
+
+def encode_sync_cursor(xid):
+    """Build an opaque sync token from the snapshot xmin returned by get_track_changes"""
+    raw = json.dumps({'xid': xid}).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_sync_cursor(token):
+    """Parse a sync token; None when absent (the client has nothing cached)"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        xid = int(json.loads(raw)['xid'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+    if xid < 0:
+        raise ValueError('Invalid cursor')
+    return xid
+
+
+def changes_body(row):
+    """Response body from a get_track_changes row; upserted/deleted are JSON from the database"""
+    return b''.join((
+        b'{"cursor":', json.dumps(encode_sync_cursor(row['sync_cursor'])).encode(),
+        b',"deleted":', row['deleted'].encode(),
+        b',"reset":', json.dumps(row['reset']).encode(),
+        b',"upserted":', row['upserted'].encode(), b'}'
+    ))
+
+
+# Track search
+TRACK_FILTER_PARAMS = ('title', 'artist', 'genre_id', 'bpm', 'bpm_min', 'bpm_max',
+                       'duration', 'duration_min', 'duration_max')
+
+
+def has_track_filters(args):
+    return any(args.get(name) for name in TRACK_FILTER_PARAMS)
+
+
+# Largest value of a PostgreSQL INTEGER parameter
+INT_MAX = 2 ** 31 - 1
+
+
+def int_param(args, name):
+    """Optional integer query parameter; ValueError if it is not an INTEGER"""
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    number = int(value)
+    if not -INT_MAX - 1 <= number <= INT_MAX:
+        raise ValueError(f'{name} is out of range')
+    return number
+
+
+def track_filters(args):
+    """Collect track search filters from the query string; ValueError on bad numbers"""
+    def int_arg(name):
+        return int_param(args, name)
+
+    # Exact bpm / duration are kept for compatibility and map to a one-value range
+    bpm = int_arg('bpm')
+    duration = int_arg('duration')
+    return {
+        'title': args.get('title') or None,
+        'artist': args.get('artist') or None,
+        'genre_id': int_arg('genre_id'),
+        'bpm_min': bpm if bpm is not None else int_arg('bpm_min'),
+        'bpm_max': bpm if bpm is not None else int_arg('bpm_max'),
+        'duration_min': duration if duration is not None else int_arg('duration_min'),
+        'duration_max': duration if duration is not None else int_arg('duration_max')
+    }
+
+
+def search_args(filters, user_id, limit, offset):
+    """Positional arguments of search_tracks_ranked / search_tracks_ranked_json"""
+    return (
+        filters['title'], filters['artist'], filters['genre_id'],
+        filters['bpm_min'], filters['bpm_max'],
+        filters['duration_min'], filters['duration_max'],
+        user_id, limit, offset
+    )
+
+
+# Batch add/remove of tracks in a collection
+COLLECTION_BATCH_MAX = int(os.environ.get('COLLECTION_BATCH_MAX', 1000))
+
+
+def parse_track_ids(data):
+    """Return the list of track IDs from a JSON body, or None if it is malformed"""
+    track_ids = (data or {}).get('track_ids')
+    if (not isinstance(track_ids, list) or not track_ids
+            or len(track_ids) > COLLECTION_BATCH_MAX
+            or not all(isinstance(track_id, int) and not isinstance(track_id, bool) for track_id in track_ids)):
+        return None
+    return track_ids
+
+
+# Owner-aware mutations return 'ok' or 'not_found'; a row owned by someone else
+# is reported as not found so the response does not reveal that it exists
+MUTATION_STATUS_CODES = {'ok': 200, 'not_found': 404}
+
+
+def batch_result(rows, ok_statuses, not_found_message):
+    """Map per-track statuses from a batch procedure to (body, HTTP status)
+
+    A single row without a track_id means the collection is missing or belongs
+    to someone else; otherwise the tracks are split into succeeded/rejected.
+    """
+    if rows and rows[0]['track_id'] is None:
+        return {'message': not_found_message}, MUTATION_STATUS_CODES['not_found']
+    succeeded = [row['track_id'] for row in rows if row['status'] in ok_statuses]
+    rejected = [{'track_id': row['track_id'], 'reason': row['status']}
+                for row in rows if row['status'] not in ok_statuses]
+    return {'succeeded': succeeded, 'rejected': rejected}, MUTATION_STATUS_CODES['ok']
+
+
+def can_view_collection(owner_id, user):
+    """Only the owner or an admin may read a collection; others get a 404"""
+    return owner_id == user['user_id'] or bool(user.get('is_admin'))
+
+
+def mutation_result(result, ok_message, not_found_message):
+    """Map the status returned by an *_as_user procedure to (body, HTTP status)"""
+    status = result['status'] if result else 'not_found'
+    if status == 'ok':
+        return {'message': ok_message}, MUTATION_STATUS_CODES['ok']
+    return {'message': not_found_message}, MUTATION_STATUS_CODES['not_found']
+
+
+def parse_favorite_ids(data):
+    """Return (genre_ids, artist_ids) from a JSON body; ValueError if malformed"""
+    data = data or {}
+    genre_ids = data.get('genre_ids')
+    artist_ids = data.get('artist_ids')
+    for ids in (genre_ids, artist_ids):
+        if ids is not None and (not isinstance(ids, list)
+                                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            raise ValueError('genre_ids and artist_ids must be lists of integers')
+    return genre_ids, artist_ids
+
+
+def user_payload(row):
+    """Public part of a get_login_credentials / register_user result"""
+    return {
+        'user_id': row['user_id'],
+        'login': row['login'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'email': row['email'],
+        'avatar_url': row['avatar_url'],
+        'is_admin': row['is_admin']
+    }
+
+
+# Streaming exports: dataset name -> export procedure
+EXPORT_PROCEDURES = {
+    'tracks': 'export_tracks',
+    'audit': 'export_audit_log'
+}
+EXPORT_ITERSIZE = int(os.environ.get('EXPORT_ITERSIZE', 2000))
@@ -0,0 +1,1151 @@
+"""Asyncio (ASGI) serving mode for the /api/* routes.
+
+The routes, auth decorators and error responses match server.py, but every
+handler is a coroutine running on Quart with an asyncpg connection pool, so a
+request waiting on PostgreSQL does not hold an OS thread. Two routes are
+served by server.py only, because they report on its psycopg2 pool: the
+Prometheus metrics at /api/metrics and the query tracer's
+/api/admin/slow-queries. Run it with an ASGI server, e.g.:
+
+    hypercorn async_server:app --bind 0.0.0.0:8000
+
+Dependencies are listed in requirements-async.txt.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+import asyncpg
+import jwt
+import psycopg2
+from quart import Quart, request, jsonify, g, Response, send_from_directory
+from quart_cors import cors
+
+from api_helpers import (
+    page_limit, encode_cursor, decode_cursor, decode_offset_cursor, build_page, offset_page,
+    has_track_filters, track_filters, search_args, COLLECTION_BATCH_MAX, parse_track_ids,
+    batch_result, can_view_collection, int_param, mutation_result, parse_favorite_ids, user_payload,
+    JSON_PASSTHROUGH, build_json_page, offset_json_page,
+    TRACK_CHANGES_MAX, decode_sync_cursor, changes_body,
+    EXPORT_PROCEDURES, EXPORT_ITERSIZE
+)
+from bulk_import import CopySource, iter_records
+from cache import TTLCache, ReferenceDataCache, NotificationListener
+from db_routing import ReadYourWrites, LSN_COOKIE, CURRENT_LSN_SQL, REPLAY_LSN_SQL, READ_METHODS, parse_lsn
+from export_stream import aiter_batches, andjson_chunks, acsv_chunks, agzip_chunks
+from passwords import PasswordHasher, PasswordPoolBusy, is_legacy_hash
+from static_assets import StaticAssets
+
+app = Quart(__name__, static_folder='client', template_folder='client')
+app = cors(app, allow_origin='*')
+app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
+# Flask has no request size limit by default; keep bulk imports working the same way
+app.config['MAX_CONTENT_LENGTH'] = None
+
+# Database connection configuration (same variables as server.py)
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'music_library'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'password')
+}
+
+DB_POOL_CONFIG = {
+    'min_size': int(os.environ.get('DB_POOL_MIN', 1)),
+    'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+    'max_inactive_connection_lifetime': float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+}
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 5))
+
+# Optional streaming replica for read-only routes (same variables as server.py)
+DB_REPLICA_CONFIG = dict(DB_CONFIG, host=os.environ['DB_REPLICA_HOST']) if os.environ.get('DB_REPLICA_HOST') else None
+if DB_REPLICA_CONFIG and os.environ.get('DB_REPLICA_PORT'):
+    DB_REPLICA_CONFIG['port'] = int(os.environ['DB_REPLICA_PORT'])
+
+read_your_writes = ReadYourWrites(
+    ttl=float(os.environ.get('REPLICA_STICKY_SECONDS', 30)),
+    max_wait=float(os.environ.get('REPLICA_MAX_WAIT_MS', 0)) / 1000
+)
+
+db_pool = None
+replica_pool = None
+
+async def init_connection(conn):
+    """Decode json/jsonb columns to Python objects, as psycopg2 does"""
+    for type_name in ('json', 'jsonb'):
+        await conn.set_type_codec(type_name, encoder=json.dumps, decoder=json.loads, schema='pg_catalog')
+
+@app.before_serving
+async def open_db_pool():
+    global db_pool, replica_pool
+    db_pool = await asyncpg.create_pool(**DB_CONFIG, **DB_POOL_CONFIG, init=init_connection)
+    if DB_REPLICA_CONFIG:
+        # Connections are opened on demand, so the server starts while the replica is down
+        replica_pool = await asyncpg.create_pool(**DB_REPLICA_CONFIG, **dict(DB_POOL_CONFIG, min_size=0),
+                                                 init=init_connection)
+
+@app.after_serving
+async def close_db_pool():
+    await db_pool.close()
+    if replica_pool is not None:
+        await replica_pool.close()
+
+async def get_db_connection():
+    """Get the pooled primary connection bound to the current request"""
+    if 'db_conn' not in g:
+        g.db_conn = await db_pool.acquire(timeout=DB_POOL_TIMEOUT)
+    return g.db_conn
+
+async def checkout_replica():
+    """A replica connection that has replayed the user's last write, or None"""
+    required = read_your_writes.required_lsn(g.get('user_id'), request.cookies.get(LSN_COOKIE))
+    try:
+        conn = await replica_pool.acquire(timeout=DB_POOL_TIMEOUT)
+    except (asyncpg.PostgresError, OSError, asyncio.TimeoutError) as e:
+        print(f"Replica unavailable: {str(e)}")
+        read_your_writes.count_read('primary_unavailable')
+        return None
+    try:
+        caught_up = required is None or await read_your_writes.await_replay(
+            lambda: conn.fetchval(REPLAY_LSN_SQL), required)
+    except (asyncpg.PostgresError, OSError) as e:
+        await replica_pool.release(conn)
+        print(f"Replica unavailable: {str(e)}")
+        read_your_writes.count_read('primary_unavailable')
+        return None
+    if not caught_up:
+        await replica_pool.release(conn)
+        read_your_writes.count_read('primary_lag')
+        return None
+    read_your_writes.count_read('replica')
+    return conn
+
+async def get_read_connection():
+    """Connection for read-only handlers: the replica once it has caught up
+    with the user's writes, otherwise the request's primary connection"""
+    if replica_pool is None or 'db_conn' in g:
+        return await get_db_connection()
+    if 'replica_conn' not in g:
+        g.replica_conn = await checkout_replica()
+    return g.replica_conn or await get_db_connection()
+
+async def get_read_pool():
+    """Pool for reads that outlive the request context (streamed exports)"""
+    if replica_pool is None:
+        return db_pool
+    conn = await checkout_replica()
+    if conn is None:
+        return db_pool
+    await replica_pool.release(conn)
+    return replica_pool
+
+@app.after_request
+async def record_write_position(response):
+    """After a successful mutation, remember the primary's WAL position for the user's reads"""
+    if replica_pool is None or request.method in READ_METHODS or 'db_conn' not in g \
+            or response.status_code >= 400:
+        return response
+    try:
+        lsn = await g.db_conn.fetchval(CURRENT_LSN_SQL)
+    except asyncpg.PostgresError as e:
+        print(f"Write position error: {str(e)}")
+        return response
+    read_your_writes.record_write(g.get('user_id'), parse_lsn(lsn))
+    response.set_cookie(LSN_COOKIE, lsn, max_age=int(read_your_writes.ttl), path='/api',
+                        httponly=True, samesite='Lax')
+    return response
+
+async def release_request_connection():
+    """Return the request's connections to their pools (at teardown or earlier)"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        await db_pool.release(conn)
+    conn = g.pop('replica_conn', None)
+    if conn is not None:
+        await replica_pool.release(conn)
+
+@app.teardown_appcontext
+async def release_db_connection(exception):
+    await release_request_connection()
+
+async def callproc(conn, procedure, *args):
+    """Call a stored procedure like psycopg2's callproc and return its rows as dicts"""
+    placeholders = ', '.join(f'${i}' for i in range(1, len(args) + 1))
+    rows = await conn.fetch(f'SELECT * FROM {procedure}({placeholders})', *args)
+    return [dict(row) for row in rows]
+
+async def callproc_one(conn, procedure, *args):
+    rows = await callproc(conn, procedure, *args)
+    return rows[0] if rows else None
+
+# Invalidation of in-process caches by changes made in any process; the
+# listener thread uses its own blocking psycopg2 connection
+cache_listener = NotificationListener(lambda: psycopg2.connect(**DB_CONFIG))
+
+# Cache of authenticated users (user row incl. is_admin/is_active) keyed by user_id
+USER_CHANGED_CHANNEL = 'user_changed'
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+)
+
+def on_user_changed(cache):
+    def invalidate(payload):
+        if payload == '*':
+            cache.clear()
+        else:
+            cache.invalidate(int(payload))
+    return invalidate
+
+cache_listener.subscribe(USER_CHANGED_CHANNEL, on_user_changed(principal_cache), principal_cache.clear)
+
+async def get_principal(user_id, fresh=False):
+    """Load an active user by id, served from principal_cache while cache_listener is connected"""
+    cache_listener.start()
+    use_cache = cache_listener.connected
+    principal = principal_cache.get(user_id) if use_cache and not fresh else None
+    if principal is None:
+        version = principal_cache.version()
+        conn = await get_db_connection()
+        principal = await conn.fetchrow("SELECT user_id, login, first_name, last_name, email, avatar_url, is_admin, is_active FROM \"user\" WHERE user_id = $1", user_id)
+        if principal is None:
+            return None
+        principal = dict(principal)
+        if use_cache:
+            principal_cache.set(user_id, principal, version)
+    if not principal['is_active']:
+        return None
+    return dict(principal)
+
+def invalidate_principal(user_id):
+    """Drop a cached user after their row has changed"""
+    principal_cache.invalidate(user_id)
+
+def decode_auth_token():
+    """Return (user_id, None) for a valid bearer token or (None, error response)"""
+    token = None
+
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
+        try:
+            token = auth_header.split(" ")[1]  # Bearer token
+        except IndexError:
+            return None, (jsonify({'message': 'Invalid token format'}), 401)
+
+    if not token:
+        return None, (jsonify({'message': 'Token is missing'}), 401)
+
+    try:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Invalid token'}), 401)
+
+    return data['user_id'], None
+
+def token_required(f):
+    """Decorator to protect routes that require authentication"""
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        current_user_id, error = decode_auth_token()
+        if error:
+            return error
+        g.user_id = current_user_id
+
+        # Check if user still exists in database; writes re-read is_active
+        current_user = await get_principal(current_user_id, fresh=request.method not in READ_METHODS)
+        if not current_user:
+            return jsonify({'message': 'User no longer exists'}), 401
+
+        return await f(current_user, *args, **kwargs)
+
+    return decorated
+
+def admin_required(f):
+    """Decorator to ensure only admin users can access certain routes"""
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        current_user_id, error = decode_auth_token()
+        if error:
+            return error
+        g.user_id = current_user_id
+
+        # Check if user is admin; writes re-read is_admin/is_active
+        current_user = await get_principal(current_user_id, fresh=request.method not in READ_METHODS)
+        if not current_user or not current_user['is_admin']:
+            return jsonify({'message': 'Admin access required'}), 403
+
+        return await f(*args, **kwargs)
+
+    return decorated
+
+def mutation_response(result, ok_message, not_found_message):
+    """Map the status returned by an *_as_user procedure to an HTTP response"""
+    body, status = mutation_result(result, ok_message, not_found_message)
+    return jsonify(body), status
+
+def json_body_response(body):
+    return Response(body, content_type='application/json')
+
+async def keyset_page_response(conn, procedure, args, limit, sort_key, id_key):
+    """One keyset page of a *_page procedure; the *_json variant's bytes in passthrough mode"""
+    if JSON_PASSTHROUGH:
+        row = await callproc_one(conn, procedure + '_json', *args, limit)
+        return json_body_response(build_json_page(row, 'next_' + sort_key, 'next_' + id_key))
+    rows = await callproc(conn, procedure, *args, limit + 1)
+    return jsonify(build_page(rows, limit, sort_key, id_key)), 200
+
+async def search_tracks_response(conn, filters, user_id, limit, offset):
+    """Run search_tracks_ranked and return one page with the next-page token"""
+    if JSON_PASSTHROUGH:
+        row = await callproc_one(conn, 'search_tracks_ranked_json', *search_args(filters, user_id, limit, offset))
+        return json_body_response(offset_json_page(row, limit, offset))
+    rows = await callproc(conn, 'search_tracks_ranked', *search_args(filters, user_id, limit + 1, offset))
+    return jsonify(offset_page(rows, limit, offset)), 200
+
+def issue_token(user_id):
+    return jwt.encode({
+        'user_id': user_id,
+        'exp': datetime.utcnow() + timedelta(hours=24)
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+
+# Password hashing in a bounded thread pool, awaited without blocking the loop
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)),
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64)),
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2')
+)
+
+async def verify_password(user, password):
+    """Check a password against a get_login_credentials row, rehashing legacy values.
+
+    The rehash is best-effort: with the hash pool full the login still succeeds.
+    """
+    stored = user['password_hash']
+    if not is_legacy_hash(stored):
+        return await password_hasher.averify(stored, password)
+
+    conn = await get_db_connection()
+    result = await callproc_one(conn, 'check_legacy_password', user['user_id'], password)
+    if not (result and result['success']):
+        return False
+    try:
+        new_hash = await password_hasher.ahash(password)
+    except PasswordPoolBusy:
+        return True
+    await callproc(conn, 'update_password_hash', user['user_id'], stored, new_hash)
+    return True
+
+# Authentication routes
+@app.route('/api/auth/login', methods=['POST'])
+async def login():
+    data = await request.get_json()
+    login = data.get('login')
+    password = data.get('password')
+
+    if not login or not password:
+        return jsonify({'message': 'Login and password required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'get_login_credentials', login)
+        # Give the connection back before the (slow) hash check
+        await release_request_connection()
+
+        if result and await verify_password(result, password):
+            return jsonify({'token': issue_token(result['user_id']), 'user': user_payload(result)}), 200
+        else:
+            return jsonify({'message': 'Invalid credentials'}), 401
+
+    except PasswordPoolBusy:
+        return jsonify({'message': 'Too many login attempts, try again later'}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        print(f"Login error: {str(e)}")
+        return jsonify({'message': 'Authentication failed'}), 500
+
+@app.route('/api/auth/register', methods=['POST'])
+async def register():
+    data = await request.get_json()
+    login = data.get('login')
+    password = data.get('password')
+    first_name = data.get('first_name')
+    last_name = data.get('last_name')
+    email = data.get('email')
+
+    if not login or not password:
+        return jsonify({'message': 'Login and password required'}), 400
+
+    try:
+        password_hash = await password_hasher.ahash(password)
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'register_user', login, password_hash, first_name, last_name, email)
+
+        if result and result['success']:
+            return jsonify({'token': issue_token(result['user_id']), 'user': user_payload(result)}), 201
+        else:
+            return jsonify({'message': 'Registration failed'}), 400
+
+    except PasswordPoolBusy:
+        return jsonify({'message': 'Too many requests, try again later'}), 503, {'Retry-After': '1'}
+    except Exception as e:
+        print(f"Registration error: {str(e)}")
+        return jsonify({'message': 'Registration failed'}), 500
+
+# User profile routes
+# Profiles with favorites; invalidated like principal_cache, plus any genre or artist change
+profile_cache = TTLCache(
+    maxsize=int(os.environ.get('PROFILE_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL', 300))
+)
+cache_listener.subscribe(USER_CHANGED_CHANNEL, on_user_changed(profile_cache), profile_cache.clear)
+
+@app.route('/api/profile', methods=['GET'])
+@token_required
+async def get_profile(current_user):
+    try:
+        use_cache = cache_listener.connected
+        profile = profile_cache.get(current_user['user_id']) if use_cache else None
+        if profile is None:
+            version = profile_cache.version()
+            conn = await get_db_connection()
+            profile = await callproc_one(conn, 'get_user_profile_full', current_user['user_id'])
+
+            if not profile:
+                return jsonify({'message': 'User not found'}), 404
+            if use_cache:
+                profile_cache.set(current_user['user_id'], profile, version)
+
+        return jsonify(profile), 200
+
+    except Exception as e:
+        print(f"Get profile error: {str(e)}")
+        return jsonify({'message': 'Failed to get profile'}), 500
+
+@app.route('/api/profile', methods=['PUT'])
+@token_required
+async def update_profile(current_user):
+    data = await request.get_json()
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'update_user_profile',
+                                    current_user['user_id'], data.get('first_name'), data.get('last_name'),
+                                    data.get('email'), data.get('avatar_url'))
+
+        if result and result['success']:
+            invalidate_principal(current_user['user_id'])
+            profile_cache.invalidate(current_user['user_id'])
+            return jsonify({'message': 'Profile updated successfully'}), 200
+        else:
+            return jsonify({'message': 'Failed to update profile'}), 400
+
+    except Exception as e:
+        print(f"Update profile error: {str(e)}")
+        return jsonify({'message': 'Failed to update profile'}), 500
+
+@app.route('/api/profile/favorites', methods=['PUT'])
+@token_required
+async def update_favorites(current_user):
+    try:
+        genre_ids, artist_ids = parse_favorite_ids(await request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'set_user_favorites', current_user['user_id'], genre_ids, artist_ids)
+
+        if result and result['success']:
+            profile_cache.invalidate(current_user['user_id'])
+            return jsonify({'message': 'Favorites updated successfully'}), 200
+        else:
+            return jsonify({'message': 'Failed to update favorites'}), 400
+
+    except Exception as e:
+        print(f"Update favorites error: {str(e)}")
+        return jsonify({'message': 'Failed to update favorites'}), 500
+
+# Reference data (genres, artists), shared with other workers via NOTIFY
+REFERENCE_DATA_CHANNEL = 'reference_data'
+reference_cache = ReferenceDataCache(ttl=float(os.environ.get('REFERENCE_CACHE_TTL', 300)))
+cache_listener.subscribe(REFERENCE_DATA_CHANNEL, reference_cache.invalidate, reference_cache.clear)
+cache_listener.subscribe(REFERENCE_DATA_CHANNEL, lambda table: profile_cache.clear(), profile_cache.clear)
+
+async def load_reference_data(procedure):
+    """Call a no-argument listing procedure and serialize its rows to JSON bytes"""
+    conn = await get_db_connection()
+    rows = await callproc(conn, procedure)
+    return app.json.dumps(rows).encode('utf-8')
+
+async def reference_data_response(name, procedure):
+    """Serve cached reference data, answering If-None-Match with 304"""
+    cache_listener.start()
+    body, etag = await reference_cache.aget(name, lambda: load_reference_data(procedure))
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return await response.make_conditional(request)
+
+@app.route('/api/genres', methods=['GET'])
+@token_required
+async def get_genres(current_user):
+    try:
+        return await reference_data_response('genres', 'get_all_genres')
+
+    except Exception as e:
+        print(f"Get genres error: {str(e)}")
+        return jsonify({'message': 'Failed to get genres'}), 500
+
+# Artist routes
+@app.route('/api/artists', methods=['GET'])
+@token_required
+async def get_artists(current_user):
+    try:
+        return await reference_data_response('artists', 'get_all_artists')
+
+    except Exception as e:
+        print(f"Get artists error: {str(e)}")
+        return jsonify({'message': 'Failed to get artists'}), 500
+
+@app.route('/api/artists', methods=['POST'])
+@token_required
+async def add_artist(current_user):
+    data = await request.get_json()
+    name = data.get('name')
+
+    if not name:
+        return jsonify({'message': 'Artist name is required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'add_artist', name)
+
+        if result and result['artist_id']:
+            reference_cache.invalidate('artists')
+            return jsonify(result), 201
+        else:
+            return jsonify({'message': 'Failed to add artist'}), 400
+
+    except Exception as e:
+        print(f"Add artist error: {str(e)}")
+        return jsonify({'message': 'Failed to add artist'}), 500
+
+@app.route('/api/artists/<int:artist_id>', methods=['PUT'])
+@token_required
+async def update_artist(current_user, artist_id):
+    data = await request.get_json()
+    name = data.get('name')
+
+    if not name:
+        return jsonify({'message': 'Artist name is required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'update_artist', artist_id, name)
+
+        if result and result['success']:
+            reference_cache.invalidate('artists')
+            profile_cache.clear()
+            return jsonify({'message': 'Artist updated successfully'}), 200
+        else:
+            return jsonify({'message': 'Failed to update artist'}), 400
+
+    except Exception as e:
+        print(f"Update artist error: {str(e)}")
+        return jsonify({'message': 'Failed to update artist'}), 500
+
+@app.route('/api/artists/<int:artist_id>', methods=['DELETE'])
+@token_required
+async def delete_artist(current_user, artist_id):
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'delete_artist', artist_id)
+
+        if result and result['success']:
+            reference_cache.invalidate('artists')
+            profile_cache.clear()
+            return jsonify({'message': 'Artist deleted successfully'}), 200
+        else:
+            return jsonify({'message': 'Failed to delete artist'}), 400
+
+    except Exception as e:
+        print(f"Delete artist error: {str(e)}")
+        return jsonify({'message': 'Failed to delete artist'}), 500
+
+# Track routes
+@app.route('/api/tracks', methods=['GET'])
+@token_required
+async def get_tracks(current_user):
+    is_admin = current_user.get('is_admin', False)
+    user_id = current_user['user_id'] if not is_admin else None
+    has_filters = has_track_filters(request.args)
+
+    limit = page_limit(request.args)
+    try:
+        filters = track_filters(request.args)
+        if has_filters:
+            offset = decode_offset_cursor(request.args.get('cursor'))
+        else:
+            after_created_at, after_track_id = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor or filter value'}), 400
+
+    try:
+        conn = await get_read_connection()
+
+        if has_filters:
+            return await search_tracks_response(conn, filters, user_id, limit, offset)
+
+        if is_admin:
+            return await keyset_page_response(conn, 'get_all_tracks_admin_page', (after_created_at, after_track_id),
+                                              limit, 'created_at', 'track_id')
+        return await keyset_page_response(conn, 'get_user_tracks_page', (user_id, after_created_at, after_track_id),
+                                          limit, 'created_at', 'track_id')
+
+    except Exception as e:
+        print(f"Get tracks error: {str(e)}")
+        return jsonify({'message': 'Failed to get tracks'}), 500
+
+@app.route('/api/tracks/changes', methods=['GET'])
+@token_required
+async def get_track_changes(current_user):
+    """Tracks added, changed and deleted since ?since=<cursor>; reset=true - reload the list"""
+    user_id = None if current_user.get('is_admin', False) else current_user['user_id']
+    try:
+        since = decode_sync_cursor(request.args.get('since'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    try:
+        conn = await get_read_connection()
+        # Cursor and changes come from one snapshot, so the body is always built by the database
+        row = await callproc_one(conn, 'get_track_changes', user_id, since, TRACK_CHANGES_MAX)
+        return json_body_response(changes_body(row))
+
+    except Exception as e:
+        print(f"Get track changes error: {str(e)}")
+        return jsonify({'message': 'Failed to get track changes'}), 500
+
+@app.route('/api/tracks', methods=['POST'])
+@token_required
+async def add_track(current_user):
+    data = await request.get_json()
+
+    title = data.get('title')
+    artist_id = data.get('artist_id')
+    genre_id = data.get('genre_id')
+    bpm = data.get('bpm')
+    duration_sec = data.get('duration_sec')
+
+    if not title or not artist_id or not genre_id:
+        return jsonify({'message': 'Title, artist, and genre are required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'add_track',
+                                    current_user['user_id'], title, artist_id, genre_id, bpm, duration_sec)
+
+        if result and result['track_id']:
+            return jsonify(result), 201
+        else:
+            return jsonify({'message': 'Failed to add track'}), 400
+
+    except Exception as e:
+        print(f"Add track error: {str(e)}")
+        return jsonify({'message': 'Failed to add track'}), 500
+
+BULK_IMPORT_MAX_ERRORS = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', 1000))
+BULK_IMPORT_COLUMNS = ['line_no', 'title', 'artist_name', 'genre_name', 'bpm', 'duration_sec']
+
+async def copy_source_chunks(source):
+    """Feed CopySource to asyncpg COPY; parsing runs in a worker thread"""
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await loop.run_in_executor(None, source.read, 65536)
+        if not data:
+            break
+        yield data
+
+@app.route('/api/tracks/bulk', methods=['POST'])
+@token_required
+async def bulk_import_tracks(current_user):
+    content_type = request.mimetype
+    if content_type not in ('text/csv', 'application/x-ndjson'):
+        return jsonify({'message': 'Content-Type must be text/csv or application/x-ndjson'}), 415
+
+    started = time.perf_counter()
+    # The parser reads a blocking stream, so the body is spooled to a temp file first
+    spool = tempfile.TemporaryFile()
+    async for chunk in request.body:
+        spool.write(chunk)
+    spool.seek(0)
+    source = CopySource(iter_records(spool, content_type), BULK_IMPORT_MAX_ERRORS)
+
+    try:
+        conn = await get_db_connection()
+        # Staging, COPY and the final insert run as one transaction
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE track_import_staging (
+                    line_no INTEGER,
+                    title VARCHAR(255),
+                    artist_name VARCHAR(100),
+                    genre_name VARCHAR(100),
+                    bpm INTEGER,
+                    duration_sec INTEGER
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_to_table('track_import_staging', source=copy_source_chunks(source),
+                                     columns=BULK_IMPORT_COLUMNS, format='csv')
+            result = await callproc_one(conn, 'import_tracks_from_staging', current_user['user_id'])
+
+        if result['artists_created'] or result['genres_created']:
+            reference_cache.invalidate('artists')
+            reference_cache.invalidate('genres')
+
+        elapsed = time.perf_counter() - started
+        return jsonify({
+            'inserted': result['inserted_count'],
+            'rejected': source.rejected,
+            'errors': source.errors,
+            'artists_created': result['artists_created'],
+            'genres_created': result['genres_created'],
+            'elapsed_sec': round(elapsed, 3),
+            'rows_per_sec': round(result['inserted_count'] / elapsed, 1) if elapsed > 0 else None
+        }), 200 if source.accepted else 400
+
+    except Exception as e:
+        print(f"Bulk import error: {str(e)}")
+        return jsonify({'message': 'Bulk import failed', 'rejected': source.rejected, 'errors': source.errors}), 500
+    finally:
+        spool.close()
+
+@app.route('/api/tracks/<int:track_id>', methods=['PUT'])
+@token_required
+async def update_track(current_user, track_id):
+    data = await request.get_json()
+
+    title = data.get('title')
+    artist_id = data.get('artist_id')
+    genre_id = data.get('genre_id')
+    bpm = data.get('bpm')
+    duration_sec = data.get('duration_sec')
+
+    if not title or not artist_id or not genre_id:
+        return jsonify({'message': 'Title, artist, and genre are required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'update_track_as_user',
+                                    track_id, current_user['user_id'], current_user['is_admin'],
+                                    title, artist_id, genre_id, bpm, duration_sec)
+
+        return mutation_response(result, 'Track updated successfully',
+                                 'Track not found')
+
+    except Exception as e:
+        print(f"Update track error: {str(e)}")
+        return jsonify({'message': 'Failed to update track'}), 500
+
+@app.route('/api/tracks/<int:track_id>', methods=['DELETE'])
+@token_required
+async def delete_track(current_user, track_id):
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'delete_track_as_user',
+                                    track_id, current_user['user_id'], current_user['is_admin'])
+
+        return mutation_response(result, 'Track deleted successfully',
+                                 'Track not found')
+
+    except Exception as e:
+        print(f"Delete track error: {str(e)}")
+        return jsonify({'message': 'Failed to delete track'}), 500
+
+# Collection routes
+@app.route('/api/collections', methods=['GET'])
+@token_required
+async def get_collections(current_user):
+    try:
+        conn = await get_read_connection()
+        collections = await callproc(conn, 'get_user_collections', current_user['user_id'])
+
+        return jsonify(collections), 200
+
+    except Exception as e:
+        print(f"Get collections error: {str(e)}")
+        return jsonify({'message': 'Failed to get collections'}), 500
+
+@app.route('/api/collections', methods=['POST'])
+@token_required
+async def add_collection(current_user):
+    data = await request.get_json()
+
+    name = data.get('name')
+    is_favorite = data.get('is_favorite', False)
+
+    if not name:
+        return jsonify({'message': 'Collection name is required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'create_collection', current_user['user_id'], name, is_favorite)
+
+        if result and result['collection_id']:
+            return jsonify(result), 201
+        else:
+            return jsonify({'message': 'Failed to create collection'}), 400
+
+    except Exception as e:
+        print(f"Add collection error: {str(e)}")
+        return jsonify({'message': 'Failed to create collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>', methods=['GET'])
+@token_required
+async def get_collection(current_user, collection_id):
+    limit = page_limit(request.args)
+    try:
+        after_added_at, after_track_id = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    try:
+        conn = await get_read_connection()
+        result = await callproc_one(conn, 'get_collection_detail',
+                                    collection_id, after_added_at, after_track_id, limit)
+
+        if not result or not can_view_collection(result['owner_id'], current_user):
+            return jsonify({'message': 'Collection not found'}), 404
+
+        collection = result['collection']
+        collection['next'] = (encode_cursor(result['next_added_at'], result['next_track_id'])
+                              if result['next_track_id'] is not None else None)
+        return jsonify(collection), 200
+
+    except Exception as e:
+        print(f"Get collection error: {str(e)}")
+        return jsonify({'message': 'Failed to get collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>', methods=['PUT'])
+@token_required
+async def update_collection(current_user, collection_id):
+    data = await request.get_json()
+
+    name = data.get('name')
+    is_favorite = data.get('is_favorite')
+
+    if not name:
+        return jsonify({'message': 'Collection name is required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'update_collection_as_user',
+                                    collection_id, current_user['user_id'], name, is_favorite)
+
+        return mutation_response(result, 'Collection updated successfully',
+                                 'Collection not found')
+
+    except Exception as e:
+        print(f"Update collection error: {str(e)}")
+        return jsonify({'message': 'Failed to update collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>', methods=['DELETE'])
+@token_required
+async def delete_collection(current_user, collection_id):
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'delete_collection_as_user', collection_id, current_user['user_id'])
+
+        return mutation_response(result, 'Collection deleted successfully',
+                                 'Collection not found')
+
+    except Exception as e:
+        print(f"Delete collection error: {str(e)}")
+        return jsonify({'message': 'Failed to delete collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>/tracks', methods=['POST'])
+@token_required
+async def add_track_to_collection(current_user, collection_id):
+    data = await request.get_json()
+    track_id = data.get('track_id')
+
+    if not track_id:
+        return jsonify({'message': 'Track ID is required'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'add_track_to_collection_as_user',
+                                    collection_id, track_id, current_user['user_id'], current_user['is_admin'])
+
+        return mutation_response(result, 'Track added to collection successfully',
+                                 'Collection or track not found')
+
+    except Exception as e:
+        print(f"Add track to collection error: {str(e)}")
+        return jsonify({'message': 'Failed to add track to collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>/tracks/<int:track_id>', methods=['DELETE'])
+@token_required
+async def remove_track_from_collection(current_user, collection_id, track_id):
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'remove_track_from_collection_as_user',
+                                    collection_id, track_id, current_user['user_id'])
+
+        return mutation_response(result, 'Track removed from collection successfully',
+                                 'Track is not in this collection')
+
+    except Exception as e:
+        print(f"Remove track from collection error: {str(e)}")
+        return jsonify({'message': 'Failed to remove track from collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>/tracks/batch', methods=['POST'])
+@token_required
+async def add_tracks_to_collection_batch(current_user, collection_id):
+    track_ids = parse_track_ids(await request.get_json(silent=True))
+    if track_ids is None:
+        return jsonify({'message': f'track_ids must be a non-empty list of at most {COLLECTION_BATCH_MAX} integers'}), 400
+
+    try:
+        conn = await get_db_connection()
+        rows = await callproc(conn, 'add_tracks_to_collection_batch',
+                              collection_id, current_user['user_id'], current_user['is_admin'], track_ids)
+
+        body, status = batch_result(rows, ('added', 'already_present'), 'Collection not found')
+        return jsonify(body), status
+
+    except Exception as e:
+        print(f"Batch add tracks to collection error: {str(e)}")
+        return jsonify({'message': 'Failed to add tracks to collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>/tracks/batch', methods=['DELETE'])
+@token_required
+async def remove_tracks_from_collection_batch(current_user, collection_id):
+    track_ids = parse_track_ids(await request.get_json(silent=True))
+    if track_ids is None:
+        return jsonify({'message': f'track_ids must be a non-empty list of at most {COLLECTION_BATCH_MAX} integers'}), 400
+
+    try:
+        conn = await get_db_connection()
+        rows = await callproc(conn, 'remove_tracks_from_collection_batch',
+                              collection_id, current_user['user_id'], track_ids)
+
+        body, status = batch_result(rows, ('removed',), 'Collection not found')
+        return jsonify(body), status
+
+    except Exception as e:
+        print(f"Batch remove tracks from collection error: {str(e)}")
+        return jsonify({'message': 'Failed to remove tracks from collection'}), 500
+
+# Search routes
+@app.route('/api/search/tracks', methods=['GET'])
+@token_required
+async def search_tracks(current_user):
+    limit = page_limit(request.args)
+    try:
+        filters = track_filters(request.args)
+        offset = decode_offset_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor or filter value'}), 400
+
+    try:
+        conn = await get_read_connection()
+        return await search_tracks_response(conn, filters, None, limit, offset)
+
+    except Exception as e:
+        print(f"Search tracks error: {str(e)}")
+        return jsonify({'message': 'Search failed'}), 500
+
+# Admin routes
+@app.route('/api/admin/users', methods=['GET'])
+@admin_required
+async def get_all_users():
+    try:
+        conn = await get_read_connection()
+        users = await callproc(conn, 'get_all_users_admin')
+
+        return jsonify(users), 200
+
+    except Exception as e:
+        print(f"Get all users error: {str(e)}")
+        return jsonify({'message': 'Failed to get users'}), 500
+
+@app.route('/api/admin/users/<int:user_id>/active', methods=['PUT'])
+@admin_required
+async def set_user_active(user_id):
+    data = await request.get_json()
+    is_active = data.get('is_active')
+
+    if not isinstance(is_active, bool):
+        return jsonify({'message': 'is_active must be true or false'}), 400
+
+    try:
+        conn = await get_db_connection()
+        result = await callproc_one(conn, 'set_user_active', user_id, is_active)
+
+        if result and result['success']:
+            invalidate_principal(user_id)
+            profile_cache.invalidate(user_id)
+            return jsonify({'message': 'User status updated successfully'}), 200
+        else:
+            return jsonify({'message': 'User not found'}), 404
+
+    except Exception as e:
+        print(f"Set user active error: {str(e)}")
+        return jsonify({'message': 'Failed to update user status'}), 500
+
+@app.route('/api/admin/tracks', methods=['GET'])
+@admin_required
+async def get_all_tracks_admin():
+    limit = page_limit(request.args)
+    try:
+        after_created_at, after_track_id = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+
+    try:
+        conn = await get_read_connection()
+        return await keyset_page_response(conn, 'get_all_tracks_admin_page', (after_created_at, after_track_id),
+                                          limit, 'created_at', 'track_id')
+
+    except Exception as e:
+        print(f"Get all tracks admin error: {str(e)}")
+        return jsonify({'message': 'Failed to get tracks'}), 500
+
+@app.route('/api/admin/audit', methods=['GET'])
+@admin_required
+async def get_audit_log():
+    limit = page_limit(request.args)
+    try:
+        after_time, after_log_id = decode_cursor(request.args.get('cursor'))
+        time_from = request.args.get('from')
+        time_from = datetime.fromisoformat(time_from) if time_from else None
+        time_to = request.args.get('to')
+        time_to = datetime.fromisoformat(time_to) if time_to else None
+        filter_user_id = int_param(request.args, 'user_id')
+        record_id = int_param(request.args, 'record_id')
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor, time range or ID filter'}), 400
+
+    table_name = request.args.get('table_name') or None
+    operation_type = request.args.get('operation_type') or None
+
+    try:
+        conn = await get_read_connection()
+        return await keyset_page_response(conn, 'get_audit_log_page', (
+            time_from, time_to, table_name, operation_type, filter_user_id, record_id,
+            after_time, after_log_id
+        ), limit, 'operation_time', 'log_id')
+
+    except Exception as e:
+        print(f"Get audit log error: {str(e)}")
+        return jsonify({'message': 'Failed to get audit log'}), 500
+
+@app.route('/api/admin/export/<dataset>', methods=['GET'])
+@admin_required
+async def export_dataset(dataset):
+    procedure = EXPORT_PROCEDURES.get(dataset)
+    if not procedure:
+        return jsonify({'message': 'Unknown export dataset'}), 404
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        encode, mimetype = andjson_chunks, 'application/x-ndjson'
+    elif export_format == 'csv':
+        encode, mimetype = acsv_chunks, 'text/csv'
+    else:
+        return jsonify({'message': 'Format must be ndjson or csv'}), 400
+
+    use_gzip = request.args.get('compress') == 'gzip'
+    filename = f"{dataset}.{export_format}" + ('.gz' if use_gzip else '')
+
+    pool = await get_read_pool()
+
+    async def generate():
+        try:
+            # The stream outlives the request context, so it holds its own connection
+            async with pool.acquire(timeout=DB_POOL_TIMEOUT) as conn:
+                async with conn.transaction(readonly=True):
+                    chunks = encode(aiter_batches(conn, procedure, EXPORT_ITERSIZE))
+                    if use_gzip:
+                        async for data in agzip_chunks(chunks):
+                            yield data
+                    else:
+                        async for chunk in chunks:
+                            yield chunk.encode('utf-8')
+        except Exception as e:
+            # Headers are already sent, so the only option is to cut the stream short
+            print(f"Export {dataset} error: {str(e)}")
+
+    response = Response(generate(), mimetype='application/gzip' if use_gzip else mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/admin/db-pool', methods=['GET'])
+@admin_required
+async def get_db_pool_stats():
+    size = db_pool.get_size()
+    idle = db_pool.get_idle_size()
+    stats = {
+        'min_size': db_pool.get_min_size(),
+        'max_size': db_pool.get_max_size(),
+        'in_use': size - idle,
+        'idle': idle
+    }
+    if replica_pool is not None:
+        replica_size = replica_pool.get_size()
+        replica_idle = replica_pool.get_idle_size()
+        stats['replica'] = {
+            'min_size': replica_pool.get_min_size(),
+            'max_size': replica_pool.get_max_size(),
+            'in_use': replica_size - replica_idle,
+            'idle': replica_idle,
+            'routing': read_your_writes.stats()
+        }
+    return jsonify(stats), 200
+
+# Static client files: the build from build_assets.py, or the sources in client/
+assets = StaticAssets(os.path.join(app.root_path, 'client'), os.path.join(app.root_path, 'client', 'dist'))
+
+
+async def send_static(static_file):
+    response = await send_from_directory(static_file.directory, static_file.filename, mimetype=static_file.mimetype)
+    response.headers.update(static_file.headers)
+    return response
+
+@app.route('/static/<path:filename>')
+async def static_files(filename):
+    static_file = assets.lookup(filename, request.headers.get('Accept-Encoding'))
+    if static_file is None:
+        return await send_from_directory('client', filename)
+    return await send_static(static_file)
+
+@app.route('/')
+async def index():
+    return await send_static(assets.page('index.html', request.headers.get('Accept-Encoding')))
+
+@app.route('/login-page')
+@app.route('/login')
+async def login_page():
+    return await send_static(assets.page('login.html', request.headers.get('Accept-Encoding')))
+
+@app.route('/register-page')
+@app.route('/register')
+async def register_page():
+    return await send_static(assets.page('register.html', request.headers.get('Accept-Encoding')))
+
+# Health check endpoint
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow()}), 200
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=int(os.environ.get('ASYNC_PORT', 8000)))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Нагрузочное сравнение синхронного (server.py, Flask + psycopg2) и асинхронного
+(async_server.py, Quart + asyncpg) режимов сервера.
+
+Оба сервера запускаются заранее на одной базе данных. Для каждого уровня
+конкурентности (по умолчанию 100, 500 и 1000 клиентов) каждый клиент через
+постоянное соединение последовательно отправляет запросы из смеси --paths в
+течение --warmup + --duration секунд; статистика собирается только за
+--duration. Выводятся число запросов, ошибки (статус >= 400, обрывы, таймауты),
+пропускная способность и задержки p50/p95/p99.
+
+Пример:
+    python server.py &
+    hypercorn async_server:app --bind 0.0.0.0:8000 &
+    python benchmarks/bench_async_vs_sync.py --login user --password user
+"""
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from http_client import HttpClient, login, percentile, raise_fd_limit
+
+DEFAULT_PATHS = '/api/tracks?limit=50,/api/collections,/api/profile,/api/genres'
+
+
+async def client_loop(client, paths, offset, measure_from, stop_at, timeout, stats):
+    """Отправлять запросы до stop_at; учитывать только начатые после measure_from"""
+    i = offset
+    while True:
+        started = time.perf_counter()
+        if started >= stop_at:
+            break
+        path = paths[i % len(paths)]
+        i += 1
+        try:
+            status = await asyncio.wait_for(client.get(path), timeout)
+            failed = status >= 400
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            failed = True
+        if started >= measure_from:
+            if failed:
+                stats['errors'] += 1
+            else:
+                stats['latencies'].append(time.perf_counter() - started)
+
+
+async def run_level(base_url, token, clients, paths, warmup, duration, timeout):
+    parts = urlsplit(base_url)
+    http_clients = [HttpClient(parts.hostname, parts.port or 80, token) for _ in range(clients)]
+    stats = {'latencies': [], 'errors': 0}
+
+    now = time.perf_counter()
+    measure_from = now + warmup
+    stop_at = measure_from + duration
+    await asyncio.gather(*(
+        client_loop(client, paths, index, measure_from, stop_at, timeout, stats)
+        for index, client in enumerate(http_clients)
+    ))
+    await asyncio.gather(*(client.close() for client in http_clients))
+    return stats
+
+
+def summarize(stats, duration):
+    latencies = sorted(stats['latencies'])
+    return {
+        'requests': len(latencies),
+        'errors': stats['errors'],
+        'rps': len(latencies) / duration,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sync-url', default='http://localhost:5000', help='адрес синхронного сервера')
+    parser.add_argument('--async-url', default='http://localhost:8000', help='адрес асинхронного сервера')
+    parser.add_argument('--login', default='user', help='логин для получения токена')
+    parser.add_argument('--password', default='user', help='пароль для получения токена')
+    parser.add_argument('--concurrency', default='100,500,1000', help='уровни конкурентности через запятую')
+    parser.add_argument('--duration', type=float, default=20, help='длительность измерения на уровень, сек')
+    parser.add_argument('--warmup', type=float, default=3, help='прогрев перед измерением, сек')
+    parser.add_argument('--timeout', type=float, default=30, help='таймаут одного запроса, сек')
+    parser.add_argument('--paths', default=DEFAULT_PATHS, help='смесь запросов через запятую')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    paths = [path for path in args.paths.split(',') if path]
+    raise_fd_limit(max(levels) + 256)
+
+    targets = [('sync', args.sync_url), ('async', args.async_url)]
+    tokens = {name: login(url, args.login, args.password) for name, url in targets}
+
+    print(f"Смесь запросов: {', '.join(paths)}")
+    print(f"{'Клиентов':>9} {'Режим':>6} {'Запросов':>9} {'Ошибок':>7} {'Запр/с':>9} "
+          f"{'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+
+    for clients in levels:
+        results = {}
+        for name, url in targets:
+            stats = asyncio.run(run_level(url, tokens[name], clients, paths,
+                                          args.warmup, args.duration, args.timeout))
+            results[name] = summary = summarize(stats, args.duration)
+            print(f"{clients:>9} {name:>6} {summary['requests']:>9} {summary['errors']:>7} "
+                  f"{summary['rps']:>9.1f} {summary['p50']:>9.1f} {summary['p95']:>9.1f} {summary['p99']:>9.1f}")
+        if results['sync']['rps']:
+            print(f"{'':>9} async/sync по пропускной способности: "
+                  f"{results['async']['rps'] / results['sync']['rps']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Сравнение пропускной способности построчных (FOR EACH ROW) и операторных
+(FOR EACH STATEMENT с таблицами переходов) триггеров аудита треков.
+
+Для каждого режима выполняются массовые INSERT, UPDATE и DELETE над
+--rows треками. Все изменения, включая подмену триггеров, делаются в одной
+транзакции, которая в конце откатывается, поэтому данные БД не меняются.
+
+Пример:
+    python benchmarks/bench_audit_triggers.py --rows 100000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'music_library'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'password')
+}
+
+STATEMENT_TRIGGERS = ('audit_tracks_insert', 'audit_tracks_update', 'audit_tracks_delete')
+
+ROW_MODE_SQL = """
+    DROP TRIGGER IF EXISTS audit_tracks_insert ON tracks;
+    DROP TRIGGER IF EXISTS audit_tracks_update ON tracks;
+    DROP TRIGGER IF EXISTS audit_tracks_delete ON tracks;
+    CREATE TRIGGER audit_tracks_trigger
+        AFTER INSERT OR UPDATE OR DELETE ON tracks
+        FOR EACH ROW EXECUTE FUNCTION audit_track_operations();
+"""
+
+
+def run_operations(cursor, rows, user_id, artist_id, genre_id):
+    """Выполнить INSERT/UPDATE/DELETE над rows треками, вернуть время каждой операции"""
+    timings = {}
+
+    started = time.perf_counter()
+    cursor.execute("""
+        INSERT INTO tracks (user_id, title, artist_id, genre_id, bpm, duration_sec)
+        SELECT %s, 'bench track ' || i, %s, %s, 60 + i %% 120, 120 + i %% 300
+        FROM generate_series(1, %s) AS i
+        RETURNING track_id
+    """, (user_id, artist_id, genre_id, rows))
+    track_ids = [row[0] for row in cursor.fetchall()]
+    timings['INSERT'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cursor.execute("UPDATE tracks SET title = title || ' (upd)' WHERE track_id = ANY(%s)", (track_ids,))
+    timings['UPDATE'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cursor.execute("DELETE FROM tracks WHERE track_id = ANY(%s)", (track_ids,))
+    timings['DELETE'] = time.perf_counter() - started
+
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='число треков в каждой операции')
+    parser.add_argument('--repeat', type=int, default=3, help='число повторов (берется лучший результат)')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT user_id FROM "user" ORDER BY user_id LIMIT 1')
+    user_row = cursor.fetchone()
+    cursor.execute('SELECT artist_id FROM artists ORDER BY artist_id LIMIT 1')
+    artist_row = cursor.fetchone()
+    cursor.execute('SELECT genre_id FROM genres ORDER BY genre_id LIMIT 1')
+    genre_row = cursor.fetchone()
+    if not (user_row and artist_row and genre_row):
+        print('✗ В БД нет пользователя, исполнителя или жанра. Выполните database_schema.sql')
+        sys.exit(1)
+
+    cursor.execute("SELECT tgname FROM pg_trigger WHERE tgrelid = 'tracks'::regclass AND NOT tgisinternal")
+    installed = {row[0] for row in cursor.fetchall()}
+    if not set(STATEMENT_TRIGGERS) <= installed:
+        print('✗ Операторные триггеры аудита не установлены. Выполните database_schema.sql')
+        sys.exit(1)
+
+    results = {}
+    try:
+        for mode in ('row', 'statement'):
+            best = {}
+            for _ in range(args.repeat):
+                cursor.execute('SAVEPOINT bench')
+                if mode == 'row':
+                    cursor.execute(ROW_MODE_SQL)
+                timings = run_operations(cursor, args.rows, user_row[0], artist_row[0], genre_row[0])
+                cursor.execute('ROLLBACK TO SAVEPOINT bench')
+                for operation, elapsed in timings.items():
+                    best[operation] = min(best.get(operation, elapsed), elapsed)
+            results[mode] = best
+    finally:
+        conn.rollback()
+        conn.close()
+
+    print(f"Аудит треков, {args.rows} строк на операцию (лучшее из {args.repeat})")
+    print('=' * 66)
+    print(f"{'Операция':<10}{'FOR EACH ROW, строк/с':>24}{'FOR EACH STATEMENT, строк/с':>28}  Ускорение")
+    for operation in ('INSERT', 'UPDATE', 'DELETE'):
+        row_rate = args.rows / results['row'][operation]
+        statement_rate = args.rows / results['statement'][operation]
+        print(f"{operation:<10}{row_rate:>24,.0f}{statement_rate:>28,.0f}  x{statement_rate / row_rate:.2f}")
+
+
+if __name__ == '__main__':
+    main()
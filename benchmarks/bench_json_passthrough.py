@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Затраты CPU сервера приложения на один ответ списка: построчный путь
+(RealDictCursor -> dict на строку -> jsonify) против JSON, собранного в БД
+процедурами *_json (строка JSON передается в ответ без разбора).
+
+Для каждого набора (--datasets) и размера страницы (--limits) ответ
+формируется --repeat раз в каждом режиме так же, как в server.py, включая
+кодирование тела в байты. Выводится процессорное время этого процесса на
+ответ (разбор результата драйвером, построение словарей, сериализация),
+полное время ответа с учетом работы БД и размер тела.
+
+Наборы:
+    tracks  get_all_tracks_admin_page (все треки, как у администратора)
+    search  search_tracks_ranked по названию --title
+    audit   get_audit_log_page
+
+Пример:
+    python benchmarks/generate_data.py --users 1000 --tracks 200000
+    python benchmarks/bench_json_passthrough.py --limits 50,500,10000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api_helpers import build_page, offset_page, build_json_page, offset_json_page  # noqa: E402
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'music_library'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'password')
+}
+
+# Сериализатор ответов Flask с настройками по умолчанию, как у jsonify в server.py
+json_provider = Flask(__name__).json
+
+
+def search_arguments(title, limit):
+    return (title, None, None, None, None, None, None, None, limit, 0)
+
+
+def rows_response(cursor, dataset, limit, title):
+    """Построчный путь: limit + 1 строк словарями, страница через jsonify"""
+    if dataset == 'tracks':
+        cursor.callproc('get_all_tracks_admin_page', (None, None, limit + 1))
+        page = build_page(cursor.fetchall(), limit, 'created_at', 'track_id')
+    elif dataset == 'search':
+        cursor.callproc('search_tracks_ranked', search_arguments(title, limit + 1))
+        page = offset_page(cursor.fetchall(), limit, 0)
+    else:
+        cursor.callproc('get_audit_log_page', (None,) * 8 + (limit + 1,))
+        page = build_page(cursor.fetchall(), limit, 'operation_time', 'log_id')
+    return json_provider.dumps(page).encode()
+
+
+def json_response(cursor, dataset, limit, title):
+    """JSON из БД: одна строка с готовым массивом items"""
+    if dataset == 'tracks':
+        cursor.callproc('get_all_tracks_admin_page_json', (None, None, limit))
+        return build_json_page(cursor.fetchone(), 'next_created_at', 'next_track_id')
+    if dataset == 'search':
+        cursor.callproc('search_tracks_ranked_json', search_arguments(title, limit))
+        return offset_json_page(cursor.fetchone(), limit, 0)
+    cursor.callproc('get_audit_log_page_json', (None,) * 8 + (limit,))
+    return build_json_page(cursor.fetchone(), 'next_operation_time', 'next_log_id')
+
+
+MODES = {'rows': rows_response, 'json': json_response}
+
+
+def measure(cursor, mode, dataset, limit, title, repeat):
+    """Лучшие (CPU, полное время) на ответ из repeat повторов и размер тела"""
+    respond = MODES[mode]
+    respond(cursor, dataset, limit, title)  # прогрев планов и кэша БД
+    best_cpu = best_wall = float('inf')
+    size = 0
+    for _ in range(repeat):
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        body = respond(cursor, dataset, limit, title)
+        best_wall = min(best_wall, time.perf_counter() - wall_started)
+        best_cpu = min(best_cpu, time.process_time() - cpu_started)
+        size = len(body)
+    return best_cpu, best_wall, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--datasets', default='tracks,search,audit', help='наборы через запятую')
+    parser.add_argument('--limits', default='50,500,10000', help='размеры страниц через запятую')
+    parser.add_argument('--title', default='Storm', help='строка поиска для набора search')
+    parser.add_argument('--repeat', type=int, default=10, help='число повторов (берется лучший результат)')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    print(f"CPU сервера приложения на ответ, лучшее из {args.repeat}")
+    print('=' * 96)
+    print(f"{'Набор':<8}{'Строк':>7}{'CPU rows, мс':>14}{'CPU json, мс':>14}{'Меньше CPU':>12}"
+          f"{'Время rows, мс':>16}{'Время json, мс':>16}{'Тело, КБ':>9}")
+    try:
+        for dataset in args.datasets.split(','):
+            for limit in (int(value) for value in args.limits.split(',')):
+                rows_cpu, rows_wall, size = measure(cursor, 'rows', dataset, limit, args.title, args.repeat)
+                json_cpu, json_wall, _ = measure(cursor, 'json', dataset, limit, args.title, args.repeat)
+                ratio = rows_cpu / json_cpu if json_cpu else float('inf')
+                print(f"{dataset:<8}{limit:>7}{rows_cpu * 1000:>14.2f}{json_cpu * 1000:>14.2f}{'x%.1f' % ratio:>12}"
+                      f"{rows_wall * 1000:>16.2f}{json_wall * 1000:>16.2f}{size / 1024:>9.0f}")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
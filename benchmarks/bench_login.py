@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Пропускная способность входа (POST /api/auth/login) в логинах в секунду.
+
+Клиенты входят под пользователями bench_user_1 .. bench_user_<--users>
+(benchmarks/generate_data.py) по кругу через постоянные соединения. Для
+каждого уровня конкурентности (--concurrency) статистика собирается за
+--duration секунд после --warmup секунд прогрева: число входов, ошибки
+(401, 503 при переполнении пула проверки паролей, обрывы), входов в
+секунду и задержки p50/p95/p99.
+
+С --once каждый пользователь входит ровно один раз, без прогрева; на
+данных, созданных с --legacy-passwords, так измеряется первый вход с
+проверкой пароля в БД и перехэшированием.
+
+Сравнение до/после: сгенерировать данные с --legacy-passwords и
+запустить скрипт против предыдущей версии сервера (пароль проверяется в
+БД через pgp_sym_decrypt), затем против текущей (первый проход с --once
+перехэширует пароли, следующие проверяют хэш werkzeug на сервере).
+
+Пример:
+    python benchmarks/generate_data.py --reset --users 1000 --legacy-passwords
+    python benchmarks/bench_login.py --once --concurrency 16
+    python benchmarks/bench_login.py --concurrency 1,8,32 --duration 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import urlsplit
+
+from generate_data import USER_PREFIX
+from http_client import HttpClient, percentile, raise_fd_limit
+
+
+async def client_loop(client, logins, password, measure_from, stop_at, timeout, stats):
+    """Входить под следующим логином из logins до stop_at или конца списка"""
+    for login in logins:
+        started = time.perf_counter()
+        if started >= stop_at:
+            break
+        try:
+            status, _ = await asyncio.wait_for(
+                client.request('POST', '/api/auth/login', {'login': login, 'password': password}), timeout)
+            failed = status != 200
+            if failed:
+                stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            failed = True
+        if started >= measure_from:
+            if failed:
+                stats['errors'] += 1
+            else:
+                stats['latencies'].append(time.perf_counter() - started)
+
+
+async def run_level(args, clients):
+    parts = urlsplit(args.url)
+    http_clients = [HttpClient(parts.hostname, parts.port or 80) for _ in range(clients)]
+    stats = {'latencies': [], 'errors': 0, 'statuses': {}}
+    users = [f'{USER_PREFIX}{i}' for i in range(1, args.users + 1)]
+
+    started = time.perf_counter()
+    if args.once:
+        # Пользователи делятся между клиентами: каждый входит один раз
+        measure_from = started
+        stop_at = float('inf')
+        logins = [users[index::clients] for index in range(clients)]
+    else:
+        measure_from = started + args.warmup
+        stop_at = measure_from + args.duration
+        logins = [itertools.islice(itertools.cycle(users), index, None, clients) for index in range(clients)]
+
+    await asyncio.gather(*(
+        client_loop(client, logins[index], args.password, measure_from, stop_at, args.timeout, stats)
+        for index, client in enumerate(http_clients)
+    ))
+    elapsed = time.perf_counter() - measure_from
+    await asyncio.gather(*(client.close() for client in http_clients))
+    return stats, (elapsed if args.once else args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='адрес сервера')
+    parser.add_argument('--users', type=int, default=1000, help='число пользователей bench_user_N')
+    parser.add_argument('--password', default='bench', help='пароль сгенерированных пользователей')
+    parser.add_argument('--concurrency', default='1,8,32', help='уровни конкурентности через запятую')
+    parser.add_argument('--duration', type=float, default=20, help='длительность измерения на уровень, сек')
+    parser.add_argument('--warmup', type=float, default=3, help='прогрев перед измерением, сек')
+    parser.add_argument('--timeout', type=float, default=30, help='таймаут одного запроса, сек')
+    parser.add_argument('--once', action='store_true', help='каждый пользователь входит один раз')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в JSON')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    raise_fd_limit(max(levels) + 256)
+
+    results = []
+    if not args.json:
+        print(f"{'Клиентов':>9} {'Входов':>9} {'Ошибок':>7} {'Входов/с':>9} "
+              f"{'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}  Коды ошибок")
+    for clients in levels:
+        stats, duration = asyncio.run(run_level(args, clients))
+        latencies = sorted(stats['latencies'])
+        row = {
+            'clients': clients,
+            'logins': len(latencies),
+            'errors': stats['errors'],
+            'logins_per_sec': len(latencies) / duration if duration else 0.0,
+            'p50': percentile(latencies, 50) * 1000,
+            'p95': percentile(latencies, 95) * 1000,
+            'p99': percentile(latencies, 99) * 1000,
+            'statuses': stats['statuses'],
+        }
+        results.append(row)
+        if not args.json:
+            statuses = ', '.join(f'{code}: {count}' for code, count in sorted(row['statuses'].items()))
+            print(f"{clients:>9} {row['logins']:>9} {row['errors']:>7} {row['logins_per_sec']:>9.1f} "
+                  f"{row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}  {statuses}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
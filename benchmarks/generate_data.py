@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Детерминированный генератор тестовых данных для нагрузочного тестирования.
+
+Заполняет таблицы database_schema.sql синтетическими данными заданного
+объема: пользователи bench_user_<N> (пароль --password), жанры и исполнители
+"Bench ...", треки, коллекции с треками и избранное. Все значения вычисляются
+арифметически из номера строки, поэтому при одинаковых параметрах на чистой
+схеме получается один и тот же набор данных. Треки и коллекции вставляются
+пакетами по --batch строк с фиксацией после каждого пакета.
+
+Названия треков составляются из слов TITLE_WORDS; их же использует
+benchmarks/load_test.py для поисковых запросов.
+
+Пример:
+    python benchmarks/generate_data.py --users 10000 --tracks 5000000 --collections 500000
+    python benchmarks/generate_data.py --reset --users 100 --tracks 10000 --collections 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+from werkzeug.security import generate_password_hash
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'music_library'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'password')
+}
+
+USER_PREFIX = 'bench_user_'
+TITLE_WORDS = (
+    'love', 'night', 'dream', 'fire', 'rain', 'summer', 'heart', 'road', 'light', 'blue',
+    'river', 'shadow', 'city', 'star', 'gold', 'winter', 'echo', 'wild', 'silver', 'ocean',
+    'storm', 'dance', 'moon', 'stone', 'sky', 'home', 'ghost', 'electric', 'velvet', 'neon',
+)
+
+# Момент времени, от которого отсчитываются даты созданных строк
+BASE_TIME = '2024-01-01 00:00:00'
+
+IS_BENCH_USER = f"starts_with(login, '{USER_PREFIX}')"
+IS_BENCH_GENRE = "starts_with(name, 'Bench Genre ')"
+IS_BENCH_ARTIST = "starts_with(name, 'Bench Artist ')"
+
+BENCH_USER_IDS = f'(SELECT array_agg(user_id ORDER BY user_id) AS ids FROM "user" WHERE {IS_BENCH_USER})'
+BENCH_GENRE_IDS = f'(SELECT array_agg(genre_id ORDER BY genre_id) AS ids FROM genres WHERE {IS_BENCH_GENRE})'
+BENCH_ARTIST_IDS = f'(SELECT array_agg(artist_id ORDER BY artist_id) AS ids FROM artists WHERE {IS_BENCH_ARTIST})'
+
+
+def pick(ids, expr):
+    """SQL-выражение: элемент массива ids по детерминированному индексу expr.
+
+    Оператор % записан как %%, так как запросы выполняются с параметрами.
+    """
+    return f'{ids}.ids[1 + ({expr}) %% cardinality({ids}.ids)]'
+
+
+def run_batches(conn, label, total, batch, statement, params=None):
+    """Выполнить statement для диапазонов [start, end] номеров строк с фиксацией после каждого"""
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    done = 0
+    for start in range(1, total + 1, batch):
+        end = min(start + batch - 1, total)
+        cursor.execute(statement, dict(params or {}, start=start, end=end))
+        conn.commit()
+        done = end
+        elapsed = time.perf_counter() - started
+        print(f"  {label}: {done:,}/{total:,} ({done / elapsed:,.0f} строк/с)", end='\r', flush=True)
+    print(f"  {label}: {done:,} за {time.perf_counter() - started:.1f} с" + ' ' * 20)
+    cursor.close()
+
+
+def reset(conn):
+    """Удалить ранее сгенерированные данные"""
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT array_agg(user_id) FROM "user" WHERE {IS_BENCH_USER}')
+    user_ids = cursor.fetchone()[0] or []
+    if user_ids:
+        cursor.execute('DELETE FROM collections WHERE user_id = ANY(%s)', (user_ids,))
+        cursor.execute('DELETE FROM tracks WHERE user_id = ANY(%s)', (user_ids,))
+        cursor.execute('DELETE FROM user_favorite_genres WHERE user_id = ANY(%s)', (user_ids,))
+        cursor.execute('DELETE FROM user_favorite_artists WHERE user_id = ANY(%s)', (user_ids,))
+        cursor.execute('DELETE FROM audit_log WHERE user_id = ANY(%s)', (user_ids,))
+        cursor.execute('DELETE FROM track_changes WHERE user_id = ANY(%s)', (user_ids,))
+        # Триггер аудита записывает удаление со ссылкой на удаляемого пользователя,
+        # что нарушает внешний ключ audit_log; поэтому триггеры на время удаления
+        # отключаются (нужны права суперпользователя)
+        cursor.execute("SET LOCAL session_replication_role = replica")
+        cursor.execute('DELETE FROM "user" WHERE user_id = ANY(%s)', (user_ids,))
+        cursor.execute("SET LOCAL session_replication_role = origin")
+    cursor.execute(f"""
+        DELETE FROM tracks
+        WHERE artist_id IN (SELECT artist_id FROM artists WHERE {IS_BENCH_ARTIST})
+           OR genre_id IN (SELECT genre_id FROM genres WHERE {IS_BENCH_GENRE})
+    """)
+    cursor.execute(f'DELETE FROM artists WHERE {IS_BENCH_ARTIST}')
+    cursor.execute(f'DELETE FROM genres WHERE {IS_BENCH_GENRE}')
+    conn.commit()
+    cursor.close()
+    print(f"  удалено пользователей: {len(user_ids):,}")
+
+
+def generate(conn, args):
+    cursor = conn.cursor()
+    if args.skip_triggers:
+        # Отключает триггеры аудита и счетчиков, а также проверки внешних ключей
+        # (нужны права суперпользователя); tracks_count пересчитывается в конце
+        cursor.execute("SET session_replication_role = replica")
+
+    cursor.execute("""
+        INSERT INTO genres (name)
+        SELECT 'Bench Genre ' || i FROM generate_series(1, %s) AS i
+        ON CONFLICT (name) DO NOTHING
+    """, (args.genres,))
+    cursor.execute("""
+        INSERT INTO artists (name, created_at)
+        SELECT 'Bench Artist ' || i, %s::timestamp + i * INTERVAL '1 minute'
+        FROM generate_series(1, %s) AS i
+        ON CONFLICT (name) DO NOTHING
+    """, (BASE_TIME, args.artists))
+    conn.commit()
+    print(f"  жанров: {args.genres:,}, исполнителей: {args.artists:,}")
+
+    if args.legacy_passwords:
+        # Старый формат (pgp_sym_encrypt): сервер перехэширует пароль при первом входе
+        password_hash = "pgp_sym_encrypt(%(password)s, 'music_library_key')::text"
+    else:
+        # Один хэш на всех пользователей: вычисление хэша на каждого заняло бы часы
+        password_hash = '%(password_hash)s'
+    run_batches(conn, 'пользователи', args.users, args.batch, f"""
+        INSERT INTO "user" (login, password_hash, first_name, last_name, email, created_at)
+        SELECT '{USER_PREFIX}' || i, pw.hash, 'Bench', 'User ' || i,
+               '{USER_PREFIX}' || i || '@example.com', '{BASE_TIME}'::timestamp + i * INTERVAL '1 minute'
+        FROM generate_series(%(start)s::bigint, %(end)s::bigint) AS i,
+             (SELECT {password_hash} AS hash) AS pw
+        ON CONFLICT (login) DO NOTHING
+    """, {'password': args.password,
+          'password_hash': generate_password_hash(args.password, os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2'))})
+
+    words = 'ARRAY[%s]' % ', '.join("'%s'" % word for word in TITLE_WORDS)
+    run_batches(conn, 'треки', args.tracks, args.batch, f"""
+        INSERT INTO tracks (user_id, title, artist_id, genre_id, bpm, duration_sec, created_at)
+        SELECT {pick('u', 'i * 7919')},
+               initcap(w.words[1 + (i * 31) %% {len(TITLE_WORDS)}] || ' ' ||
+                       w.words[1 + (i / 7) %% {len(TITLE_WORDS)}]) || ' ' || i,
+               {pick('a', 'i * 104729')},
+               {pick('g', 'i * 13')},
+               60 + (i * 37) %% 140,
+               90 + (i * 53) %% 400,
+               '{BASE_TIME}'::timestamp + i * INTERVAL '5 seconds'
+        FROM generate_series(%(start)s::bigint, %(end)s::bigint) AS i,
+             {BENCH_USER_IDS} AS u, {BENCH_ARTIST_IDS} AS a, {BENCH_GENRE_IDS} AS g,
+             (SELECT {words} AS words) AS w
+    """)
+
+    run_batches(conn, 'коллекции', args.collections, args.batch, f"""
+        INSERT INTO collections (user_id, name, is_favorite, created_at)
+        SELECT {pick('u', 'i * 6007')}, 'Bench collection ' || i, i %% 10 = 0,
+               '{BASE_TIME}'::timestamp + i * INTERVAL '30 seconds'
+        FROM generate_series(%(start)s::bigint, %(end)s::bigint) AS i, {BENCH_USER_IDS} AS u
+    """)
+
+    # Треки коллекций выбираются из диапазона идентификаторов сгенерированных треков
+    cursor.execute(f"""
+        SELECT min(t.track_id), max(t.track_id) FROM tracks t, {BENCH_USER_IDS} AS u
+        WHERE t.user_id = ANY(u.ids)
+    """)
+    track_lo, track_hi = cursor.fetchone()
+    cursor.execute(f"""
+        SELECT min(c.collection_id) FROM collections c, {BENCH_USER_IDS} AS u
+        WHERE c.user_id = ANY(u.ids)
+    """)
+    collection_lo = cursor.fetchone()[0]
+    conn.commit()
+    if track_lo is not None and collection_lo is not None and args.tracks_per_collection:
+        span = track_hi - track_lo + 1
+        per = args.tracks_per_collection
+        run_batches(conn, 'треки в коллекциях', args.collections, max(1, args.batch // per), f"""
+            INSERT INTO collection_tracks (collection_id, track_id, added_at)
+            SELECT c.collection_id, t.track_id,
+                   c.created_at + j * INTERVAL '1 minute'
+            FROM generate_series(%(start)s::bigint, %(end)s::bigint) AS i
+            JOIN collections c ON c.collection_id = {collection_lo} + i - 1
+            CROSS JOIN generate_series(0, {per - 1}) AS j
+            JOIN tracks t ON t.track_id = {track_lo} + ((i * {per} + j) * 15485863) %% {span}
+            ON CONFLICT DO NOTHING
+        """)
+
+    run_batches(conn, 'избранное', args.users, args.batch, f"""
+        WITH bench AS (
+            SELECT u.ids[i] AS user_id, i FROM generate_series(%(start)s::bigint, %(end)s::bigint) AS i,
+                   {BENCH_USER_IDS} AS u
+            WHERE i <= cardinality(u.ids)
+        ), favorite_genres AS (
+            INSERT INTO user_favorite_genres (user_id, genre_id)
+            SELECT bench.user_id, {pick('g', 'bench.i * 3 + j')}
+            FROM bench, generate_series(0, 2) AS j, {BENCH_GENRE_IDS} AS g
+            ON CONFLICT DO NOTHING
+        )
+        INSERT INTO user_favorite_artists (user_id, artist_id)
+        SELECT bench.user_id, {pick('a', 'bench.i * 5 + j')}
+        FROM bench, generate_series(0, 2) AS j, {BENCH_ARTIST_IDS} AS a
+        ON CONFLICT DO NOTHING
+    """)
+
+    if args.skip_triggers:
+        cursor.execute("RESET session_replication_role")
+        cursor.execute(f"""
+            UPDATE collections c SET tracks_count = counts.n
+            FROM (SELECT collection_id, count(*) AS n FROM collection_tracks GROUP BY collection_id) AS counts,
+                 {BENCH_USER_IDS} AS u
+            WHERE c.collection_id = counts.collection_id AND c.user_id = ANY(u.ids)
+        """)
+        conn.commit()
+
+    conn.autocommit = True
+    cursor.execute('ANALYZE')
+    cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000, help='число пользователей')
+    parser.add_argument('--tracks', type=int, default=500000, help='число треков')
+    parser.add_argument('--collections', type=int, default=50000, help='число коллекций')
+    parser.add_argument('--tracks-per-collection', type=int, default=20, help='треков в каждой коллекции')
+    parser.add_argument('--artists', type=int, default=5000, help='число исполнителей')
+    parser.add_argument('--genres', type=int, default=40, help='число жанров')
+    parser.add_argument('--password', default='bench', help='пароль сгенерированных пользователей')
+    parser.add_argument('--legacy-passwords', action='store_true',
+                        help='хранить пароли в старом формате pgp_sym_encrypt (нужен pgcrypto)')
+    parser.add_argument('--batch', type=int, default=100000, help='строк в одной транзакции')
+    parser.add_argument('--reset', action='store_true', help='удалить ранее сгенерированные данные (нужны права суперпользователя)')
+    parser.add_argument('--skip-triggers', action='store_true',
+                        help='не вызывать триггеры при загрузке (быстрее, без записей аудита)')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f'SELECT count(*) FROM "user" WHERE {IS_BENCH_USER}')
+        existing = cursor.fetchone()[0]
+        cursor.close()
+        if args.reset:
+            print('Удаление ранее сгенерированных данных...')
+            reset(conn)
+        elif existing:
+            print(f"✗ В БД уже есть сгенерированные данные ({existing:,} пользователей). Используйте --reset")
+            sys.exit(1)
+
+        print('Генерация данных...')
+        started = time.perf_counter()
+        generate(conn, args)
+        print(f"Готово за {time.perf_counter() - started:.1f} с")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
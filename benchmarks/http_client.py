@@ -0,0 +1,131 @@
+"""
+Общие части нагрузочных скриптов: минимальный асинхронный HTTP/1.1 клиент с
+постоянным соединением, получение токена и вычисление перцентилей.
+
+Используется из bench_async_vs_sync.py и load_test.py, которые запускаются
+как скрипты из каталога benchmarks (python benchmarks/<script>.py).
+"""
+
+import asyncio
+import json
+import math
+import resource
+import urllib.request
+
+
+class HttpClient:
+    """Минимальный HTTP/1.1 клиент с постоянным соединением"""
+
+    def __init__(self, host, port, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = None
+        self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+        self.reader = self.writer = None
+
+    async def get(self, path):
+        """Отправить GET и прочитать ответ целиком, вернуть код статуса"""
+        status, _ = await self.request('GET', path)
+        return status
+
+    async def request(self, method, path, body=None):
+        """Отправить запрос (body сериализуется в JSON), вернуть (статус, тело ответа)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            return await self._request(method, path, body)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _request(self, method, path, body):
+        headers = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {self.host}:{self.port}',
+            'Connection: keep-alive',
+        ]
+        if self.token:
+            headers.append(f'Authorization: Bearer {self.token}')
+        payload = b''
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers.append('Content-Type: application/json')
+        if body is not None or method not in ('GET', 'HEAD', 'DELETE'):
+            headers.append(f'Content-Length: {len(payload)}')
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('connection closed by server')
+        status = int(status_line.split()[1])
+
+        length = None
+        chunked = False
+        keep_alive = status_line.startswith(b'HTTP/1.1')
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding':
+                chunked = 'chunked' in value
+            elif name == 'connection':
+                keep_alive = value == 'keep-alive'
+
+        if method == 'HEAD':
+            data = b''
+        elif chunked:
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunks.append((await self.reader.readexactly(size + 2))[:-2])
+                if size == 0:
+                    break
+            data = b''.join(chunks)
+        elif length is not None:
+            data = await self.reader.readexactly(length)
+        else:
+            data = await self.reader.read()
+            keep_alive = False
+
+        if not keep_alive:
+            await self.close()
+        return status, data
+
+
+def login(base_url, user, password):
+    """Получить JWT-токен через /api/auth/login"""
+    request = urllib.request.Request(
+        base_url.rstrip('/') + '/api/auth/login',
+        data=json.dumps({'login': user, 'password': password}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())['token']
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def raise_fd_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест сервера на сценариях веб-клиента (client/script.js).
+
+Данные готовятся заранее скриптом generate_data.py; клиенты входят под
+пользователями bench_user_1 .. bench_user_<--users> с паролем --password.
+Каждый из --clients клиентов через постоянное соединение выполняет сценарии,
+выбранные случайно (с фиксированным --seed) по весам --mix:
+
+    browse  открытие главной страницы: профиль, жанры, исполнители,
+            первые две страницы треков, коллекции
+    search  поиск треков по слову из названия, иногда с диапазоном BPM
+    edit    создание коллекции, добавление треков пакетом, просмотр,
+            удаление трека, переименование и удаление коллекции
+    login   повторный вход
+
+Статистика собирается за --duration секунд после --warmup секунд прогрева
+по каждому эндпоинту (метод и шаблон пути): число запросов, ошибки (статус
+>= 400, обрывы, таймауты), запросов в секунду и задержки p50/p95/p99.
+
+С --save-baseline результаты сохраняются в JSON. С --baseline они
+сравниваются с сохраненными: если у эндпоинта p95 или p99 выросли либо
+пропускная способность упала больше чем на --max-regression (доля), или
+выросла доля ошибок, скрипт завершается с кодом 1.
+
+Пример:
+    python benchmarks/generate_data.py --users 10000 --tracks 5000000 --collections 500000
+    gunicorn -c gunicorn.conf.py &
+    python benchmarks/load_test.py --clients 200 --save-baseline baseline.json
+    python benchmarks/load_test.py --clients 200 --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from urllib.parse import quote, urlsplit
+
+from generate_data import TITLE_WORDS, USER_PREFIX
+from http_client import HttpClient, percentile, raise_fd_limit
+
+DEFAULT_MIX = 'browse=60,search=25,edit=10,login=5'
+PAGE_SIZE = 50
+
+# Эндпоинты с меньшим числом запросов не сравниваются с базовой линией
+MIN_REQUESTS = 20
+# Допустимый рост доли ошибок эндпоинта относительно базовой линии
+MAX_ERROR_RATE_INCREASE = 0.01
+
+
+class StepFailed(Exception):
+    """Запрос сценария завершился ошибкой; оставшиеся шаги пропускаются"""
+
+
+class Session:
+    """Один клиент: соединение, токен пользователя и общая статистика"""
+
+    def __init__(self, client, login, password, rng, stats, measure_from, timeout):
+        self.client = client
+        self.login_name = login
+        self.password = password
+        self.rng = rng
+        self.stats = stats
+        self.measure_from = measure_from
+        self.timeout = timeout
+        self.track_ids = []
+
+    async def call(self, label, method, path, body=None):
+        """Выполнить запрос и учесть его под меткой label; вернуть JSON ответа"""
+        started = time.perf_counter()
+        try:
+            status, data = await asyncio.wait_for(self.client.request(method, path, body), self.timeout)
+            failed = status >= 400
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            failed = True
+            data = b''
+        if started >= self.measure_from:
+            entry = self.stats[label]
+            if failed:
+                entry['errors'] += 1
+            else:
+                entry['latencies'].append(time.perf_counter() - started)
+        if failed:
+            raise StepFailed(label)
+        return json.loads(data) if data else None
+
+    async def login(self):
+        self.client.token = None
+        result = await self.call('POST /api/auth/login', 'POST', '/api/auth/login',
+                                 {'login': self.login_name, 'password': self.password})
+        self.client.token = result['token']
+
+    async def browse(self):
+        await self.call('GET /api/profile', 'GET', '/api/profile')
+        await self.call('GET /api/genres', 'GET', '/api/genres')
+        await self.call('GET /api/artists', 'GET', '/api/artists')
+        page = await self.call('GET /api/tracks', 'GET', f'/api/tracks?limit={PAGE_SIZE}')
+        self.track_ids = [track['track_id'] for track in page['items']]
+        if page['next']:
+            await self.call('GET /api/tracks', 'GET',
+                            f"/api/tracks?limit={PAGE_SIZE}&cursor={quote(page['next'])}")
+        await self.call('GET /api/collections', 'GET', '/api/collections')
+
+    async def search(self):
+        path = f'/api/search/tracks?limit={PAGE_SIZE}&title={self.rng.choice(TITLE_WORDS)}'
+        if self.rng.random() < 0.3:
+            bpm_min = self.rng.randrange(60, 180)
+            path += f'&bpm_min={bpm_min}&bpm_max={bpm_min + 20}'
+        await self.call('GET /api/search/tracks', 'GET', path)
+
+    async def edit(self):
+        if not self.track_ids:
+            page = await self.call('GET /api/tracks', 'GET', f'/api/tracks?limit={PAGE_SIZE}')
+            self.track_ids = [track['track_id'] for track in page['items']]
+            if not self.track_ids:
+                return
+        created = await self.call('POST /api/collections', 'POST', '/api/collections',
+                                  {'name': f'Load test {self.rng.randrange(10 ** 9)}'})
+        collection = f"/api/collections/{created['collection_id']}"
+        try:
+            track_ids = self.rng.sample(self.track_ids, min(5, len(self.track_ids)))
+            await self.call('POST /api/collections/<id>/tracks/batch', 'POST',
+                            collection + '/tracks/batch', {'track_ids': track_ids})
+            await self.call('GET /api/collections/<id>', 'GET', f'{collection}?limit={PAGE_SIZE}')
+            await self.call('DELETE /api/collections/<id>/tracks/<id>', 'DELETE',
+                            f'{collection}/tracks/{track_ids[0]}')
+            await self.call('PUT /api/collections/<id>', 'PUT', collection,
+                            {'name': 'Load test renamed', 'is_favorite': False})
+        finally:
+            # Коллекция удаляется всегда, чтобы объем данных не рос от прогона к прогону
+            await self.call('DELETE /api/collections/<id>', 'DELETE', collection)
+
+
+async def client_loop(session, scenarios, weights, stop_at):
+    try:
+        await session.login()
+    except StepFailed:
+        return
+    while time.perf_counter() < stop_at:
+        scenario = session.rng.choices(scenarios, weights)[0]
+        try:
+            await getattr(session, scenario)()
+        except StepFailed:
+            if session.client.token is None:
+                return
+
+
+async def run(args, scenarios, weights):
+    parts = urlsplit(args.url)
+    stats = defaultdict(lambda: {'latencies': [], 'errors': 0})
+    now = time.perf_counter()
+    measure_from = now + args.warmup
+    stop_at = measure_from + args.duration
+
+    sessions = []
+    for index in range(args.clients):
+        client = HttpClient(parts.hostname, parts.port or 80)
+        login = f'{USER_PREFIX}{index % args.users + 1}'
+        rng = random.Random(args.seed * 100003 + index)
+        sessions.append(Session(client, login, args.password, rng, stats, measure_from, args.timeout))
+    await asyncio.gather(*(client_loop(session, scenarios, weights, stop_at) for session in sessions))
+    await asyncio.gather(*(session.client.close() for session in sessions))
+    return stats
+
+
+def summarize(stats, duration):
+    endpoints = {}
+    all_latencies = []
+    all_errors = 0
+    for label, entry in sorted(stats.items()):
+        latencies = sorted(entry['latencies'])
+        all_latencies.extend(latencies)
+        all_errors += entry['errors']
+        endpoints[label] = summarize_latencies(latencies, entry['errors'], duration)
+    total = summarize_latencies(sorted(all_latencies), all_errors, duration)
+    return {'endpoints': endpoints, 'total': total}
+
+
+def summarize_latencies(latencies, errors, duration):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }
+
+
+def print_report(summary):
+    print(f"{'Эндпоинт':<44} {'Запросов':>9} {'Ошибок':>7} {'Запр/с':>9} "
+          f"{'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9}")
+    rows = list(summary['endpoints'].items()) + [('Всего', summary['total'])]
+    for label, row in rows:
+        print(f"{label:<44} {row['requests']:>9} {row['errors']:>7} {row['rps']:>9.1f} "
+              f"{row['p50']:>9.1f} {row['p95']:>9.1f} {row['p99']:>9.1f}")
+
+
+def error_rate(row):
+    attempts = row['requests'] + row['errors']
+    return row['errors'] / attempts if attempts else 0.0
+
+
+def compare(summary, baseline, tolerance):
+    """Список регрессий относительно базовой линии"""
+    regressions = []
+    rows = dict(summary['endpoints'], **{'Всего': summary['total']})
+    base_rows = dict(baseline['endpoints'], **{'Всего': baseline['total']})
+    for label, base in base_rows.items():
+        row = rows.get(label)
+        if row is None or base['requests'] < MIN_REQUESTS:
+            continue
+        for metric in ('p95', 'p99'):
+            if row[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{label}: {metric} {base[metric]:.1f} -> {row[metric]:.1f} мс")
+        if row['rps'] < base['rps'] * (1 - tolerance):
+            regressions.append(f"{label}: запр/с {base['rps']:.1f} -> {row['rps']:.1f}")
+        if error_rate(row) > error_rate(base) + MAX_ERROR_RATE_INCREASE:
+            regressions.append(f"{label}: доля ошибок {error_rate(base):.1%} -> {error_rate(row):.1%}")
+    return regressions
+
+
+def parse_mix(mix):
+    scenarios, weights = [], []
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ('browse', 'search', 'edit', 'login'):
+            raise SystemExit(f'Неизвестный сценарий: {name}')
+        scenarios.append(name)
+        weights.append(float(weight or 1))
+    return scenarios, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000', help='адрес сервера')
+    parser.add_argument('--users', type=int, default=100, help='число пользователей bench_user_N для входа')
+    parser.add_argument('--password', default='bench', help='пароль сгенерированных пользователей')
+    parser.add_argument('--clients', type=int, default=50, help='число одновременных клиентов')
+    parser.add_argument('--duration', type=float, default=30, help='длительность измерения, сек')
+    parser.add_argument('--warmup', type=float, default=5, help='прогрев перед измерением, сек')
+    parser.add_argument('--timeout', type=float, default=30, help='таймаут одного запроса, сек')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='веса сценариев: browse, search, edit, login')
+    parser.add_argument('--seed', type=int, default=1, help='зерно генератора случайных чисел')
+    parser.add_argument('--save-baseline', metavar='FILE', help='сохранить результаты как базовую линию')
+    parser.add_argument('--baseline', metavar='FILE', help='сравнить с базовой линией')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='допустимое ухудшение p95/p99 и запр/с относительно базовой линии (доля)')
+    args = parser.parse_args()
+
+    scenarios, weights = parse_mix(args.mix)
+    raise_fd_limit(args.clients + 256)
+
+    print(f"Клиентов: {args.clients}, сценарии: {args.mix}, измерение {args.duration:g} с")
+    stats = asyncio.run(run(args, scenarios, weights))
+    summary = summarize(stats, args.duration)
+    print_report(summary)
+
+    if args.save_baseline:
+        summary['params'] = {'clients': args.clients, 'mix': args.mix, 'duration': args.duration,
+                             'users': args.users, 'seed': args.seed}
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"Базовая линия сохранена в {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        params = baseline.get('params', {})
+        if params.get('clients') not in (None, args.clients) or params.get('mix') not in (None, args.mix):
+            print(f"⚠ Базовая линия снята с другими параметрами: {params}")
+        regressions = compare(summary, baseline, args.max_regression)
+        if regressions:
+            print(f"✗ Регрессия относительно {args.baseline} (допуск {args.max_regression:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"✓ Регрессий относительно {args.baseline} нет (допуск {args.max_regression:.0%})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Сборка клиентских файлов (client/) для выдачи сервером.
+
+script.js и styles.css минифицируются и записываются в client/dist/ под
+именами с хэшем содержимого (script.<хэш>.js). HTML-страницы также
+минифицируются, а ссылки /static/script.js и /static/styles.css в них
+заменяются на имена с хэшем. Рядом с каждым файлом сохраняются сжатые
+варианты .gz и .br (для .br нужен пакет Brotli), если они меньше исходного.
+
+Сервер (static_assets.py) выбирает вариант по заголовку Accept-Encoding.
+Файлы с хэшем отдаются с Cache-Control: immutable, а страницы проверяются
+по ETag (ответ 304), поэтому повторная загрузка страницы не передает файлы
+ресурсов. Без сборки сервер отдает исходные файлы из client/.
+
+Файлы с хэшем от предыдущих сборок остаются в client/dist/, чтобы страницы,
+загруженные до обновления, получили свои версии; --clean удаляет все, кроме
+текущей сборки. Повторные сборки сервер подхватывает без перезапуска; после
+первой сборки (или установки Brotli) сервер нужно перезапустить.
+
+Пример:
+    python build_assets.py
+    python build_assets.py --clean
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+from static_assets import MANIFEST_NAME
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SOURCE_DIR = os.path.join(ROOT, 'client')
+BUILD_DIR = os.path.join(SOURCE_DIR, 'dist')
+
+ASSETS = ('script.js', 'styles.css')
+PAGES = ('index.html', 'login.html', 'register.html')
+
+# Символы, рядом с которыми пробел в JS не нужен
+JS_PUNCTUATION = set('{}()[];,:=<>?!&|')
+# После этих символов перевод строки не может завершить оператор (ASI)
+JS_NO_ASI_AFTER = set('{;,([')
+# После них "/" начинает регулярное выражение, а не деление
+JS_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^')
+JS_REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete',
+                     'void', 'throw', 'instanceof', 'yield', 'await')
+
+STATIC_REFERENCE = re.compile(r'''((?:src|href)=["'])/static/([^"'?#]+)(["'])''')
+
+
+def is_identifier_char(char):
+    return char.isalnum() or char in '_$'
+
+
+def minify_js(source):
+    """Удалить комментарии и лишние пробелы и переводы строк.
+
+    Строки, шаблонные строки (включая вложенные ${...}) и регулярные
+    выражения копируются без изменений. Перевод строки сохраняется везде,
+    где он может завершать оператор, а между двумя символами идентификатора
+    или операторами вроде "+ +" остается пробел.
+    """
+    out = []
+    last = ''            # последний выведенный значимый символ
+    word = ''            # последний выведенный идентификатор или ключевое слово
+    space = newline = False
+    template_braces = []  # глубина фигурных скобок внутри каждого открытого ${
+    i = 0
+    length = len(source)
+
+    def emit(text):
+        nonlocal last
+        out.append(text)
+        last = text[-1]
+
+    def copy_quoted(start, quote):
+        """Скопировать строку или регулярное выражение, вернуть индекс после него"""
+        j = start + 1
+        in_class = False
+        while j < length:
+            char = source[j]
+            if char == '\\':
+                j += 2
+                continue
+            if quote == '/' and char == '[':
+                in_class = True
+            elif quote == '/' and char == ']':
+                in_class = False
+            elif char == quote and not in_class:
+                break
+            j += 1
+        emit(source[start:j + 1])
+        return j + 1
+
+    def copy_template(start):
+        """Скопировать часть шаблонной строки от ` или } до закрывающей ` или до ${"""
+        j = start + 1
+        while j < length:
+            char = source[j]
+            if char == '\\':
+                j += 2
+                continue
+            if char == '`':
+                emit(source[start:j + 1])
+                return j + 1, False
+            if char == '$' and source[j + 1:j + 2] == '{':
+                emit(source[start:j + 2])
+                return j + 2, True
+            j += 1
+        emit(source[start:])
+        return length, False
+
+    while i < length:
+        char = source[i]
+        if char in ' \t\r':
+            space = True
+            i += 1
+            continue
+        if char == '\n':
+            newline = True
+            i += 1
+            continue
+        if char == '/' and source[i + 1:i + 2] == '/':
+            end = source.find('\n', i)
+            i = length if end == -1 else end
+            continue
+        if char == '/' and source[i + 1:i + 2] == '*':
+            end = source.find('*/', i + 2)
+            i = length if end == -1 else end + 2
+            space = True
+            continue
+
+        if out:
+            if newline and last not in JS_NO_ASI_AFTER:
+                out.append('\n')
+            elif (space or newline) and last not in JS_PUNCTUATION and char not in JS_PUNCTUATION:
+                out.append(' ')
+        space = newline = False
+
+        if char in '\'"':
+            i = copy_quoted(i, char)
+            word = ''
+        elif char == '/' and (not last or last in JS_REGEX_AFTER or word in JS_REGEX_KEYWORDS):
+            i = copy_quoted(i, '/')
+            word = ''
+        elif char == '`' or (char == '}' and template_braces and template_braces[-1] == 0):
+            # Шаблонная строка или ее продолжение после ${...}
+            if char == '}':
+                template_braces.pop()
+            i, opened = copy_template(i)
+            if opened:
+                template_braces.append(0)
+            word = ''
+        elif is_identifier_char(char):
+            j = i
+            while j < length and is_identifier_char(source[j]):
+                j += 1
+            word = source[i:j]
+            emit(word)
+            i = j
+        else:
+            if template_braces:
+                if char == '{':
+                    template_braces[-1] += 1
+                elif char == '}':
+                    template_braces[-1] -= 1
+            emit(char)
+            word = ''
+            i += 1
+    return ''.join(out).strip() + '\n'
+
+
+def minify_css(source):
+    """Удалить комментарии и пробелы вокруг разделителей"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{}:;,>])\s*', r'\1', source)
+    # Пробел перед "(" нужен в условиях @media: "and (max-width...)"
+    source = re.sub(r'\band\(', 'and (', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify_html(source, names):
+    """Минифицировать страницу: встроенные <script> и <style>, отступы, комментарии.
+
+    Ссылки вида /static/<файл> на собранные файлы заменяются именами с хэшем
+    из ``names``.
+    """
+    def script(match):
+        return match.group(1) + minify_js(match.group(2)).strip() + match.group(3)
+
+    def style(match):
+        return match.group(1) + minify_css(match.group(2)).strip() + match.group(3)
+
+    def reference(match):
+        name = names.get(match.group(2), match.group(2))
+        return match.group(1) + '/static/' + name + match.group(3)
+
+    source = re.sub(r'(<script>)(.*?)(</script>)', script, source, flags=re.S)
+    source = re.sub(r'(<style>)(.*?)(</style>)', style, source, flags=re.S)
+    source = re.sub(r'<!--.*?-->', '', source, flags=re.S)
+    source = re.sub(r'\n\s*', '\n', source)
+    source = STATIC_REFERENCE.sub(reference, source)
+    return source.strip() + '\n'
+
+
+def hashed_name(filename, content):
+    stem, ext = os.path.splitext(filename)
+    return '%s.%s%s' % (stem, hashlib.sha256(content).hexdigest()[:10], ext)
+
+
+def write_file(path, content):
+    """Записать атомарно: работающий сервер не увидит файл наполовину"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def write_variants(filename, content):
+    """Записать файл и его сжатые варианты; вернуть размеры {вариант: байт}"""
+    path = os.path.join(BUILD_DIR, filename)
+    write_file(path, content)
+    sizes = {'': len(content)}
+    compressed = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressed['.br'] = brotli.compress(content, quality=11)
+    for suffix, data in compressed.items():
+        if len(data) < len(content):
+            write_file(path + suffix, data)
+            sizes[suffix] = len(data)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return sizes
+
+
+def clean(keep):
+    """Удалить файлы прежних сборок, кроме ``keep`` и их сжатых вариантов"""
+    removed = 0
+    for filename in os.listdir(BUILD_DIR):
+        base = filename[:-3] if filename.endswith(('.gz', '.br')) else filename
+        if base not in keep and base != MANIFEST_NAME:
+            os.remove(os.path.join(BUILD_DIR, filename))
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clean', action='store_true', help='удалить файлы прежних сборок')
+    args = parser.parse_args()
+
+    os.makedirs(BUILD_DIR, exist_ok=True)
+    if brotli is None:
+        print("Пакет Brotli не установлен: варианты .br не создаются (pip install Brotli)", file=sys.stderr)
+
+    report = []
+    names = {}
+    minifiers = {'.js': minify_js, '.css': minify_css}
+    for filename in ASSETS:
+        with open(os.path.join(SOURCE_DIR, filename), encoding='utf-8') as f:
+            source = f.read()
+        content = minifiers[os.path.splitext(filename)[1]](source).encode('utf-8')
+        names[filename] = hashed_name(filename, content)
+        report.append((names[filename], len(source.encode('utf-8')), write_variants(names[filename], content)))
+
+    for filename in PAGES:
+        with open(os.path.join(SOURCE_DIR, filename), encoding='utf-8') as f:
+            source = f.read()
+        content = minify_html(source, names).encode('utf-8')
+        report.append((filename, len(source.encode('utf-8')), write_variants(filename, content)))
+
+    # Манифест записывается последним: сервер считает сборку готовой только с ним
+    manifest = {'assets': names, 'pages': list(PAGES)}
+    write_file(os.path.join(BUILD_DIR, MANIFEST_NAME),
+               json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+
+    print(f"{'Файл':<28}{'Исходный':>10}{'Минифиц.':>10}{'gzip':>8}{'brotli':>8}")
+    for filename, original, sizes in report:
+        print(f"{filename:<28}{original:>10}{sizes['']:>10}{sizes.get('.gz', '-'):>8}{sizes.get('.br', '-'):>8}")
+    print(f"Сборка записана в {os.path.relpath(BUILD_DIR, ROOT)}/")
+
+    if args.clean:
+        print(f"Удалено файлов прежних сборок: {clean(set(names.values()) | set(PAGES))}")
+
+
+if __name__ == '__main__':
+    main()
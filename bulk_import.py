@@ -0,0 +1,148 @@
+"""Parsing and validation of bulk track imports fed to PostgreSQL COPY"""
+
+import csv
+import io
+import json
+
+IMPORT_FIELDS = ('title', 'artist', 'genre', 'bpm', 'duration_sec')
+
+# Column limits from database_schema.sql
+MAX_TITLE_LENGTH = 255
+MAX_NAME_LENGTH = 100
+# bpm and duration_sec are INTEGER columns without CHECK constraints; the import
+# only accepts non-negative values, so the bounds are [0, INT32_MAX]
+MAX_INTEGER = 2 ** 31 - 1
+
+
+def _is_valid_text(value):
+    """False for strings holding undecodable bytes (lone surrogates from surrogateescape)"""
+    if isinstance(value, list):
+        return all(_is_valid_text(item) for item in value)
+    if not isinstance(value, str):
+        return True
+    try:
+        value.encode('utf-8')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def iter_records(stream, content_type):
+    """Yield (line_no, record) pairs from a CSV (with header) or NDJSON byte stream.
+
+    ``record`` is a dict, or an exception instance when the line could not be
+    parsed at all, including lines that are not valid UTF-8.
+    """
+    if content_type == 'text/csv':
+        # Invalid bytes are kept as surrogates so the reader keeps going and
+        # the record that contains them is rejected on its own
+        text = io.TextIOWrapper(stream, encoding='utf-8', errors='surrogateescape', newline='')
+        reader = csv.DictReader(text)
+        for record in reader:
+            if not all(_is_valid_text(value) for value in record.values()):
+                record = ValueError('Line is not valid UTF-8')
+            yield reader.line_num, record
+    else:
+        for line_no, raw in enumerate(stream, start=1):
+            try:
+                line = raw.decode('utf-8')
+            except UnicodeDecodeError:
+                yield line_no, ValueError('Line is not valid UTF-8')
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_no, ValueError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                record = ValueError('Each line must be a JSON object')
+            yield line_no, record
+
+
+def _optional_int(record, field):
+    value = record.get(field)
+    if value is None or value == '':
+        return None
+    # JSON booleans and fractional numbers would be silently coerced by int()
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f'{field} must be an integer')
+    try:
+        number = int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'{field} must be an integer')
+    if number < 0:
+        raise ValueError(f'{field} must not be negative')
+    if number > MAX_INTEGER:
+        raise ValueError(f'{field} must not exceed {MAX_INTEGER}')
+    return number
+
+
+def _required_text(record, field, max_length):
+    value = record.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if value is None or value == '':
+        raise ValueError(f'{field} is required')
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    if len(value) > max_length:
+        raise ValueError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def validate_record(record):
+    """Normalize a parsed record to an IMPORT_FIELDS tuple or raise ValueError"""
+    if isinstance(record, Exception):
+        raise record
+    return (
+        _required_text(record, 'title', MAX_TITLE_LENGTH),
+        _required_text(record, 'artist', MAX_NAME_LENGTH),
+        _required_text(record, 'genre', MAX_NAME_LENGTH),
+        _optional_int(record, 'bpm'),
+        _optional_int(record, 'duration_sec'),
+    )
+
+
+class CopySource:
+    """File-like object that feeds validated rows to ``cursor.copy_expert``.
+
+    Rows are encoded as CSV with a leading line number column. Rejected lines
+    are recorded in ``errors`` (up to ``max_errors``) and counted in
+    ``rejected``; nothing is buffered beyond the current read.
+    """
+
+    def __init__(self, records, max_errors):
+        self._records = records
+        self._buffer = b''
+        self.max_errors = max_errors
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def _next_row(self):
+        for line_no, record in self._records:
+            try:
+                row = validate_record(record)
+            except ValueError as e:
+                self.rejected += 1
+                if len(self.errors) < self.max_errors:
+                    self.errors.append({'line': line_no, 'message': str(e)})
+                continue
+            self.accepted += 1
+            return (line_no,) + row
+        return None
+
+    def read(self, size=-1):
+        target = size if size > 0 else 65536
+        if len(self._buffer) < target:
+            out = io.StringIO()
+            writer = csv.writer(out)
+            while len(self._buffer) + out.tell() < target:
+                row = self._next_row()
+                if row is None:
+                    break
+                writer.writerow(row)
+            self._buffer += out.getvalue().encode('utf-8')
+        data, self._buffer = self._buffer[:target], self._buffer[target:]
+        return data
@@ -0,0 +1,228 @@
+"""In-process caches used by server.py"""
+
+import hashlib
+import select
+import threading
+import time
+from collections import OrderedDict
+
+from psycopg2 import sql
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    ``version()`` changes on every invalidation; passing the value read
+    before a load to ``set`` drops the entry if anything was invalidated
+    meanwhile, so a row read just before a concurrent change is not cached.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def version(self):
+        with self._lock:
+            return self._version
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            self._version += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._version += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.maxsize,
+                'ttl_sec': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class ReferenceDataCache:
+    """Serialized, ETag-tagged snapshots of rarely changing reference data.
+
+    Each named entry (e.g. ``'genres'``) holds the JSON body and a strong ETag
+    derived from its content, so every worker produces the same ETag for the
+    same data. Entries are dropped by ``invalidate()``, either directly after a
+    local write or by a NotificationListener when another process changes the
+    data; ``ttl`` is only a safety net for missed notifications.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._entries = {}    # name -> (expires_at, body, etag)
+        self._versions = {}   # name -> invalidation counter
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, name):
+        """Return (cached (body, etag) or None, version to pass to _store)"""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and entry[0] >= time.monotonic():
+                self.hits += 1
+                return (entry[1], entry[2]), None
+            self.misses += 1
+            return None, self._versions.setdefault(name, 0)
+
+    def _store(self, name, version, body):
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        with self._lock:
+            # Don't store a snapshot that was invalidated while it was loading
+            if self._versions.get(name, 0) == version:
+                self._entries[name] = (time.monotonic() + self.ttl, body, etag)
+        return body, etag
+
+    def get(self, name, loader):
+        """Return (body, etag), calling ``loader() -> bytes`` on a miss"""
+        cached, version = self._lookup(name)
+        if cached is not None:
+            return cached
+        return self._store(name, version, loader())
+
+    async def aget(self, name, loader):
+        """Like ``get`` with a coroutine ``loader``, for the asyncio server"""
+        cached, version = self._lookup(name)
+        if cached is not None:
+            return cached
+        return self._store(name, version, await loader())
+
+    def invalidate(self, name):
+        with self._lock:
+            self._entries.pop(name, None)
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            for name in self._versions:
+                self._versions[name] += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class NotificationListener:
+    """Dispatches PostgreSQL NOTIFY payloads to the caches subscribed to a channel.
+
+    A daemon thread holds its own connection from ``connect()`` and LISTENs
+    on every subscribed channel; ``start()`` is called lazily so pre-forking
+    servers run one listener per worker. Notifications sent while the
+    connection is down are lost, so each subscriber's ``on_reset`` runs after
+    every (re)connect, and ``connected`` is False until LISTEN is active
+    again: caches of authorization data must not be used while it is False.
+    """
+
+    # Idle connections are checked this often, so a silently dropped one is noticed
+    PING_INTERVAL = 30
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.connected = False
+        self._handlers = {}   # channel -> [(on_notify, on_reset)]
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, channel, on_notify, on_reset):
+        """Call ``on_notify(payload)`` for every NOTIFY on ``channel``; subscribe before start()"""
+        with self._lock:
+            self._handlers.setdefault(channel, []).append((on_notify, on_reset))
+
+    @property
+    def alive(self):
+        thread = self._thread
+        return thread is not None and thread.is_alive()
+
+    def start(self):
+        if self.alive:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._listen, name='cache-listener', daemon=True)
+            self._thread.start()
+
+    def _reset(self):
+        for handlers in self._handlers.values():
+            for _, on_reset in handlers:
+                on_reset()
+
+    def _dispatch(self, notify):
+        for on_notify, _ in self._handlers.get(notify.channel, ()):
+            on_notify(notify.payload)
+
+    def _listen(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = self.connect()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    for channel in self._handlers:
+                        cursor.execute(sql.SQL('LISTEN {}').format(sql.Identifier(channel)))
+                    # Notifications sent while we were disconnected are lost
+                    self._reset()
+                    self.connected = True
+                    backoff = 1.0
+                    while True:
+                        if select.select([conn], [], [], self.PING_INTERVAL) == ([], [], []):
+                            cursor.execute('SELECT 1')
+                        conn.poll()
+                        while conn.notifies:
+                            self._dispatch(conn.notifies.pop(0))
+            except Exception as e:
+                print(f"Cache invalidation listener error: {str(e)}")
+                self.connected = False
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None and not conn.closed:
+                    conn.close()
@@ -4,9 +4,26 @@ let isAdmin = false;
 let allGenres = [];
 let userArtists = [];
 
+// Курсоры следующих страниц (null - больше страниц нет)
+let tracksNextCursor = null;
+let adminTracksNextCursor = null;
+let auditNextCursor = null;
+let searchNextCursor = null;
+
+// Треки из локальной копии в порядке показа (null - копии нет, список загружается страницами)
+let userTracks = null;
+
+// Виртуальные таблицы (VirtualTable)
+let tracksTable = null;
+let searchTable = null;
+let adminTable = null;   // таблица открытой вкладки админ-панели
+
 // Базовый URL для API
 const API_BASE_URL = '/api';
 
+// Размер страницы при постраничной загрузке
+const PAGE_SIZE = 50;
+
 // Инициализация при загрузке страницы
 document.addEventListener('DOMContentLoaded', function() {
     initializeApp();
@@ -17,7 +34,8 @@ function initializeApp() {
     // Проверка сессии пользователя
     checkUserSession();
     
-    // Настройка обработчиков событий
+    // Таблицы и обработчики событий
+    setupTables();
     setupEventListeners();
     
     // Загрузка начальных данных
@@ -224,6 +242,23 @@ function deleteArtist(artistId) {
     });
 }
 
+// Таблицы треков и результатов поиска
+function setupTables() {
+    tracksTable = new VirtualTable(document.getElementById('tracks-tbody'), {
+        renderRow: renderTrackRow,
+        key: track => track.track_id,
+        sortKeys: TRACK_SORT_KEYS,
+        searchText: trackSearchText,
+        loadMore: () => loadTracksPage(tracksNextCursor)
+    });
+    searchTable = new VirtualTable(document.getElementById('search-results-tbody'), {
+        renderRow: renderSearchRow,
+        key: track => track.track_id,
+        sortKeys: TRACK_SORT_KEYS,
+        loadMore: () => loadSearchPage(searchNextCursor)
+    });
+}
+
 // Настройка обработчиков событий
 function setupEventListeners() {
     // Навигация
@@ -243,6 +278,8 @@ function setupEventListeners() {
     
     // Треки
     document.getElementById('add-track-btn').addEventListener('click', showAddTrackModal);
+    document.getElementById('tracks-load-more-btn').addEventListener('click', () => tracksTable.requestMore());
+    document.getElementById('tracks-filter').addEventListener('input', e => tracksTable.setFilter(e.target.value));
     
     // Авторы
     document.getElementById('add-artist-btn').addEventListener('click', showAddArtistModal);
@@ -253,6 +290,7 @@ function setupEventListeners() {
     // Поиск
     document.getElementById('search-submit-btn').addEventListener('click', performSearch);
     document.getElementById('search-reset-btn').addEventListener('click', resetSearch);
+    document.getElementById('search-load-more-btn').addEventListener('click', () => searchTable.requestMore());
     
     // Админ-панель
     document.getElementById('admin-users-tab').addEventListener('click', () => switchAdminTab('users'));
@@ -390,6 +428,7 @@ function loadGenresForSearch() {
 function logout() {
     // Очистить токен
     localStorage.removeItem('auth_token');
+    clearTrackCache();
     currentUser = null;
     isAdmin = false;
     
@@ -442,11 +481,413 @@ function changeAvatar() {
     alert('Функция смены аватара будет реализована позже');
 }
 
-// Загрузка треков пользователя
+// Виртуальная таблица: в DOM находятся только видимые строки и запас overscan
+// сверху и снизу, высоту остальных занимают строки-распорки. Записи можно
+// заменять (setItems), дописывать страницами с сервера (append) и догружать
+// при прокрутке к концу (loadMore). Сортировка (щелчок по заголовку) и фильтр
+// меняют только порядок индексов записей и перерисовывают одно окно строк;
+// строки, оставшиеся в окне, не пересоздаются, если их запись не изменилась.
+// Сортировка и фильтр действуют на загруженные записи.
+const VIRTUAL_TABLE_ROW_HEIGHT = 45;   // оценка высоты строки до первого измерения
+const VIRTUAL_TABLE_OVERSCAN = 10;
+const VIRTUAL_TABLE_DEFAULT_ROWS = 20; // строк в окне, пока таблица скрыта
+const tableCollator = new Intl.Collator('ru', { numeric: true, sensitivity: 'base' });
+
+class VirtualTable {
+    // options: renderRow(запись) -> HTML ячеек; key(запись) -> уникальный ключ;
+    // sortKeys - по колонкам заголовка: запись -> значение для сортировки
+    // (null - колонка не сортируется); searchText(запись) -> текст для фильтра;
+    // loadMore() -> Promise следующей страницы
+    constructor(tbody, options) {
+        this.tbody = tbody;
+        this.viewport = tbody.closest('.table-viewport');
+        this.renderRow = options.renderRow;
+        this.key = options.key;
+        this.searchText = options.searchText || null;
+        this.loadMore = options.loadMore || null;
+        this.overscan = options.overscan || VIRTUAL_TABLE_OVERSCAN;
+        this.headers = Array.from(tbody.closest('table').querySelectorAll('thead th'));
+        this.sortKeys = options.sortKeys || [];
+
+        this.items = [];
+        this.view = [];              // индексы items после фильтра и сортировки
+        this.filterQuery = '';
+        this.filterTexts = new WeakMap();
+        this.sortColumn = null;
+        this.sortDirection = 1;
+        this.rows = new Map();       // ключ -> строка <tr> в окне
+        this.rowHeight = 0;
+        this.window = null;          // [first, last, version] последней отрисовки
+        this.version = 0;
+        this.hasMore = false;
+        this.loading = false;
+        this.scrolled = false;
+        this.frame = null;
+
+        this.topSpacer = this.createSpacer();
+        this.bottomSpacer = this.createSpacer();
+        tbody.innerHTML = '';
+        tbody.append(this.topSpacer, this.bottomSpacer);
+
+        this.viewport.addEventListener('scroll', () => {
+            this.scrolled = true;
+            this.scheduleRender();
+        }, { passive: true });
+        // Перерисовать, когда скрытая секция становится видимой или меняется размер окна
+        if (window.ResizeObserver) {
+            new ResizeObserver(() => this.scheduleRender()).observe(this.viewport);
+        }
+        this.headers.forEach((th, column) => {
+            if (!this.sortKeys[column]) return;
+            th.classList.add('sortable');
+            th.addEventListener('click', () => this.toggleSort(column));
+        });
+    }
+
+    createSpacer() {
+        const row = document.createElement('tr');
+        row.className = 'vt-spacer';
+        row.innerHTML = `<td colspan="${this.headers.length || 1}"></td>`;
+        return row;
+    }
+
+    // Заменить записи; keepScroll - сохранить позицию (обновление того же списка)
+    setItems(items, keepScroll = false) {
+        this.items = Array.from(items);
+        this.updateView();
+        if (!keepScroll) this.viewport.scrollTop = 0;
+        this.render();
+    }
+
+    // Дописать следующую страницу
+    append(items) {
+        const start = this.items.length;
+        items.forEach(item => this.items.push(item));
+        if (this.filterQuery || this.sortColumn !== null) {
+            this.updateView();
+        } else {
+            for (let i = start; i < this.items.length; i++) this.view.push(i);
+            this.version++;
+        }
+        this.render();
+    }
+
+    setHasMore(hasMore) {
+        this.hasMore = hasMore;
+    }
+
+    // Догрузить следующую страницу (прокрутка к концу или кнопка "Показать ещё")
+    requestMore() {
+        if (!this.loadMore || !this.hasMore || this.loading) return;
+        this.loading = true;
+        Promise.resolve(this.loadMore()).finally(() => {
+            this.loading = false;
+        });
+    }
+
+    setFilter(query) {
+        this.filterQuery = query.trim().toLowerCase();
+        this.updateView();
+        this.viewport.scrollTop = 0;
+        this.render();
+    }
+
+    // Возрастание -> убывание -> порядок сервера
+    toggleSort(column) {
+        if (this.sortColumn !== column) {
+            this.sortColumn = column;
+            this.sortDirection = 1;
+        } else if (this.sortDirection === 1) {
+            this.sortDirection = -1;
+        } else {
+            this.sortColumn = null;
+        }
+        this.headers.forEach((th, index) => {
+            th.classList.toggle('sort-asc', index === this.sortColumn && this.sortDirection === 1);
+            th.classList.toggle('sort-desc', index === this.sortColumn && this.sortDirection === -1);
+        });
+        this.updateView();
+        this.render();
+    }
+
+    matches(item) {
+        let text = this.filterTexts.get(item);
+        if (text === undefined) {
+            text = this.searchText(item).toLowerCase();
+            this.filterTexts.set(item, text);
+        }
+        return text.includes(this.filterQuery);
+    }
+
+    updateView() {
+        let view = this.items.map((item, index) => index);
+        if (this.filterQuery && this.searchText) {
+            view = view.filter(index => this.matches(this.items[index]));
+        }
+        if (this.sortColumn !== null) {
+            const sortKey = this.sortKeys[this.sortColumn];
+            const values = new Map(view.map(index => [index, sortKey(this.items[index])]));
+            const direction = this.sortDirection;
+            view.sort((a, b) => compareTableValues(values.get(a), values.get(b), direction) || a - b);
+        }
+        this.view = view;
+        this.version++;
+    }
+
+    scheduleRender() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    render() {
+        const height = this.rowHeight || VIRTUAL_TABLE_ROW_HEIGHT;
+        const viewportHeight = this.viewport.clientHeight || height * VIRTUAL_TABLE_DEFAULT_ROWS;
+        const scrollTop = this.viewport.scrollTop;
+        const count = this.view.length;
+        const first = Math.min(count, Math.max(0, Math.floor(scrollTop / height) - this.overscan));
+        const last = Math.min(count, Math.ceil((scrollTop + viewportHeight) / height) + this.overscan);
+
+        if (!this.window || this.window[0] !== first || this.window[1] !== last || this.window[2] !== this.version) {
+            this.window = [first, last, this.version];
+            const rows = new Map();
+            const fragment = document.createDocumentFragment();
+            for (let i = first; i < last; i++) {
+                const item = this.items[this.view[i]];
+                let key = this.key(item);
+                // Повтор записи (например, сдвиг результатов поиска между страницами)
+                if (rows.has(key)) key = `${key}@${i}`;
+                const row = this.rows.get(key) || document.createElement('tr');
+                if (row.vtItem !== item) {
+                    row.innerHTML = this.renderRow(item);
+                    row.vtItem = item;
+                }
+                rows.set(key, row);
+                fragment.appendChild(row);
+            }
+            this.rows.forEach((row, key) => {
+                if (!rows.has(key)) row.remove();
+            });
+            this.rows = rows;
+            this.tbody.insertBefore(fragment, this.bottomSpacer);
+            this.topSpacer.firstChild.style.height = `${first * height}px`;
+            this.bottomSpacer.firstChild.style.height = `${(count - last) * height}px`;
+
+            // Высота строки известна только после первой отрисовки в видимой таблице
+            const measured = rows.size ? rows.values().next().value.offsetHeight : 0;
+            if (measured && measured !== this.rowHeight) {
+                this.rowHeight = measured;
+                this.window = null;
+                this.scheduleRender();
+            }
+        }
+
+        // Догрузка при прокрутке пользователем к концу загруженных записей
+        if (this.scrolled && last >= count - this.overscan) this.requestMore();
+        this.scrolled = false;
+    }
+}
+
+// Сравнение значений колонок: пустые значения в конце при любом направлении
+function compareTableValues(a, b, direction) {
+    const aEmpty = a === null || a === undefined || a === '';
+    const bEmpty = b === null || b === undefined || b === '';
+    if (aEmpty || bEmpty) return aEmpty - bEmpty;
+    if (typeof a === 'number' && typeof b === 'number') return (a - b) * direction;
+    return tableCollator.compare(String(a), String(b)) * direction;
+}
+
+// Сортировка по дате из ответа API (формат HTTP)
+function dateSortKey(value) {
+    return value ? Date.parse(value) : null;
+}
+
+// Загрузка треков пользователя: синхронизация локальной копии, без нее - первая страница с сервера
 function loadUserTracks() {
+    if (isAdmin || !window.indexedDB) {
+        // Администратору список показывает все треки базы: их не копируем
+        loadTracksPage(null);
+        return;
+    }
+    syncUserTracks()
+    .then(tracks => {
+        // Вся копия в таблице; после изменения позиция прокрутки сохраняется
+        const keepScroll = userTracks !== null;
+        userTracks = sortTracks(tracks);
+        displayTracks(userTracks, false, keepScroll);
+        updateTracksLoadMore();
+    })
+    .catch(error => {
+        console.error('Ошибка при синхронизации треков:', error);
+        userTracks = null;
+        loadTracksPage(null);
+    });
+}
+
+function updateTracksLoadMore() {
+    const hasMore = !userTracks && Boolean(tracksNextCursor);
+    tracksTable.setHasMore(hasMore);
+    document.getElementById('tracks-load-more-btn').style.display = hasMore ? 'inline-block' : 'none';
+}
+
+// Порядок как на сервере: новые первыми, при равной дате - больший ID
+function sortTracks(tracks) {
+    return tracks
+        .map(track => ({ track: track, time: Date.parse(track.created_at) || 0 }))
+        .sort((a, b) => b.time - a.time || b.track.track_id - a.track.track_id)
+        .map(entry => entry.track);
+}
+
+// Локальная копия списка треков в IndexedDB. Первый раз список загружается
+// целиком, дальше - только изменения с прошлой синхронизации
+// (GET /api/tracks/changes): после правки одного трека это сотни байт
+// вместо всего списка. Курсор изменений хранится вместе с копией.
+const TRACK_CACHE_DB = 'music-library-tracks';
+const TRACK_SYNC_PAGE_SIZE = 500;   // страница полной загрузки (PAGE_SIZE_MAX сервера)
+
+let trackCache = null;          // { owner, cursor, tracks: Map track_id -> трек }
+let trackCacheDb = null;        // Promise<IDBDatabase или null>
+let trackSyncQueue = Promise.resolve();
+
+function openTrackCache() {
+    if (!trackCacheDb) {
+        trackCacheDb = new Promise(resolve => {
+            const request = indexedDB.open(TRACK_CACHE_DB, 1);
+            request.onupgradeneeded = () => {
+                request.result.createObjectStore('tracks', { keyPath: 'track_id' });
+                request.result.createObjectStore('meta');
+            };
+            request.onsuccess = () => {
+                const db = request.result;
+                // Дать удалить базу при выходе из другой вкладки
+                db.onversionchange = () => db.close();
+                resolve(db);
+            };
+            // Например, приватный режим браузера: работаем без копии
+            request.onerror = () => resolve(null);
+        });
+    }
+    return trackCacheDb;
+}
+
+function idbResult(request) {
+    return new Promise((resolve, reject) => {
+        request.onsuccess = () => resolve(request.result);
+        request.onerror = () => reject(request.error);
+    });
+}
+
+function idbDone(transaction) {
+    return new Promise((resolve, reject) => {
+        transaction.oncomplete = () => resolve();
+        transaction.onerror = transaction.onabort = () => reject(transaction.error);
+    });
+}
+
+// Копия принадлежит пользователю, который ее загрузил
+function trackCacheOwner() {
+    return currentUser && currentUser.user_id != null ? String(currentUser.user_id) : localStorage.getItem('auth_token');
+}
+
+function readTrackCache(db, owner) {
+    const transaction = db.transaction(['tracks', 'meta'], 'readonly');
+    return Promise.all([
+        idbResult(transaction.objectStore('meta').get('sync')),
+        idbResult(transaction.objectStore('tracks').getAll())
+    ])
+    .then(([meta, tracks]) => {
+        if (!meta || meta.owner !== owner) return { owner: owner, cursor: null, tracks: new Map() };
+        return { owner: owner, cursor: meta.cursor, tracks: new Map(tracks.map(track => [track.track_id, track])) };
+    });
+}
+
+// Сохранить изменения и новый курсор одной транзакцией; replace - заменить копию целиком
+function writeTrackCache(db, cache, upserted, deleted, replace) {
+    const transaction = db.transaction(['tracks', 'meta'], 'readwrite');
+    const store = transaction.objectStore('tracks');
+    if (replace) store.clear();
+    upserted.forEach(track => store.put(track));
+    deleted.forEach(trackId => store.delete(trackId));
+    transaction.objectStore('meta').put({ owner: cache.owner, cursor: cache.cursor }, 'sync');
+    return idbDone(transaction);
+}
+
+function fetchApiJson(url) {
+    return fetch(url, {
+        method: 'GET',
+        headers: {
+            'Authorization': `Bearer ${localStorage.getItem('auth_token')}`,
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}: ${url}`);
+        return response.json();
+    });
+}
+
+// Полная загрузка списка страницами по TRACK_SYNC_PAGE_SIZE
+function fetchAllTracks(cursor = null, tracks = []) {
+    return fetchApiJson(buildPageUrl('/tracks', cursor, TRACK_SYNC_PAGE_SIZE))
+    .then(page => {
+        page.items.forEach(track => tracks.push(track));
+        return page.next ? fetchAllTracks(page.next, tracks) : tracks;
+    });
+}
+
+// Привести копию к состоянию сервера; результат - массив треков.
+// Синхронизации выполняются по очереди, чтобы не перезаписывать курсор друг друга.
+function syncUserTracks() {
+    const run = trackSyncQueue.then(() => openTrackCache().then(db => {
+        if (!db) throw new Error('IndexedDB недоступна');
+        const owner = trackCacheOwner();
+        const loaded = trackCache && trackCache.owner === owner
+            ? Promise.resolve(trackCache)
+            : readTrackCache(db, owner);
+        return loaded.then(cache => {
+            const since = cache.cursor ? `?since=${encodeURIComponent(cache.cursor)}` : '';
+            return fetchApiJson(`${API_BASE_URL}/tracks/changes${since}`).then(changes => {
+                if (changes.reset) {
+                    // Курсор получен до загрузки списка: изменения во время загрузки придут в следующий раз
+                    return fetchAllTracks().then(tracks => {
+                        trackCache = { owner: owner, cursor: changes.cursor, tracks: new Map(tracks.map(track => [track.track_id, track])) };
+                        return writeTrackCache(db, trackCache, tracks, [], true);
+                    });
+                }
+                changes.upserted.forEach(track => cache.tracks.set(track.track_id, track));
+                changes.deleted.forEach(trackId => cache.tracks.delete(trackId));
+                cache.cursor = changes.cursor;
+                trackCache = cache;
+                return writeTrackCache(db, cache, changes.upserted, changes.deleted, false);
+            });
+        });
+    }))
+    .then(() => Array.from(trackCache.tracks.values()));
+    trackSyncQueue = run.catch(() => {});
+    return run;
+}
+
+// Удаление локальной копии (выход из системы)
+function clearTrackCache() {
+    trackCache = null;
+    if (window.indexedDB) indexedDB.deleteDatabase(TRACK_CACHE_DB);
+}
+
+// Формирование URL страницы списка
+function buildPageUrl(path, cursor, limit = PAGE_SIZE) {
+    let url = `${API_BASE_URL}${path}?limit=${limit}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return url;
+}
+
+// Загрузка страницы треков; cursor = null загружает список заново
+function loadTracksPage(cursor) {
     const token = localStorage.getItem('auth_token');
     
-    fetch(`${API_BASE_URL}/tracks`, {
+    return fetch(buildPageUrl('/tracks', cursor), {
         method: 'GET',
         headers: {
             'Authorization': `Bearer ${token}`,
@@ -454,40 +895,54 @@ function loadUserTracks() {
         }
     })
     .then(response => response.json())
-    .then(data => {
-        displayTracks(data);
+    .then(page => {
+        tracksNextCursor = page.next;
+        displayTracks(page.items, Boolean(cursor));
+        updateTracksLoadMore();
     })
     .catch(error => {
         console.error('Ошибка при загрузке треков:', error);
     });
 }
 
-// Отображение треков в таблице
-function displayTracks(tracks) {
-    const tbody = document.getElementById('tracks-tbody');
-    tbody.innerHTML = '';
-    
-    tracks.forEach(track => {
-        const row = document.createElement('tr');
-        
-        // Преобразование секунд в формат MM:SS
-        const durationFormatted = formatDuration(track.duration_sec);
-        
-        row.innerHTML = `
-            <td>${track.title}</td>
-            <td>${track.artist_name}</td>
-            <td>${track.genre_name}</td>
-            <td>${track.bpm || 'N/A'}</td>
-            <td>${durationFormatted}</td>
-            <td>${track.created_at}</td>
-            <td>
-                <button class="btn btn-secondary" onclick="showEditTrackModal(${track.track_id})">Редактировать</button>
-                <button class="btn btn-danger" onclick="deleteTrack(${track.track_id})">Удалить</button>
-            </td>
-        `;
-        
-        tbody.appendChild(row);
-    });
+// Отображение треков в таблице (append - дописать к уже показанным)
+function displayTracks(tracks, append = false, keepScroll = false) {
+    if (append) {
+        tracksTable.append(tracks);
+    } else {
+        tracksTable.setItems(tracks, keepScroll);
+    }
+}
+
+// Ячейки строки трека
+function renderTrackRow(track) {
+    return `
+        <td>${track.title}</td>
+        <td>${track.artist_name}</td>
+        <td>${track.genre_name}</td>
+        <td>${track.bpm || 'N/A'}</td>
+        <td>${formatDuration(track.duration_sec)}</td>
+        <td>${track.created_at}</td>
+        <td>
+            <button class="btn btn-secondary" onclick="showEditTrackModal(${track.track_id})">Редактировать</button>
+            <button class="btn btn-danger" onclick="deleteTrack(${track.track_id})">Удалить</button>
+        </td>
+    `;
+}
+
+// Сортировка по колонкам таблиц треков (последняя - действия)
+const TRACK_SORT_KEYS = [
+    track => track.title,
+    track => track.artist_name,
+    track => track.genre_name,
+    track => track.bpm,
+    track => track.duration_sec,
+    track => dateSortKey(track.created_at),
+    null
+];
+
+function trackSearchText(track) {
+    return `${track.title} ${track.artist_name} ${track.genre_name}`;
 }
 
 // Форматирование длительности (секунды в MM:SS)
@@ -719,7 +1174,7 @@ function displayCollections(collections) {
         collectionDiv.innerHTML = `
             <div class="collection-header">
                 <div class="collection-name">${collection.name} ${collection.is_favorite ? '❤️' : ''}</div>
-                <div class="collection-info">Создано: ${collection.created_at}</div>
+                <div class="collection-info">Создано: ${collection.created_at}, треков: ${collection.tracks_count}</div>
             </div>
             <div class="collection-controls">
                 <button class="btn btn-secondary" onclick="showEditCollectionModal(${collection.collection_id})">Редактировать</button>
@@ -727,13 +1182,10 @@ function displayCollections(collections) {
             </div>
             <div class="collection-tracks">
                 <h4>Треки в коллекции:</h4>
-                <ul>
-                    ${collection.tracks ? collection.tracks.map(track => 
-                        `<li>${track.title} - ${track.artist_name} 
-                           <button class="btn btn-secondary btn-sm" onclick="removeTrackFromCollection(${collection.collection_id}, ${track.track_id})">Удалить</button>
-                           </li>`
-                    ).join('') : ''}
-                </ul>
+                <ul id="collection-tracks-${collection.collection_id}"></ul>
+                <button id="collection-tracks-more-${collection.collection_id}" class="btn btn-secondary"
+                        onclick="loadCollectionTracks(${collection.collection_id}, null)"
+                        style="display: ${collection.tracks_count > 0 ? 'inline-block' : 'none'};">Показать треки</button>
                 <button class="btn btn-secondary" onclick="showAddTrackToCollectionModal(${collection.collection_id})">Добавить трек</button>
             </div>
         `;
@@ -742,6 +1194,40 @@ function displayCollections(collections) {
     });
 }
 
+// Загрузка страницы треков коллекции; cursor = null загружает первую страницу
+function loadCollectionTracks(collectionId, cursor) {
+    const token = localStorage.getItem('auth_token');
+    
+    fetch(buildPageUrl(`/collections/${collectionId}`, cursor), {
+        method: 'GET',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => response.json())
+    .then(collection => {
+        const list = document.getElementById(`collection-tracks-${collectionId}`);
+        const moreButton = document.getElementById(`collection-tracks-more-${collectionId}`);
+        if (!cursor) {
+            list.innerHTML = '';
+        }
+        list.insertAdjacentHTML('beforeend', collection.tracks.map(track =>
+            `<li>${track.title} - ${track.artist_name} 
+               <button class="btn btn-secondary btn-sm" onclick="removeTrackFromCollection(${collectionId}, ${track.track_id})">Удалить</button>
+               </li>`
+        ).join(''));
+        
+        moreButton.textContent = 'Показать ещё';
+        moreButton.onclick = () => loadCollectionTracks(collectionId, collection.next);
+        moreButton.style.display = collection.next ? 'inline-block' : 'none';
+    })
+    .catch(error => {
+        console.error('Ошибка при загрузке треков коллекции:', error);
+        showMessage('Ошибка при загрузке треков коллекции', 'error');
+    });
+}
+
 // Показать модальное окно добавления коллекции
 function showAddCollectionModal() {
     const modalBody = document.getElementById('modal-body');
@@ -917,26 +1403,30 @@ function deleteCollection(collectionId) {
 
 // Выполнение поиска
 function performSearch() {
-    const title = document.getElementById('search-title').value;
-    const artist = document.getElementById('search-artist').value;
-    const genreId = document.getElementById('search-genre').value;
-    const bpm = document.getElementById('search-bpm').value;
-    const duration = document.getElementById('search-duration').value;
+    loadSearchPage(null);
+}
+
+// Загрузка страницы результатов поиска; cursor = null - новый поиск
+function loadSearchPage(cursor) {
+    const filters = {
+        title: document.getElementById('search-title').value,
+        artist: document.getElementById('search-artist').value,
+        genre_id: document.getElementById('search-genre').value,
+        bpm_min: document.getElementById('search-bpm-min').value,
+        bpm_max: document.getElementById('search-bpm-max').value,
+        duration_min: document.getElementById('search-duration-min').value,
+        duration_max: document.getElementById('search-duration-max').value
+    };
     
     const token = localStorage.getItem('auth_token');
     
     // Формируем URL с параметрами
-    let url = `${API_BASE_URL}/search/tracks?`;
-    const params = [];
-    if (title) params.push(`title=${encodeURIComponent(title)}`);
-    if (artist) params.push(`artist=${encodeURIComponent(artist)}`);
-    if (genreId) params.push(`genre_id=${encodeURIComponent(genreId)}`);
-    if (bpm) params.push(`bpm=${encodeURIComponent(bpm)}`);
-    if (duration) params.push(`duration=${encodeURIComponent(duration)}`);
-    
-    url += params.join('&');
+    let url = buildPageUrl('/search/tracks', cursor);
+    Object.entries(filters).forEach(([name, value]) => {
+        if (value) url += `&${name}=${encodeURIComponent(value)}`;
+    });
     
-    fetch(url, {
+    return fetch(url, {
         method: 'GET',
         headers: {
             'Authorization': `Bearer ${token}`,
@@ -944,8 +1434,11 @@ function performSearch() {
         }
     })
     .then(response => response.json())
-    .then(data => {
-        displaySearchResults(data);
+    .then(page => {
+        searchNextCursor = page.next;
+        displaySearchResults(page.items, Boolean(cursor));
+        searchTable.setHasMore(Boolean(searchNextCursor));
+        document.getElementById('search-load-more-btn').style.display = searchNextCursor ? 'inline-block' : 'none';
     })
     .catch(error => {
         console.error('Ошибка при поиске:', error);
@@ -953,29 +1446,27 @@ function performSearch() {
     });
 }
 
-// Отображение результатов поиска
-function displaySearchResults(results) {
-    const tbody = document.getElementById('search-results-tbody');
-    tbody.innerHTML = '';
-    
-    results.forEach(track => {
-        const durationFormatted = formatDuration(track.duration_sec);
-        
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td>${track.title}</td>
-            <td>${track.artist_name}</td>
-            <td>${track.genre_name}</td>
-            <td>${track.bpm || 'N/A'}</td>
-            <td>${durationFormatted}</td>
-            <td>${track.created_at}</td>
-            <td>
-                <button class="btn btn-secondary" onclick="addToCollection(${track.track_id})">В коллекцию</button>
-            </td>
-        `;
-        
-        tbody.appendChild(row);
-    });
+// Отображение результатов поиска (append - дописать к уже показанным)
+function displaySearchResults(results, append = false) {
+    if (append) {
+        searchTable.append(results);
+    } else {
+        searchTable.setItems(results);
+    }
+}
+
+function renderSearchRow(track) {
+    return `
+        <td>${track.title}</td>
+        <td>${track.artist_name}</td>
+        <td>${track.genre_name}</td>
+        <td>${track.bpm || 'N/A'}</td>
+        <td>${formatDuration(track.duration_sec)}</td>
+        <td>${track.created_at}</td>
+        <td>
+            <button class="btn btn-secondary" onclick="addToCollection(${track.track_id})">В коллекцию</button>
+        </td>
+    `;
 }
 
 // Сброс поиска
@@ -983,10 +1474,15 @@ function resetSearch() {
     document.getElementById('search-title').value = '';
     document.getElementById('search-artist').value = '';
     document.getElementById('search-genre').value = '';
-    document.getElementById('search-bpm').value = '';
-    document.getElementById('search-duration').value = '';
+    document.getElementById('search-bpm-min').value = '';
+    document.getElementById('search-bpm-max').value = '';
+    document.getElementById('search-duration-min').value = '';
+    document.getElementById('search-duration-max').value = '';
     
-    document.getElementById('search-results-tbody').innerHTML = '';
+    searchTable.setHasMore(false);
+    searchTable.setItems([]);
+    searchNextCursor = null;
+    document.getElementById('search-load-more-btn').style.display = 'none';
 }
 
 // Добавление трека в коллекцию
@@ -1074,19 +1570,22 @@ function showAddTrackToCollectionModal(collectionId) {
         }
     })
     .then(response => response.json())
-    .then(tracks => {
+    .then(page => {
+        const tracks = page.items;
         const modalBody = document.getElementById('modal-body');
         modalBody.innerHTML = `
             <div>
-                <h4>Выберите трек для добавления:</h4>
+                <h4>Выберите треки для добавления:</h4>
                 ${tracks.map(track => `
                     <div class="track-option">
-                        <button class="btn btn-secondary" onclick="addTrackToCollection(${collectionId}, ${track.track_id})" style="margin: 5px 0; display: block; width: 100%;">
+                        <label style="margin: 5px 0; display: block;">
+                            <input type="checkbox" name="batch-track" value="${track.track_id}">
                             ${track.title} - ${track.artist_name}
-                        </button>
+                        </label>
                     </div>
                 `).join('')}
                 <div class="form-group" style="margin-top: 15px;">
+                    <button class="btn btn-primary" onclick="addSelectedTracksToCollection(${collectionId})">Добавить выбранные</button>
                     <button class="btn btn-secondary" onclick="closeModal()">Отмена</button>
                 </div>
             </div>
@@ -1101,6 +1600,45 @@ function showAddTrackToCollectionModal(collectionId) {
     });
 }
 
+// Добавление выбранных треков в коллекцию одним запросом
+function addSelectedTracksToCollection(collectionId) {
+    const token = localStorage.getItem('auth_token');
+    const trackIds = Array.from(document.querySelectorAll('input[name="batch-track"]:checked'))
+        .map(input => parseInt(input.value, 10));
+    
+    if (trackIds.length === 0) {
+        showMessage('Выберите хотя бы один трек', 'error');
+        return;
+    }
+    
+    fetch(`${API_BASE_URL}/collections/${collectionId}/tracks/batch`, {
+        method: 'POST',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({ track_ids: trackIds })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.succeeded) {
+            closeModal();
+            loadUserCollections();
+            if (data.rejected.length > 0) {
+                showMessage(`Добавлено треков: ${data.succeeded.length}, отклонено: ${data.rejected.length}`, 'error');
+            } else {
+                showMessage(`Добавлено треков: ${data.succeeded.length}`, 'success');
+            }
+        } else {
+            showMessage(data.message || 'Ошибка при добавлении треков в коллекцию', 'error');
+        }
+    })
+    .catch(error => {
+        console.error('Ошибка:', error);
+        showMessage('Ошибка при добавлении треков в коллекцию', 'error');
+    });
+}
+
 // Удаление трека из коллекции
 function removeTrackFromCollection(collectionId, trackId) {
     if (confirm('Вы уверены, что хотите удалить этот трек из коллекции?')) {
@@ -1155,33 +1693,45 @@ function switchAdminTab(tabName) {
             .then(data => {
                 adminContent.innerHTML = `
                     <h3>Список пользователей</h3>
-                    <table>
-                        <thead>
-                            <tr>
-                                <th>ID</th>
-                                <th>Логин</th>
-                                <th>Имя</th>
-                                <th>Фамилия</th>
-                                <th>Email</th>
-                                <th>Админ</th>
-                                <th>Дата создания</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                            ${data.map(user => `
+                    <div class="table-viewport">
+                        <table>
+                            <thead>
                                 <tr>
-                                    <td>${user.user_id}</td>
-                                    <td>${user.login}</td>
-                                    <td>${user.first_name || ''}</td>
-                                    <td>${user.last_name || ''}</td>
-                                    <td>${user.email || ''}</td>
-                                    <td>${user.is_admin ? 'Да' : 'Нет'}</td>
-                                    <td>${user.created_at}</td>
+                                    <th>ID</th>
+                                    <th>Логин</th>
+                                    <th>Имя</th>
+                                    <th>Фамилия</th>
+                                    <th>Email</th>
+                                    <th>Админ</th>
+                                    <th>Дата создания</th>
                                 </tr>
-                            `).join('')}
-                        </tbody>
-                    </table>
+                            </thead>
+                            <tbody id="admin-users-tbody"></tbody>
+                        </table>
+                    </div>
                 `;
+                adminTable = new VirtualTable(document.getElementById('admin-users-tbody'), {
+                    renderRow: user => `
+                        <td>${user.user_id}</td>
+                        <td>${user.login}</td>
+                        <td>${user.first_name || ''}</td>
+                        <td>${user.last_name || ''}</td>
+                        <td>${user.email || ''}</td>
+                        <td>${user.is_admin ? 'Да' : 'Нет'}</td>
+                        <td>${user.created_at}</td>
+                    `,
+                    key: user => user.user_id,
+                    sortKeys: [
+                        user => user.user_id,
+                        user => user.login,
+                        user => user.first_name,
+                        user => user.last_name,
+                        user => user.email,
+                        user => user.is_admin ? 1 : 0,
+                        user => dateSortKey(user.created_at)
+                    ]
+                });
+                adminTable.setItems(data);
             })
             .catch(error => {
                 console.error('Ошибка:', error);
@@ -1189,17 +1739,9 @@ function switchAdminTab(tabName) {
             });
             break;
         case 'tracks':
-            fetch(`${API_BASE_URL}/admin/tracks`, {
-                method: 'GET',
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                    'Content-Type': 'application/json'
-                }
-            })
-            .then(response => response.json())
-            .then(data => {
-                adminContent.innerHTML = `
-                    <h3>Все треки</h3>
+            adminContent.innerHTML = `
+                <h3>Все треки</h3>
+                <div class="table-viewport">
                     <table>
                         <thead>
                             <tr>
@@ -1213,40 +1755,69 @@ function switchAdminTab(tabName) {
                                 <th>Дата создания</th>
                             </tr>
                         </thead>
-                        <tbody>
-                            ${data.map(track => `
-                                <tr>
-                                    <td>${track.track_id}</td>
-                                    <td>${track.title}</td>
-                                    <td>${track.artist_name}</td>
-                                    <td>${track.genre_name}</td>
-                                    <td>${track.bpm || ''}</td>
-                                    <td>${track.duration_sec || ''}</td>
-                                    <td>${track.user_login || track.user_id}</td>
-                                    <td>${track.created_at}</td>
-                                </tr>
-                            `).join('')}
-                        </tbody>
+                        <tbody id="admin-tracks-tbody"></tbody>
                     </table>
-                `;
-            })
-            .catch(error => {
-                console.error('Ошибка:', error);
-                adminContent.innerHTML = '<h3>Все треки</h3><p>Ошибка при загрузке треков</p>';
+                </div>
+                <button id="admin-tracks-load-more-btn" class="btn btn-secondary" style="display: none;">Показать ещё</button>
+            `;
+            adminTable = new VirtualTable(document.getElementById('admin-tracks-tbody'), {
+                renderRow: track => `
+                    <td>${track.track_id}</td>
+                    <td>${track.title}</td>
+                    <td>${track.artist_name}</td>
+                    <td>${track.genre_name}</td>
+                    <td>${track.bpm || ''}</td>
+                    <td>${track.duration_sec || ''}</td>
+                    <td>${track.user_login || track.user_id}</td>
+                    <td>${track.created_at}</td>
+                `,
+                key: track => track.track_id,
+                sortKeys: [
+                    track => track.track_id,
+                    track => track.title,
+                    track => track.artist_name,
+                    track => track.genre_name,
+                    track => track.bpm,
+                    track => track.duration_sec,
+                    track => track.user_login || track.user_id,
+                    track => dateSortKey(track.created_at)
+                ],
+                loadMore: () => loadAdminTracksPage(adminTracksNextCursor)
             });
+            document.getElementById('admin-tracks-load-more-btn').addEventListener('click', () => adminTable.requestMore());
+            loadAdminTracksPage(null);
             break;
         case 'audit':
-            fetch(`${API_BASE_URL}/admin/audit`, {
-                method: 'GET',
-                headers: {
-                    'Authorization': `Bearer ${token}`,
-                    'Content-Type': 'application/json'
-                }
-            })
-            .then(response => response.json())
-            .then(data => {
-                adminContent.innerHTML = `
-                    <h3>Журнал операций</h3>
+            adminContent.innerHTML = `
+                <h3>Журнал операций</h3>
+                <div class="form-row">
+                    <div class="form-group">
+                        <label for="audit-table-filter">Таблица:</label>
+                        <select id="audit-table-filter">
+                            <option value="">Все</option>
+                            <option value="tracks">tracks</option>
+                            <option value="user">user</option>
+                        </select>
+                    </div>
+                    <div class="form-group">
+                        <label for="audit-operation-filter">Тип операции:</label>
+                        <select id="audit-operation-filter">
+                            <option value="">Все</option>
+                            <option value="INSERT">INSERT</option>
+                            <option value="UPDATE">UPDATE</option>
+                            <option value="DELETE">DELETE</option>
+                        </select>
+                    </div>
+                    <div class="form-group">
+                        <label for="audit-from-filter">С:</label>
+                        <input type="date" id="audit-from-filter">
+                    </div>
+                    <div class="form-group">
+                        <label for="audit-to-filter">По:</label>
+                        <input type="date" id="audit-to-filter">
+                    </div>
+                </div>
+                <div class="table-viewport">
                     <table>
                         <thead>
                             <tr>
@@ -1259,30 +1830,113 @@ function switchAdminTab(tabName) {
                                 <th>Детали</th>
                             </tr>
                         </thead>
-                        <tbody>
-                            ${data.map(entry => `
-                                <tr>
-                                    <td>${entry.log_id}</td>
-                                    <td>${entry.user_login || entry.user_id}</td>
-                                    <td>${entry.operation_type}</td>
-                                    <td>${entry.table_name}</td>
-                                    <td>${entry.record_id}</td>
-                                    <td>${entry.operation_time}</td>
-                                    <td>${entry.details ? JSON.stringify(entry.details) : ''}</td>
-                                </tr>
-                            `).join('')}
-                        </tbody>
+                        <tbody id="admin-audit-tbody"></tbody>
                     </table>
-                `;
-            })
-            .catch(error => {
-                console.error('Ошибка:', error);
-                adminContent.innerHTML = '<h3>Журнал операций</h3><p>Ошибка при загрузке журнала</p>';
+                </div>
+                <button id="admin-audit-load-more-btn" class="btn btn-secondary" style="display: none;">Показать ещё</button>
+            `;
+            adminTable = new VirtualTable(document.getElementById('admin-audit-tbody'), {
+                renderRow: entry => `
+                    <td>${entry.log_id}</td>
+                    <td>${entry.user_login || entry.user_id}</td>
+                    <td>${entry.operation_type}</td>
+                    <td>${entry.table_name}</td>
+                    <td>${entry.record_id}</td>
+                    <td>${entry.operation_time}</td>
+                    <td>${entry.details ? JSON.stringify(entry.details) : ''}</td>
+                `,
+                key: entry => entry.log_id,
+                sortKeys: [
+                    entry => entry.log_id,
+                    entry => entry.user_login || entry.user_id,
+                    entry => entry.operation_type,
+                    entry => entry.table_name,
+                    entry => entry.record_id,
+                    entry => dateSortKey(entry.operation_time),
+                    null
+                ],
+                loadMore: () => loadAuditPage(auditNextCursor)
             });
+            ['audit-table-filter', 'audit-operation-filter', 'audit-from-filter', 'audit-to-filter'].forEach(id => {
+                document.getElementById(id).addEventListener('change', () => loadAuditPage(null));
+            });
+            document.getElementById('admin-audit-load-more-btn').addEventListener('click', () => adminTable.requestMore());
+            loadAuditPage(null);
             break;
     }
 }
 
+// Загрузка страницы всех треков в админ-панели
+function loadAdminTracksPage(cursor) {
+    const token = localStorage.getItem('auth_token');
+    
+    return fetch(buildPageUrl('/admin/tracks', cursor), {
+        method: 'GET',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => response.json())
+    .then(page => {
+        adminTracksNextCursor = page.next;
+        if (cursor) {
+            adminTable.append(page.items);
+        } else {
+            adminTable.setItems(page.items);
+        }
+        adminTable.setHasMore(Boolean(adminTracksNextCursor));
+        document.getElementById('admin-tracks-load-more-btn').style.display = adminTracksNextCursor ? 'inline-block' : 'none';
+    })
+    .catch(error => {
+        console.error('Ошибка:', error);
+        document.querySelector('.admin-content').innerHTML = '<h3>Все треки</h3><p>Ошибка при загрузке треков</p>';
+    });
+}
+
+// Загрузка страницы журнала операций с учетом фильтров; cursor = null - с начала
+function loadAuditPage(cursor) {
+    const token = localStorage.getItem('auth_token');
+    
+    let url = buildPageUrl('/admin/audit', cursor);
+    const tableName = document.getElementById('audit-table-filter').value;
+    const operationType = document.getElementById('audit-operation-filter').value;
+    const dateFrom = document.getElementById('audit-from-filter').value;
+    const dateTo = document.getElementById('audit-to-filter').value;
+    if (tableName) url += `&table_name=${encodeURIComponent(tableName)}`;
+    if (operationType) url += `&operation_type=${encodeURIComponent(operationType)}`;
+    if (dateFrom) url += `&from=${encodeURIComponent(dateFrom)}`;
+    if (dateTo) {
+        // Верхняя граница не включается: берем начало следующего дня
+        const nextDay = new Date(dateTo);
+        nextDay.setDate(nextDay.getDate() + 1);
+        url += `&to=${encodeURIComponent(nextDay.toISOString().slice(0, 10))}`;
+    }
+    
+    return fetch(url, {
+        method: 'GET',
+        headers: {
+            'Authorization': `Bearer ${token}`,
+            'Content-Type': 'application/json'
+        }
+    })
+    .then(response => response.json())
+    .then(page => {
+        auditNextCursor = page.next;
+        if (cursor) {
+            adminTable.append(page.items);
+        } else {
+            adminTable.setItems(page.items);
+        }
+        adminTable.setHasMore(Boolean(auditNextCursor));
+        document.getElementById('admin-audit-load-more-btn').style.display = auditNextCursor ? 'inline-block' : 'none';
+    })
+    .catch(error => {
+        console.error('Ошибка:', error);
+        document.querySelector('.admin-content').innerHTML = '<h3>Журнал операций</h3><p>Ошибка при загрузке журнала</p>';
+    });
+}
+
 // Загрузка пользователей для админ-панели
 function loadAdminUsers() {
     if (isAdmin) {
@@ -1,5 +1,8 @@
 -- Музыкальная библиотека - Схема базы данных и хранимые процедуры
 
+-- Расширения
+CREATE EXTENSION IF NOT EXISTS pg_trgm;   -- триграммный поиск по названиям и исполнителям
+
 -- Таблица пользователей
 CREATE TABLE IF NOT EXISTS "user" (
     user_id SERIAL PRIMARY KEY,
@@ -51,6 +54,7 @@ CREATE TABLE IF NOT EXISTS collections (
     name VARCHAR(255) NOT NULL,
     is_favorite BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    tracks_count INTEGER NOT NULL DEFAULT 0, -- поддерживается триггерами collection_tracks_count_*
     FOREIGN KEY (user_id) REFERENCES "user"(user_id)
 );
 
@@ -82,17 +86,156 @@ CREATE TABLE IF NOT EXISTS user_favorite_artists (
     FOREIGN KEY (artist_id) REFERENCES artists(artist_id) ON DELETE CASCADE
 );
 
--- Таблица аудита
+-- Журнал аудита из схемы до секционирования - обычная таблица. CREATE TABLE
+-- IF NOT EXISTS ее не заменит, поэтому она переименовывается в audit_log_legacy,
+-- а строки переносятся в секционированную таблицу ниже, после создания функций
+-- обслуживания секций. Имена первичного ключа, внешнего ключа, последовательности
+-- и индексов освобождаются для новой таблицы
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class
+               WHERE oid = to_regclass('audit_log') AND relkind = 'r') THEN
+        ALTER TABLE audit_log RENAME TO audit_log_legacy;
+        ALTER TABLE audit_log_legacy RENAME CONSTRAINT audit_log_pkey TO audit_log_legacy_pkey;
+        ALTER TABLE audit_log_legacy DROP CONSTRAINT IF EXISTS audit_log_user_id_fkey;
+        ALTER SEQUENCE IF EXISTS audit_log_log_id_seq RENAME TO audit_log_legacy_log_id_seq;
+        DROP INDEX IF EXISTS idx_audit_log_time;
+        DROP INDEX IF EXISTS idx_audit_log_record;
+        DROP INDEX IF EXISTS idx_audit_log_user;
+    END IF;
+END $$;
+
+-- Таблица аудита (секционирована по месяцам по operation_time)
 CREATE TABLE IF NOT EXISTS audit_log (
-    log_id SERIAL PRIMARY KEY,
+    log_id SERIAL,
     user_id INTEGER,
     operation_type VARCHAR(20) NOT NULL, -- 'INSERT', 'UPDATE', 'DELETE'
     table_name VARCHAR(50) NOT NULL,
     record_id INTEGER,
-    operation_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    operation_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     details JSONB,
+    PRIMARY KEY (log_id, operation_time),
     FOREIGN KEY (user_id) REFERENCES "user"(user_id)
-);
+) PARTITION BY RANGE (operation_time);
+
+-- Секция по умолчанию для записей вне созданных месячных секций
+CREATE TABLE IF NOT EXISTS audit_log_default PARTITION OF audit_log DEFAULT;
+
+-- Индексы журнала аудита (создаются в каждой секции)
+-- Постраничный вывод и фильтр по времени: (operation_time, log_id) в порядке убывания
+CREATE INDEX IF NOT EXISTS idx_audit_log_time ON audit_log (operation_time DESC, log_id DESC);
+-- История конкретной записи
+CREATE INDEX IF NOT EXISTS idx_audit_log_record ON audit_log (table_name, record_id);
+-- Действия конкретного пользователя
+CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log (user_id, operation_time DESC);
+
+-- Создание месячной секции журнала аудита.
+-- Если секция не была создана вовремя, строки этого месяца уже лежат в секции
+-- по умолчанию, и CREATE TABLE ... PARTITION OF завершился бы ошибкой. Поэтому
+-- секция создается отдельной таблицей, строки месяца переносятся в нее из
+-- audit_log_default, и только затем она присоединяется. Секция по умолчанию
+-- блокируется до конца транзакции, чтобы новые строки месяца не попали в нее
+-- между переносом и присоединением
+CREATE OR REPLACE FUNCTION create_audit_log_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+    v_name TEXT := 'audit_log_' || to_char(p_month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    
+    LOCK TABLE audit_log_default IN SHARE ROW EXCLUSIVE MODE;
+    EXECUTE format('CREATE TABLE %I (LIKE audit_log INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+    EXECUTE format('WITH moved AS (
+                        DELETE FROM audit_log_default
+                        WHERE operation_time >= %L AND operation_time < %L
+                        RETURNING *
+                    )
+                    INSERT INTO %I SELECT * FROM moved',
+                   v_start, v_end, v_name);
+    EXECUTE format('ALTER TABLE audit_log ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   v_name, v_start, v_end);
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Обслуживание секций: создание секций на p_months_ahead месяцев вперед
+-- и удаление секций старше p_retention_months месяцев (NULL - хранить все).
+-- Запускать периодически, например раз в сутки:
+--   SELECT * FROM maintain_audit_log_partitions(3, 12);
+CREATE OR REPLACE FUNCTION maintain_audit_log_partitions(
+    p_months_ahead INTEGER,
+    p_retention_months INTEGER
+)
+RETURNS TABLE(action TEXT, partition_name TEXT) AS $$
+DECLARE
+    v_current DATE := date_trunc('month', CURRENT_DATE)::DATE;
+    v_partition RECORD;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        action := 'ensured';
+        partition_name := create_audit_log_partition((v_current + make_interval(months => i))::DATE);
+        RETURN NEXT;
+    END LOOP;
+    
+    IF p_retention_months IS NOT NULL THEN
+        FOR v_partition IN
+            SELECT c.relname
+            FROM pg_inherits inh
+            JOIN pg_class c ON c.oid = inh.inhrelid
+            WHERE inh.inhparent = 'audit_log'::regclass
+              AND c.relname ~ '^audit_log_[0-9]{4}_[0-9]{2}$'
+        LOOP
+            IF to_date(substring(v_partition.relname FROM 11), 'YYYY_MM')
+               < (v_current - make_interval(months => p_retention_months))::DATE THEN
+                EXECUTE format('DROP TABLE %I', v_partition.relname);
+                action := 'dropped';
+                partition_name := v_partition.relname;
+                RETURN NEXT;
+            END IF;
+        END LOOP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT * FROM maintain_audit_log_partitions(3, NULL);
+
+-- Перенос строк журнала из несекционированной таблицы (см. переименование выше).
+-- Для каждого месяца со строками создается своя секция; log_id сохраняются,
+-- последовательность продолжает нумерацию. Строки без operation_time
+-- (в старой схеме столбец допускал NULL) получают время переноса
+DO $$
+DECLARE
+    v_month DATE;
+BEGIN
+    IF to_regclass('audit_log_legacy') IS NULL THEN
+        RETURN;
+    END IF;
+    
+    FOR v_month IN
+        SELECT DISTINCT date_trunc('month', COALESCE(operation_time, CURRENT_TIMESTAMP))::DATE
+        FROM audit_log_legacy
+    LOOP
+        PERFORM create_audit_log_partition(v_month);
+    END LOOP;
+    
+    INSERT INTO audit_log (log_id, user_id, operation_type, table_name, record_id, operation_time, details)
+    SELECT log_id, user_id, operation_type, table_name, record_id,
+           COALESCE(operation_time, CURRENT_TIMESTAMP), details
+    FROM audit_log_legacy;
+    
+    PERFORM setval(pg_get_serial_sequence('audit_log', 'log_id'),
+                   COALESCE((SELECT MAX(log_id) FROM audit_log), 0) + 1, false);
+    DROP TABLE audit_log_legacy;
+END $$;
+
+-- Индексы постраничного вывода и поиска треков и порядка треков в коллекции
+-- (idx_tracks_*, idx_artists_name_trgm, idx_collection_tracks_order) строит без
+-- блокировки записи миграция 0011_concurrent_indexes, как и индексы по внешним
+-- ключам - миграция 0001_foreign_key_indexes
 
 -- Триггер для обновления времени изменения пользователя
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -103,11 +246,167 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
+DROP TRIGGER IF EXISTS update_user_updated_at ON "user";
 CREATE TRIGGER update_user_updated_at 
     BEFORE UPDATE ON "user" 
     FOR EACH ROW 
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Уведомление серверов приложения об изменении справочников (жанры, исполнители).
+-- Полезная нагрузка - имя таблицы; серверы сбрасывают соответствующий кэш.
+CREATE OR REPLACE FUNCTION notify_reference_data_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('reference_data', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS genres_notify_change ON genres;
+CREATE TRIGGER genres_notify_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON genres
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+DROP TRIGGER IF EXISTS artists_notify_change ON artists;
+CREATE TRIGGER artists_notify_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON artists
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+
+-- Уведомление серверов приложения об изменении пользователей (канал user_changed).
+-- Полезная нагрузка - user_id; серверы сбрасывают кэш этого пользователя во всех
+-- процессах (блокировка и смена роли действуют сразу). Изменение только хэша
+-- пароля или updated_at уведомления не вызывает. Если затронуто больше 100
+-- пользователей, отправляется '*' - сбросить кэш целиком.
+CREATE OR REPLACE FUNCTION notify_user_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_ids INTEGER[];
+BEGIN
+    IF (TG_OP = 'UPDATE') THEN
+        SELECT array_agg(n.user_id) INTO v_user_ids
+        FROM new_rows n
+        JOIN old_rows o ON o.user_id = n.user_id
+        WHERE (o.login, o.first_name, o.last_name, o.email, o.avatar_url, o.is_admin, o.is_active)
+              IS DISTINCT FROM
+              (n.login, n.first_name, n.last_name, n.email, n.avatar_url, n.is_admin, n.is_active);
+    ELSE
+        SELECT array_agg(o.user_id) INTO v_user_ids FROM old_rows o;
+    END IF;
+
+    IF cardinality(v_user_ids) > 100 THEN
+        PERFORM pg_notify('user_changed', '*');
+    ELSIF v_user_ids IS NOT NULL THEN
+        PERFORM pg_notify('user_changed', u::TEXT) FROM unnest(v_user_ids) u;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS user_notify_update ON "user";
+CREATE TRIGGER user_notify_update
+    AFTER UPDATE ON "user"
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_changed();
+
+DROP TRIGGER IF EXISTS user_notify_delete ON "user";
+CREATE TRIGGER user_notify_delete
+    AFTER DELETE ON "user"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_changed();
+
+-- Избранное входит в кэшируемый профиль, поэтому его изменение тоже
+-- уведомляет серверы по каналу user_changed (полезная нагрузка - user_id)
+CREATE OR REPLACE FUNCTION notify_favorites_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_ids INTEGER[];
+BEGIN
+    IF (TG_OP = 'INSERT') THEN
+        SELECT array_agg(DISTINCT n.user_id) INTO v_user_ids FROM new_rows n;
+    ELSE
+        SELECT array_agg(DISTINCT o.user_id) INTO v_user_ids FROM old_rows o;
+    END IF;
+
+    IF cardinality(v_user_ids) > 100 THEN
+        PERFORM pg_notify('user_changed', '*');
+    ELSIF v_user_ids IS NOT NULL THEN
+        PERFORM pg_notify('user_changed', u::TEXT) FROM unnest(v_user_ids) u;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS user_favorite_genres_notify_insert ON user_favorite_genres;
+CREATE TRIGGER user_favorite_genres_notify_insert
+    AFTER INSERT ON user_favorite_genres
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+DROP TRIGGER IF EXISTS user_favorite_genres_notify_delete ON user_favorite_genres;
+CREATE TRIGGER user_favorite_genres_notify_delete
+    AFTER DELETE ON user_favorite_genres
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+DROP TRIGGER IF EXISTS user_favorite_artists_notify_insert ON user_favorite_artists;
+CREATE TRIGGER user_favorite_artists_notify_insert
+    AFTER INSERT ON user_favorite_artists
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+DROP TRIGGER IF EXISTS user_favorite_artists_notify_delete ON user_favorite_artists;
+CREATE TRIGGER user_favorite_artists_notify_delete
+    AFTER DELETE ON user_favorite_artists
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+-- Счетчик треков в коллекции (collections.tracks_count).
+-- Поддерживается триггерами уровня оператора по таблицам переходов: одно
+-- обновление collections на каждую затронутую коллекцию, а не на каждую строку.
+ALTER TABLE collections ADD COLUMN IF NOT EXISTS tracks_count INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION update_collection_tracks_count()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE collections c
+        SET tracks_count = c.tracks_count - d.cnt
+        FROM (SELECT o.collection_id, COUNT(*) AS cnt FROM old_rows o GROUP BY o.collection_id) d
+        WHERE c.collection_id = d.collection_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE collections c
+        SET tracks_count = c.tracks_count + d.cnt
+        FROM (SELECT n.collection_id, COUNT(*) AS cnt FROM new_rows n GROUP BY n.collection_id) d
+        WHERE c.collection_id = d.collection_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS collection_tracks_count_insert ON collection_tracks;
+CREATE TRIGGER collection_tracks_count_insert
+    AFTER INSERT ON collection_tracks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_collection_tracks_count();
+
+DROP TRIGGER IF EXISTS collection_tracks_count_update ON collection_tracks;
+CREATE TRIGGER collection_tracks_count_update
+    AFTER UPDATE ON collection_tracks
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_collection_tracks_count();
+
+DROP TRIGGER IF EXISTS collection_tracks_count_delete ON collection_tracks;
+CREATE TRIGGER collection_tracks_count_delete
+    AFTER DELETE ON collection_tracks
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION update_collection_tracks_count();
+
+-- Пересчет счетчиков для коллекций, созданных до появления столбца
+UPDATE collections c
+SET tracks_count = (SELECT COUNT(*) FROM collection_tracks ct WHERE ct.collection_id = c.collection_id)
+WHERE c.tracks_count <> (SELECT COUNT(*) FROM collection_tracks ct WHERE ct.collection_id = c.collection_id);
+
 -- Триггеры для аудита операций
 
 -- Триггер для аудита операций с треками
@@ -136,9 +435,6 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
-CREATE TRIGGER audit_tracks_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON tracks
-    FOR EACH ROW EXECUTE FUNCTION audit_track_operations();
 
 -- Триггер для аудита операций с пользователями
 CREATE OR REPLACE FUNCTION audit_user_operations()
@@ -164,80 +460,281 @@ BEGIN
 END;
 $$ language 'plpgsql';
 
-CREATE TRIGGER audit_users_trigger
-    AFTER INSERT OR UPDATE OR DELETE ON "user"
-    FOR EACH ROW EXECUTE FUNCTION audit_user_operations();
+-- Построчные функции аудита выше сохранены для сравнения производительности
+-- (benchmarks/bench_audit_triggers.py). К таблицам подключены триггеры уровня
+-- оператора: они получают все измененные строки через таблицы переходов
+-- (REFERENCING NEW TABLE / OLD TABLE) и пишут журнал одним INSERT ... SELECT.
+-- Формат details совпадает с построчными триггерами.
+
+-- Аудит операций с треками (уровень оператора)
+CREATE OR REPLACE FUNCTION audit_track_statement()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        INSERT INTO audit_log (user_id, operation_type, table_name, record_id, details)
+        SELECT o.user_id, 'DELETE', 'tracks', o.track_id,
+               json_build_object('title', o.title, 'artist_id', o.artist_id, 'genre_id', o.genre_id)
+        FROM old_rows o
+        ORDER BY o.track_id;
+    ELSIF (TG_OP = 'UPDATE') THEN
+        INSERT INTO audit_log (user_id, operation_type, table_name, record_id, details)
+        SELECT n.user_id, 'UPDATE', 'tracks', n.track_id,
+               json_build_object('old_title', o.title, 'new_title', n.title,
+                                 'old_artist_id', o.artist_id, 'new_artist_id', n.artist_id,
+                                 'old_genre_id', o.genre_id, 'new_genre_id', n.genre_id)
+        FROM new_rows n
+        JOIN old_rows o ON o.track_id = n.track_id
+        ORDER BY n.track_id;
+    ELSIF (TG_OP = 'INSERT') THEN
+        INSERT INTO audit_log (user_id, operation_type, table_name, record_id, details)
+        SELECT n.user_id, 'INSERT', 'tracks', n.track_id,
+               json_build_object('title', n.title, 'artist_id', n.artist_id, 'genre_id', n.genre_id)
+        FROM new_rows n
+        ORDER BY n.track_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Аудит операций с пользователями (уровень оператора)
+CREATE OR REPLACE FUNCTION audit_user_statement()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        INSERT INTO audit_log (user_id, operation_type, table_name, record_id, details)
+        SELECT o.user_id, 'DELETE', 'user', o.user_id, json_build_object('login', o.login)
+        FROM old_rows o
+        ORDER BY o.user_id;
+    ELSIF (TG_OP = 'UPDATE') THEN
+        INSERT INTO audit_log (user_id, operation_type, table_name, record_id, details)
+        SELECT n.user_id, 'UPDATE', 'user', n.user_id,
+               json_build_object('old_login', o.login, 'new_login', n.login)
+        FROM new_rows n
+        JOIN old_rows o ON o.user_id = n.user_id
+        ORDER BY n.user_id;
+    ELSIF (TG_OP = 'INSERT') THEN
+        INSERT INTO audit_log (user_id, operation_type, table_name, record_id, details)
+        SELECT n.user_id, 'INSERT', 'user', n.user_id, json_build_object('login', n.login)
+        FROM new_rows n
+        ORDER BY n.user_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Триггеры с таблицами переходов допускают только одно событие,
+-- поэтому на каждую операцию создается отдельный триггер
+DROP TRIGGER IF EXISTS audit_tracks_trigger ON tracks;
+DROP TRIGGER IF EXISTS audit_tracks_insert ON tracks;
+DROP TRIGGER IF EXISTS audit_tracks_update ON tracks;
+DROP TRIGGER IF EXISTS audit_tracks_delete ON tracks;
+
+CREATE TRIGGER audit_tracks_insert
+    AFTER INSERT ON tracks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_track_statement();
+
+CREATE TRIGGER audit_tracks_update
+    AFTER UPDATE ON tracks
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_track_statement();
+
+CREATE TRIGGER audit_tracks_delete
+    AFTER DELETE ON tracks
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_track_statement();
+
+DROP TRIGGER IF EXISTS audit_users_trigger ON "user";
+DROP TRIGGER IF EXISTS audit_users_insert ON "user";
+DROP TRIGGER IF EXISTS audit_users_update ON "user";
+DROP TRIGGER IF EXISTS audit_users_delete ON "user";
+
+CREATE TRIGGER audit_users_insert
+    AFTER INSERT ON "user"
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_user_statement();
+
+CREATE TRIGGER audit_users_update
+    AFTER UPDATE ON "user"
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_user_statement();
+
+CREATE TRIGGER audit_users_delete
+    AFTER DELETE ON "user"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION audit_user_statement();
+
+-- Журнал изменений треков для синхронизации клиентов (GET /api/tracks/changes).
+-- На каждый трек хранится одна строка с номером транзакции (txid_current())
+-- его последнего изменения; удаленный трек остается меткой (deleted = TRUE).
+-- Курсор клиента - xmin снимка, в котором он получил изменения: транзакции
+-- с меньшим номером к этому моменту уже завершены, поэтому следующий запрос
+-- изменений с номером >= курсора не пропустит записи, зафиксированные позже.
+CREATE TABLE IF NOT EXISTS track_changes (
+    track_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    change_xid BIGINT NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    deleted BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_track_changes_user ON track_changes (user_id, change_xid);
+-- Изменения всех треков (администратор)
+CREATE INDEX IF NOT EXISTS idx_track_changes_xid ON track_changes (change_xid);
+
+-- Граница удаленных меток (prune_track_changes): курсор меньше pruned_xid
+-- мог пропустить удаление, и клиент загружает список заново
+CREATE TABLE IF NOT EXISTS track_changes_horizon (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_xid BIGINT NOT NULL DEFAULT 0
+);
+-- Изменения до создания журнала в нем отсутствуют: граница - текущая транзакция
+INSERT INTO track_changes_horizon (pruned_xid) VALUES (txid_current()) ON CONFLICT DO NOTHING;
+
+-- Отметка измененных оператором треков (уровень оператора, по таблицам переходов)
+CREATE OR REPLACE FUNCTION record_track_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        INSERT INTO track_changes (track_id, user_id, change_xid, deleted)
+        SELECT o.track_id, o.user_id, txid_current(), TRUE
+        FROM old_rows o
+        ORDER BY o.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, change_xid = EXCLUDED.change_xid,
+            changed_at = EXCLUDED.changed_at, deleted = EXCLUDED.deleted;
+    ELSE
+        INSERT INTO track_changes (track_id, user_id, change_xid, deleted)
+        SELECT n.track_id, n.user_id, txid_current(), FALSE
+        FROM new_rows n
+        ORDER BY n.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, change_xid = EXCLUDED.change_xid,
+            changed_at = EXCLUDED.changed_at, deleted = EXCLUDED.deleted;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Переименование исполнителя или жанра меняет artist_name / genre_name в
+-- строках треков, поэтому их треки тоже отмечаются измененными
+CREATE OR REPLACE FUNCTION record_reference_track_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_TABLE_NAME = 'artists') THEN
+        INSERT INTO track_changes (track_id, user_id, change_xid)
+        SELECT t.track_id, t.user_id, txid_current()
+        FROM new_rows n
+        JOIN old_rows o ON o.artist_id = n.artist_id
+        JOIN tracks t ON t.artist_id = n.artist_id
+        WHERE o.name IS DISTINCT FROM n.name
+        ORDER BY t.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET change_xid = EXCLUDED.change_xid, changed_at = EXCLUDED.changed_at;
+    ELSE
+        INSERT INTO track_changes (track_id, user_id, change_xid)
+        SELECT t.track_id, t.user_id, txid_current()
+        FROM new_rows n
+        JOIN old_rows o ON o.genre_id = n.genre_id
+        JOIN tracks t ON t.genre_id = n.genre_id
+        WHERE o.name IS DISTINCT FROM n.name
+        ORDER BY t.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET change_xid = EXCLUDED.change_xid, changed_at = EXCLUDED.changed_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS track_changes_insert ON tracks;
+DROP TRIGGER IF EXISTS track_changes_update ON tracks;
+DROP TRIGGER IF EXISTS track_changes_delete ON tracks;
+DROP TRIGGER IF EXISTS artists_track_changes ON artists;
+DROP TRIGGER IF EXISTS genres_track_changes ON genres;
+
+CREATE TRIGGER track_changes_insert
+    AFTER INSERT ON tracks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_track_changes();
+
+CREATE TRIGGER track_changes_update
+    AFTER UPDATE ON tracks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_track_changes();
+
+CREATE TRIGGER track_changes_delete
+    AFTER DELETE ON tracks
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_track_changes();
+
+CREATE TRIGGER artists_track_changes
+    AFTER UPDATE ON artists
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_reference_track_changes();
+
+CREATE TRIGGER genres_track_changes
+    AFTER UPDATE ON genres
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_reference_track_changes();
 
 -- Хранимые процедуры
 
--- Процедура аутентификации пользователя
-CREATE OR REPLACE FUNCTION authenticate_user(
-    p_login VARCHAR(50),
-    p_password VARCHAR(255)
-)
+-- Процедура получения учетных данных для входа: один поиск по уникальному индексу login.
+-- Пароль проверяет сервер (хэш werkzeug в пуле потоков), а не БД;
+-- пароли старого формата (pgp_sym_encrypt) проверяет check_legacy_password()
+DROP FUNCTION IF EXISTS authenticate_user(VARCHAR, VARCHAR);
+
+CREATE OR REPLACE FUNCTION get_login_credentials(p_login VARCHAR(50))
 RETURNS TABLE(
-    success BOOLEAN,
     user_id INTEGER,
     login VARCHAR(50),
+    password_hash TEXT,
     first_name VARCHAR(100),
     last_name VARCHAR(100),
     email VARCHAR(100),
     avatar_url TEXT,
     is_admin BOOLEAN
 ) AS $$
-DECLARE
-    user_record RECORD;
-    password_hash TEXT;
 BEGIN
-    SELECT u.*, pgp_sym_decrypt(u.password_hash::bytea, 'music_library_key') AS plain_password
-    INTO user_record
+    RETURN QUERY
+    SELECT u.user_id, u.login, u.password_hash, u.first_name, u.last_name,
+           u.email, u.avatar_url, u.is_admin
     FROM "user" u
     WHERE u.login = p_login AND u.is_active = true;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Проверка пароля, сохраненного через pgp_sym_encrypt (до перехода на хэши werkzeug).
+-- Вызывается только при первом входе такого пользователя, после чего сервер
+-- заменяет значение хэшем через update_password_hash()
+CREATE OR REPLACE FUNCTION check_legacy_password(p_user_id INTEGER, p_password VARCHAR(255))
+RETURNS TABLE(success BOOLEAN) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT COALESCE(pgp_sym_decrypt(u.password_hash::bytea, 'music_library_key') = p_password, false)
+    FROM "user" u
+    WHERE u.user_id = p_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Замена хэша пароля; не выполняется, если хэш изменился после p_old_hash
+CREATE OR REPLACE FUNCTION update_password_hash(p_user_id INTEGER, p_old_hash TEXT, p_new_hash TEXT)
+RETURNS TABLE(success BOOLEAN) AS $$
+BEGIN
+    UPDATE "user"
+    SET password_hash = p_new_hash
+    WHERE user_id = p_user_id AND password_hash = p_old_hash;
     
-    IF user_record IS NOT NULL THEN
-        -- В реальной системе здесь должна быть проверка хэша пароля
-        -- Для демонстрации просто возвращаем пользователя если найден
-        password_hash := user_record.plain_password;
-        
-        IF password_hash = p_password THEN
-            RETURN QUERY SELECT 
-                true::BOOLEAN AS success,
-                user_record.user_id,
-                user_record.login,
-                user_record.first_name,
-                user_record.last_name,
-                user_record.email,
-                user_record.avatar_url,
-                user_record.is_admin;
-        ELSE
-            RETURN QUERY SELECT 
-                false::BOOLEAN AS success,
-                NULL::INTEGER,
-                NULL::VARCHAR(50),
-                NULL::VARCHAR(100),
-                NULL::VARCHAR(100),
-                NULL::VARCHAR(100),
-                NULL::TEXT,
-                NULL::BOOLEAN;
-        END IF;
-    ELSE
-        RETURN QUERY SELECT 
-            false::BOOLEAN AS success,
-            NULL::INTEGER,
-            NULL::VARCHAR(50),
-            NULL::VARCHAR(100),
-            NULL::VARCHAR(100),
-            NULL::VARCHAR(100),
-            NULL::TEXT,
-            NULL::BOOLEAN;
-    END IF;
+    RETURN QUERY SELECT FOUND;
 END;
 $$ LANGUAGE plpgsql;
 
--- Процедура регистрации пользователя
+-- Процедура регистрации пользователя; p_password_hash - хэш werkzeug, вычисленный сервером
+DROP FUNCTION IF EXISTS register_user(VARCHAR, VARCHAR, VARCHAR, VARCHAR, VARCHAR);
+
 CREATE OR REPLACE FUNCTION register_user(
     p_login VARCHAR(50),
-    p_password VARCHAR(255),
+    p_password_hash VARCHAR(255),
     p_first_name VARCHAR(100),
     p_last_name VARCHAR(100),
     p_email VARCHAR(100)
@@ -254,14 +751,10 @@ RETURNS TABLE(
 ) AS $$
 DECLARE
     new_user_id INTEGER;
-    encrypted_password TEXT;
 BEGIN
-    -- Шифруем пароль (в реальной системе используйте proper password hashing)
-    encrypted_password := pgp_sym_encrypt(p_password, 'music_library_key');
-    
     INSERT INTO "user" (login, password_hash, first_name, last_name, email, is_admin)
-    VALUES (p_login, encrypted_password, p_first_name, p_last_name, p_email, false)
-    RETURNING user_id INTO new_user_id;
+    VALUES (p_login, p_password_hash, p_first_name, p_last_name, p_email, false)
+    RETURNING "user".user_id INTO new_user_id;
     
     IF new_user_id IS NOT NULL THEN
         RETURN QUERY SELECT 
@@ -368,6 +861,79 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура получения профиля вместе с любимыми жанрами и исполнителями.
+-- Избранное возвращается массивами JSON в той же строке, поэтому профиль
+-- загружается одним запросом вместо трех
+CREATE OR REPLACE FUNCTION get_user_profile_full(p_user_id INTEGER)
+RETURNS TABLE(
+    user_id INTEGER,
+    login VARCHAR(50),
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    email VARCHAR(100),
+    avatar_url TEXT,
+    is_admin BOOLEAN,
+    created_at TIMESTAMP,
+    favorite_genres JSON,
+    favorite_artists JSON
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT u.user_id, u.login, u.first_name, u.last_name, u.email, u.avatar_url, u.is_admin, u.created_at,
+           COALESCE((
+               SELECT json_agg(json_build_object('genre_id', g.genre_id, 'name', g.name) ORDER BY g.name)
+               FROM user_favorite_genres ufg
+               JOIN genres g ON ufg.genre_id = g.genre_id
+               WHERE ufg.user_id = u.user_id
+           ), '[]'::json),
+           COALESCE((
+               SELECT json_agg(json_build_object('artist_id', a.artist_id, 'name', a.name) ORDER BY a.name)
+               FROM user_favorite_artists ufa
+               JOIN artists a ON ufa.artist_id = a.artist_id
+               WHERE ufa.user_id = u.user_id
+           ), '[]'::json)
+    FROM "user" u
+    WHERE u.user_id = p_user_id AND u.is_active = true;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура замены любимых жанров и исполнителей пользователя.
+-- NULL вместо массива оставляет соответствующий список без изменений;
+-- несуществующие ID пропускаются
+CREATE OR REPLACE FUNCTION set_user_favorites(
+    p_user_id INTEGER,
+    p_genre_ids INTEGER[],
+    p_artist_ids INTEGER[]
+)
+RETURNS TABLE(success BOOLEAN) AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM "user" u WHERE u.user_id = p_user_id AND u.is_active = true) THEN
+        RETURN QUERY SELECT false::BOOLEAN;
+        RETURN;
+    END IF;
+    
+    IF p_genre_ids IS NOT NULL THEN
+        DELETE FROM user_favorite_genres ufg
+        WHERE ufg.user_id = p_user_id AND NOT (ufg.genre_id = ANY(p_genre_ids));
+        
+        INSERT INTO user_favorite_genres (user_id, genre_id)
+        SELECT p_user_id, g.genre_id FROM genres g WHERE g.genre_id = ANY(p_genre_ids)
+        ON CONFLICT DO NOTHING;
+    END IF;
+    
+    IF p_artist_ids IS NOT NULL THEN
+        DELETE FROM user_favorite_artists ufa
+        WHERE ufa.user_id = p_user_id AND NOT (ufa.artist_id = ANY(p_artist_ids));
+        
+        INSERT INTO user_favorite_artists (user_id, artist_id)
+        SELECT p_user_id, a.artist_id FROM artists a WHERE a.artist_id = ANY(p_artist_ids)
+        ON CONFLICT DO NOTHING;
+    END IF;
+    
+    RETURN QUERY SELECT true::BOOLEAN;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура получения всех жанров
 CREATE OR REPLACE FUNCTION get_all_genres()
 RETURNS TABLE(genre_id INTEGER, name VARCHAR(100), created_at TIMESTAMP) AS $$
@@ -398,7 +964,7 @@ DECLARE
 BEGIN
     INSERT INTO artists (name)
     VALUES (p_name)
-    RETURNING artist_id INTO new_artist_id;
+    RETURNING artists.artist_id INTO new_artist_id;
     
     RETURN QUERY
     SELECT new_artist_id, p_name;
@@ -467,10 +1033,43 @@ DECLARE
 BEGIN
     INSERT INTO tracks (user_id, title, artist_id, genre_id, bpm, duration_sec)
     VALUES (p_user_id, p_title, p_artist_id, p_genre_id, p_bpm, p_duration_sec)
-    RETURNING track_id INTO new_track_id;
+    RETURNING tracks.track_id INTO new_track_id;
     
     RETURN QUERY
-    SELECT new_track_id, p_title, CURRENT_TIMESTAMP;
+    SELECT new_track_id, p_title, CURRENT_TIMESTAMP::TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура массового импорта треков из временной таблицы track_import_staging
+-- (заполняется сервером через COPY в той же транзакции). Недостающие исполнители
+-- и жанры создаются по имени, затем все треки вставляются одним INSERT ... SELECT,
+-- поэтому триггер аудита срабатывает один раз на весь импорт.
+CREATE OR REPLACE FUNCTION import_tracks_from_staging(p_user_id INTEGER)
+RETURNS TABLE(inserted_count INTEGER, artists_created INTEGER, genres_created INTEGER) AS $$
+DECLARE
+    v_inserted INTEGER;
+    v_artists INTEGER;
+    v_genres INTEGER;
+BEGIN
+    INSERT INTO artists (name)
+    SELECT DISTINCT s.artist_name FROM track_import_staging s
+    ON CONFLICT (name) DO NOTHING;
+    GET DIAGNOSTICS v_artists = ROW_COUNT;
+    
+    INSERT INTO genres (name)
+    SELECT DISTINCT s.genre_name FROM track_import_staging s
+    ON CONFLICT (name) DO NOTHING;
+    GET DIAGNOSTICS v_genres = ROW_COUNT;
+    
+    INSERT INTO tracks (user_id, title, artist_id, genre_id, bpm, duration_sec)
+    SELECT p_user_id, s.title, a.artist_id, g.genre_id, s.bpm, s.duration_sec
+    FROM track_import_staging s
+    JOIN artists a ON a.name = s.artist_name
+    JOIN genres g ON g.name = s.genre_name
+    ORDER BY s.line_no;
+    GET DIAGNOSTICS v_inserted = ROW_COUNT;
+    
+    RETURN QUERY SELECT v_inserted, v_artists, v_genres;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -501,6 +1100,38 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура обновления трека с проверкой прав.
+-- Проверка владельца и изменение выполняются одним UPDATE; статусы: ok, not_found.
+-- Чужой трек для не-администратора - тоже not_found: ответ не раскрывает,
+-- существует ли трек
+CREATE OR REPLACE FUNCTION update_track_as_user(
+    p_track_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN,
+    p_title VARCHAR(255),
+    p_artist_id INTEGER,
+    p_genre_id INTEGER,
+    p_bpm INTEGER,
+    p_duration_sec INTEGER
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    UPDATE tracks t
+    SET title = p_title,
+        artist_id = p_artist_id,
+        genre_id = p_genre_id,
+        bpm = p_bpm,
+        duration_sec = p_duration_sec
+    WHERE t.track_id = p_track_id AND (p_is_admin OR t.user_id = p_user_id);
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура удаления трека
 CREATE OR REPLACE FUNCTION delete_track(p_track_id INTEGER)
 RETURNS TABLE(success BOOLEAN) AS $$
@@ -516,6 +1147,25 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура удаления трека с проверкой прав; статусы: ok, not_found (в том числе чужой трек)
+CREATE OR REPLACE FUNCTION delete_track_as_user(
+    p_track_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    DELETE FROM tracks t
+    WHERE t.track_id = p_track_id AND (p_is_admin OR t.user_id = p_user_id);
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура получения треков пользователя
 CREATE OR REPLACE FUNCTION get_user_tracks(p_user_id INTEGER)
 RETURNS TABLE(
@@ -561,6 +1211,89 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура постраничного получения треков пользователя (keyset-пагинация)
+-- Курсор - пара (created_at, track_id) последнего трека предыдущей страницы.
+-- Первая и следующие страницы - отдельные запросы: у каждого свой кэшированный
+-- план, и условие по курсору остается условием индекса и в общем (generic) плане
+CREATE OR REPLACE FUNCTION get_user_tracks_page(
+    p_user_id INTEGER,
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    track_id INTEGER,
+    title VARCHAR(255),
+    artist_name VARCHAR(100),
+    genre_name VARCHAR(100),
+    bpm INTEGER,
+    duration_sec INTEGER,
+    created_at TIMESTAMP
+) AS $$
+BEGIN
+    IF p_after_track_id IS NULL THEN
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        WHERE t.user_id = p_user_id
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    ELSE
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        WHERE t.user_id = p_user_id
+          AND (t.created_at, t.track_id) < (p_after_created_at, p_after_track_id)
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура постраничного получения всех треков (для администраторов)
+CREATE OR REPLACE FUNCTION get_all_tracks_admin_page(
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    track_id INTEGER,
+    title VARCHAR(255),
+    artist_name VARCHAR(100),
+    genre_name VARCHAR(100),
+    bpm INTEGER,
+    duration_sec INTEGER,
+    created_at TIMESTAMP,
+    user_login VARCHAR(50)
+) AS $$
+BEGIN
+    IF p_after_track_id IS NULL THEN
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at, u.login
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        JOIN "user" u ON t.user_id = u.user_id
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    ELSE
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at, u.login
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        JOIN "user" u ON t.user_id = u.user_id
+        WHERE (t.created_at, t.track_id) < (p_after_created_at, p_after_track_id)
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура создания коллекции
 CREATE OR REPLACE FUNCTION create_collection(
     p_user_id INTEGER,
@@ -573,10 +1306,10 @@ DECLARE
 BEGIN
     INSERT INTO collections (user_id, name, is_favorite)
     VALUES (p_user_id, p_name, p_is_favorite)
-    RETURNING collection_id INTO new_collection_id;
+    RETURNING collections.collection_id INTO new_collection_id;
     
     RETURN QUERY
-    SELECT new_collection_id, p_name, p_is_favorite, CURRENT_TIMESTAMP;
+    SELECT new_collection_id, p_name, p_is_favorite, CURRENT_TIMESTAMP::TIMESTAMP;
 END;
 $$ LANGUAGE plpgsql;
 
@@ -601,6 +1334,30 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура обновления коллекции с проверкой прав.
+-- Коллекцию может изменить только ее владелец; статусы: ok, not_found
+-- (в том числе чужая коллекция)
+CREATE OR REPLACE FUNCTION update_collection_as_user(
+    p_collection_id INTEGER,
+    p_user_id INTEGER,
+    p_name VARCHAR(255),
+    p_is_favorite BOOLEAN
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    UPDATE collections c
+    SET name = p_name,
+        is_favorite = p_is_favorite
+    WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура удаления коллекции
 CREATE OR REPLACE FUNCTION delete_collection(p_collection_id INTEGER)
 RETURNS TABLE(success BOOLEAN) AS $$
@@ -616,6 +1373,24 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура удаления коллекции с проверкой прав; статусы: ok, not_found (в том числе чужая коллекция)
+CREATE OR REPLACE FUNCTION delete_collection_as_user(
+    p_collection_id INTEGER,
+    p_user_id INTEGER
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    DELETE FROM collections c
+    WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура получения коллекций пользователя
 CREATE OR REPLACE FUNCTION get_user_collections(p_user_id INTEGER)
 RETURNS TABLE(
@@ -627,14 +1402,87 @@ RETURNS TABLE(
 ) AS $$
 BEGIN
     RETURN QUERY
-    SELECT c.collection_id, c.name, c.is_favorite, c.created_at,
-           (SELECT COUNT(*) FROM collection_tracks ct WHERE ct.collection_id = c.collection_id) AS tracks_count
+    SELECT c.collection_id, c.name, c.is_favorite, c.created_at, c.tracks_count
     FROM collections c
     WHERE c.user_id = p_user_id
     ORDER BY c.is_favorite DESC, c.name;
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура получения коллекции с треками одним запросом.
+-- Коллекция и страница ее треков (с именами исполнителей и жанров) собираются
+-- в один JSON через json_agg; треки упорядочены по (added_at, track_id).
+-- Даты в JSON - в формате HTTP (api_timestamp), как в остальных ответах API.
+-- next_added_at / next_track_id - ключ следующей страницы (NULL - страница последняя).
+-- Условие по курсору добавляется в запрос только для следующих страниц
+-- (динамический SQL), чтобы оно оставалось условием индекса
+-- idx_collection_tracks_order и в общем (generic) плане
+CREATE OR REPLACE FUNCTION get_collection_detail(
+    p_collection_id INTEGER,
+    p_after_added_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    owner_id INTEGER,
+    collection JSON,
+    next_added_at TIMESTAMP,
+    next_track_id INTEGER
+) AS $$
+DECLARE
+    v_sql TEXT;
+BEGIN
+    v_sql := 'WITH page AS (
+                  SELECT ct.track_id, t.title, a.name AS artist_name, g.name AS genre_name,
+                         t.bpm, t.duration_sec, ct.added_at,
+                         row_number() OVER (ORDER BY ct.added_at, ct.track_id) AS rn
+                  FROM collection_tracks ct
+                  JOIN tracks t ON t.track_id = ct.track_id
+                  JOIN artists a ON a.artist_id = t.artist_id
+                  JOIN genres g ON g.genre_id = t.genre_id
+                  WHERE ct.collection_id = $1';
+    IF p_after_track_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND (ct.added_at, ct.track_id) > ($2, $3)';
+    END IF;
+    v_sql := v_sql || '
+                  ORDER BY ct.added_at, ct.track_id
+                  LIMIT $4 + 1
+              ),
+              last_row AS (
+                  SELECT p.added_at, p.track_id FROM page p
+                  WHERE p.rn = $4 AND EXISTS (SELECT 1 FROM page x WHERE x.rn > $4)
+              )
+              SELECT c.user_id,
+                     json_build_object(
+                         ''collection_id'', c.collection_id,
+                         ''name'', c.name,
+                         ''is_favorite'', c.is_favorite,
+                         ''created_at'', api_timestamp(c.created_at),
+                         ''tracks_count'', c.tracks_count,
+                         ''tracks'', COALESCE((
+                             SELECT json_agg(json_build_object(
+                                        ''track_id'', p.track_id,
+                                        ''title'', p.title,
+                                        ''artist_name'', p.artist_name,
+                                        ''genre_name'', p.genre_name,
+                                        ''bpm'', p.bpm,
+                                        ''duration_sec'', p.duration_sec,
+                                        ''added_at'', api_timestamp(p.added_at)
+                                    ) ORDER BY p.rn)
+                             FROM page p
+                             WHERE p.rn <= $4
+                         ), ''[]''::json)
+                     ),
+                     (SELECT l.added_at FROM last_row l),
+                     (SELECT l.track_id FROM last_row l)
+              FROM collections c
+              WHERE c.collection_id = $1';
+    
+    RETURN QUERY EXECUTE v_sql
+        USING p_collection_id, p_after_added_at, p_after_track_id, p_limit;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура добавления трека в коллекцию
 CREATE OR REPLACE FUNCTION add_track_to_collection(
     p_collection_id INTEGER,
@@ -656,6 +1504,47 @@ EXCEPTION
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура добавления трека в коллекцию с проверкой прав.
+-- Коллекция должна принадлежать пользователю, трек - пользователю (или любой
+-- для администратора); проверка и вставка выполняются одним INSERT ... SELECT.
+-- Повторное добавление не считается ошибкой. Статусы: ok, not_found (коллекции
+-- или трека нет либо они чужие)
+CREATE OR REPLACE FUNCTION add_track_to_collection_as_user(
+    p_collection_id INTEGER,
+    p_track_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    INSERT INTO collection_tracks (collection_id, track_id)
+    SELECT c.collection_id, t.track_id
+    FROM collections c
+    JOIN tracks t ON t.track_id = p_track_id
+    WHERE c.collection_id = p_collection_id
+      AND c.user_id = p_user_id
+      AND (p_is_admin OR t.user_id = p_user_id)
+    ON CONFLICT DO NOTHING;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSIF EXISTS (
+        -- Вставки не было: трек уже в коллекции или коллекция/трек недоступны
+        SELECT 1 FROM collection_tracks ct
+        JOIN collections c ON c.collection_id = ct.collection_id
+        JOIN tracks t ON t.track_id = ct.track_id
+        WHERE ct.collection_id = p_collection_id
+          AND ct.track_id = p_track_id
+          AND c.user_id = p_user_id
+          AND (p_is_admin OR t.user_id = p_user_id)
+    ) THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20); -- Уже добавлено
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура удаления трека из коллекции
 CREATE OR REPLACE FUNCTION remove_track_from_collection(
     p_collection_id INTEGER,
@@ -674,6 +1563,115 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура удаления трека из коллекции с проверкой прав.
+-- Статусы: ok, not_found (коллекции нет, она чужая или трека в ней нет)
+CREATE OR REPLACE FUNCTION remove_track_from_collection_as_user(
+    p_collection_id INTEGER,
+    p_track_id INTEGER,
+    p_user_id INTEGER
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    DELETE FROM collection_tracks ct
+    USING collections c
+    WHERE ct.collection_id = p_collection_id
+      AND ct.track_id = p_track_id
+      AND c.collection_id = ct.collection_id
+      AND c.user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура пакетного добавления треков в коллекцию.
+-- Коллекция должна принадлежать пользователю; треки - пользователю (или любые
+-- для администратора). Владение всеми треками проверяется одним запросом,
+-- вставка выполняется одним INSERT ... ON CONFLICT DO NOTHING.
+-- Статусы: added, already_present, not_found (трека нет или он чужой);
+-- строка с track_id = NULL и статусом not_found - коллекции нет или она чужая.
+CREATE OR REPLACE FUNCTION add_tracks_to_collection_batch(
+    p_collection_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN,
+    p_track_ids INTEGER[]
+)
+RETURNS TABLE(track_id INTEGER, status VARCHAR(20)) AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM collections c
+        WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT NULL::INTEGER, 'not_found'::VARCHAR(20);
+        RETURN;
+    END IF;
+    
+    RETURN QUERY
+    WITH requested AS (
+        SELECT DISTINCT r.track_id FROM unnest(p_track_ids) AS r(track_id)
+    ),
+    existing AS (
+        SELECT t.track_id, (p_is_admin OR t.user_id = p_user_id) AS allowed
+        FROM tracks t
+        WHERE t.track_id = ANY(p_track_ids)
+    ),
+    inserted AS (
+        INSERT INTO collection_tracks (collection_id, track_id)
+        SELECT p_collection_id, e.track_id FROM existing e WHERE e.allowed
+        ON CONFLICT DO NOTHING
+        RETURNING collection_tracks.track_id
+    )
+    SELECT r.track_id,
+           (CASE
+               WHEN i.track_id IS NOT NULL THEN 'added'
+               WHEN e.track_id IS NULL OR NOT e.allowed THEN 'not_found'
+               ELSE 'already_present'
+           END)::VARCHAR(20)
+    FROM requested r
+    LEFT JOIN existing e ON e.track_id = r.track_id
+    LEFT JOIN inserted i ON i.track_id = r.track_id
+    ORDER BY r.track_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура пакетного удаления треков из коллекции.
+-- Статусы: removed, not_in_collection; строка с track_id = NULL и статусом
+-- not_found - коллекции нет или она чужая.
+CREATE OR REPLACE FUNCTION remove_tracks_from_collection_batch(
+    p_collection_id INTEGER,
+    p_user_id INTEGER,
+    p_track_ids INTEGER[]
+)
+RETURNS TABLE(track_id INTEGER, status VARCHAR(20)) AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM collections c
+        WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT NULL::INTEGER, 'not_found'::VARCHAR(20);
+        RETURN;
+    END IF;
+    
+    RETURN QUERY
+    WITH requested AS (
+        SELECT DISTINCT r.track_id FROM unnest(p_track_ids) AS r(track_id)
+    ),
+    deleted AS (
+        DELETE FROM collection_tracks ct
+        WHERE ct.collection_id = p_collection_id AND ct.track_id = ANY(p_track_ids)
+        RETURNING ct.track_id
+    )
+    SELECT r.track_id,
+           (CASE WHEN d.track_id IS NOT NULL THEN 'removed' ELSE 'not_in_collection' END)::VARCHAR(20)
+    FROM requested r
+    LEFT JOIN deleted d ON d.track_id = r.track_id
+    ORDER BY r.track_id;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура поиска треков
 CREATE OR REPLACE FUNCTION search_tracks(
     p_title VARCHAR(255),
@@ -706,6 +1704,76 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура ранжированного поиска треков с диапазонами BPM и длительности.
+-- Название и исполнитель ищутся как подстроки (ILIKE, ускоряется триграммными
+-- индексами), результаты упорядочиваются по сходству (word_similarity).
+-- p_user_id ограничивает поиск треками пользователя (NULL - все треки).
+-- Запрос собирается только из заданных фильтров, чтобы планировщик
+-- использовал подходящие индексы.
+CREATE OR REPLACE FUNCTION search_tracks_ranked(
+    p_title VARCHAR(255),
+    p_artist VARCHAR(100),
+    p_genre_id INTEGER,
+    p_bpm_min INTEGER,
+    p_bpm_max INTEGER,
+    p_duration_min INTEGER,
+    p_duration_max INTEGER,
+    p_user_id INTEGER,
+    p_limit INTEGER,
+    p_offset INTEGER
+)
+RETURNS TABLE(
+    track_id INTEGER,
+    title VARCHAR(255),
+    artist_name VARCHAR(100),
+    genre_name VARCHAR(100),
+    bpm INTEGER,
+    duration_sec INTEGER,
+    created_at TIMESTAMP,
+    rank REAL
+) AS $$
+DECLARE
+    v_sql TEXT;
+BEGIN
+    v_sql := 'SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at,
+                     (COALESCE(word_similarity($1, t.title), 0)
+                      + COALESCE(word_similarity($2, a.name), 0))::REAL AS rank
+              FROM tracks t
+              JOIN artists a ON t.artist_id = a.artist_id
+              JOIN genres g ON t.genre_id = g.genre_id
+              WHERE true';
+    IF p_title IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.title ILIKE ''%'' || $1 || ''%''';
+    END IF;
+    IF p_artist IS NOT NULL THEN
+        v_sql := v_sql || ' AND a.name ILIKE ''%'' || $2 || ''%''';
+    END IF;
+    IF p_genre_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.genre_id = $3';
+    END IF;
+    IF p_bpm_min IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.bpm >= $4';
+    END IF;
+    IF p_bpm_max IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.bpm <= $5';
+    END IF;
+    IF p_duration_min IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.duration_sec >= $6';
+    END IF;
+    IF p_duration_max IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.duration_sec <= $7';
+    END IF;
+    IF p_user_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND t.user_id = $8';
+    END IF;
+    v_sql := v_sql || ' ORDER BY rank DESC, t.created_at DESC, t.track_id DESC LIMIT $9 OFFSET $10';
+    
+    RETURN QUERY EXECUTE v_sql
+        USING p_title, p_artist, p_genre_id, p_bpm_min, p_bpm_max, p_duration_min, p_duration_max,
+              p_user_id, p_limit, p_offset;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура получения всех пользователей (для администраторов)
 CREATE OR REPLACE FUNCTION get_all_users_admin()
 RETURNS TABLE(
@@ -726,6 +1794,22 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура блокировки/разблокировки пользователя (для администраторов)
+CREATE OR REPLACE FUNCTION set_user_active(p_user_id INTEGER, p_is_active BOOLEAN)
+RETURNS TABLE(success BOOLEAN) AS $$
+BEGIN
+    UPDATE "user"
+    SET is_active = p_is_active
+    WHERE user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT true::BOOLEAN;
+    ELSE
+        RETURN QUERY SELECT false::BOOLEAN;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Процедура получения журнала аудита
 CREATE OR REPLACE FUNCTION get_audit_log()
 RETURNS TABLE(
@@ -746,6 +1830,279 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Процедура поиска по журналу аудита с фильтрами и keyset-пагинацией.
+-- Запрос собирается динамически только из заданных фильтров, чтобы
+-- планировщик выбирал подходящий индекс для каждой комбинации.
+CREATE OR REPLACE FUNCTION get_audit_log_page(
+    p_from TIMESTAMP,
+    p_to TIMESTAMP,
+    p_table_name VARCHAR(50),
+    p_operation_type VARCHAR(20),
+    p_user_id INTEGER,
+    p_record_id INTEGER,
+    p_after_time TIMESTAMP,
+    p_after_log_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    log_id INTEGER,
+    user_id INTEGER,
+    user_login VARCHAR(50),
+    operation_type VARCHAR(20),
+    table_name VARCHAR(50),
+    record_id INTEGER,
+    operation_time TIMESTAMP,
+    details JSONB
+) AS $$
+DECLARE
+    v_sql TEXT;
+BEGIN
+    v_sql := 'SELECT al.log_id, al.user_id, u.login, al.operation_type, al.table_name,
+                     al.record_id, al.operation_time, al.details
+              FROM audit_log al
+              LEFT JOIN "user" u ON al.user_id = u.user_id
+              WHERE true';
+    IF p_from IS NOT NULL THEN
+        v_sql := v_sql || ' AND al.operation_time >= $1';
+    END IF;
+    IF p_to IS NOT NULL THEN
+        v_sql := v_sql || ' AND al.operation_time < $2';
+    END IF;
+    IF p_table_name IS NOT NULL THEN
+        v_sql := v_sql || ' AND al.table_name = $3';
+    END IF;
+    IF p_operation_type IS NOT NULL THEN
+        v_sql := v_sql || ' AND al.operation_type = $4';
+    END IF;
+    IF p_user_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND al.user_id = $5';
+    END IF;
+    IF p_record_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND al.record_id = $6';
+    END IF;
+    IF p_after_log_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND (al.operation_time, al.log_id) < ($7, $8)';
+    END IF;
+    v_sql := v_sql || ' ORDER BY al.operation_time DESC, al.log_id DESC LIMIT $9';
+    
+    RETURN QUERY EXECUTE v_sql
+        USING p_from, p_to, p_table_name, p_operation_type, p_user_id, p_record_id,
+              p_after_time, p_after_log_id, p_limit;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Функции выгрузки для потоковой выгрузки (серверный курсор).
+-- Написаны на SQL, а не PL/pgSQL: такие функции встраиваются в запрос,
+-- и строки отдаются по мере чтения, без материализации всего результата.
+CREATE OR REPLACE FUNCTION export_tracks()
+RETURNS TABLE(
+    track_id INTEGER,
+    title VARCHAR(255),
+    artist_name VARCHAR(100),
+    genre_name VARCHAR(100),
+    bpm INTEGER,
+    duration_sec INTEGER,
+    created_at TIMESTAMP,
+    user_id INTEGER,
+    user_login VARCHAR(50)
+) AS $$
+    SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at, t.user_id, u.login
+    FROM tracks t
+    JOIN artists a ON t.artist_id = a.artist_id
+    JOIN genres g ON t.genre_id = g.genre_id
+    JOIN "user" u ON t.user_id = u.user_id
+    ORDER BY t.track_id;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION export_audit_log()
+RETURNS TABLE(
+    log_id INTEGER,
+    user_id INTEGER,
+    user_login VARCHAR(50),
+    operation_type VARCHAR(20),
+    table_name VARCHAR(50),
+    record_id INTEGER,
+    operation_time TIMESTAMP,
+    details JSONB
+) AS $$
+    SELECT al.log_id, al.user_id, u.login, al.operation_type, al.table_name, al.record_id, al.operation_time, al.details
+    FROM audit_log al
+    LEFT JOIN "user" u ON al.user_id = u.user_id
+    ORDER BY al.log_id;
+$$ LANGUAGE sql STABLE;
+
+-- Страницы списков одним документом JSON. Функции *_json вызывают
+-- постраничные процедуры с p_limit + 1 и возвращают items - готовый массив
+-- JSON из p_limit строк (ключи по алфавиту, даты в формате HTTP, как в
+-- ответах API), который сервер приложения передает клиенту без разбора, и
+-- ключ следующей страницы (NULL - страница последняя). items имеет тип TEXT,
+-- чтобы драйверы не декодировали JSON.
+
+-- Дата в формате HTTP (RFC 7231), как ее выводит JSON-сериализатор Flask
+CREATE OR REPLACE FUNCTION api_timestamp(p_value TIMESTAMP)
+RETURNS TEXT AS $$
+    SELECT to_char(p_value, 'Dy, DD Mon YYYY HH24:MI:SS "GMT"');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_user_tracks_page_json(
+    p_user_id INTEGER,
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(items TEXT, next_created_at TIMESTAMP, next_track_id INTEGER) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           CASE WHEN count(*) > p_limit THEN max(p.created_at) FILTER (WHERE p.ordinality = p_limit) END,
+           CASE WHEN count(*) > p_limit THEN max(p.track_id) FILTER (WHERE p.ordinality = p_limit) END
+    FROM get_user_tracks_page(p_user_id, p_after_created_at, p_after_track_id, p_limit + 1) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.artist_name, p.bpm, api_timestamp(p.created_at) AS created_at, p.duration_sec,
+               p.genre_name, p.title, p.track_id
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_all_tracks_admin_page_json(
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(items TEXT, next_created_at TIMESTAMP, next_track_id INTEGER) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           CASE WHEN count(*) > p_limit THEN max(p.created_at) FILTER (WHERE p.ordinality = p_limit) END,
+           CASE WHEN count(*) > p_limit THEN max(p.track_id) FILTER (WHERE p.ordinality = p_limit) END
+    FROM get_all_tracks_admin_page(p_after_created_at, p_after_track_id, p_limit + 1) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.artist_name, p.bpm, api_timestamp(p.created_at) AS created_at, p.duration_sec,
+               p.genre_name, p.title, p.track_id, p.user_login
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+-- has_more - есть ли результаты после p_offset + p_limit
+CREATE OR REPLACE FUNCTION search_tracks_ranked_json(
+    p_title VARCHAR(255),
+    p_artist VARCHAR(100),
+    p_genre_id INTEGER,
+    p_bpm_min INTEGER,
+    p_bpm_max INTEGER,
+    p_duration_min INTEGER,
+    p_duration_max INTEGER,
+    p_user_id INTEGER,
+    p_limit INTEGER,
+    p_offset INTEGER
+)
+RETURNS TABLE(items TEXT, has_more BOOLEAN) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           count(*) > p_limit
+    FROM search_tracks_ranked(p_title, p_artist, p_genre_id, p_bpm_min, p_bpm_max,
+                              p_duration_min, p_duration_max, p_user_id, p_limit + 1, p_offset) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.artist_name, p.bpm, api_timestamp(p.created_at) AS created_at, p.duration_sec,
+               p.genre_name, p.rank, p.title, p.track_id
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_audit_log_page_json(
+    p_from TIMESTAMP,
+    p_to TIMESTAMP,
+    p_table_name VARCHAR(50),
+    p_operation_type VARCHAR(20),
+    p_user_id INTEGER,
+    p_record_id INTEGER,
+    p_after_time TIMESTAMP,
+    p_after_log_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(items TEXT, next_operation_time TIMESTAMP, next_log_id INTEGER) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           CASE WHEN count(*) > p_limit THEN max(p.operation_time) FILTER (WHERE p.ordinality = p_limit) END,
+           CASE WHEN count(*) > p_limit THEN max(p.log_id) FILTER (WHERE p.ordinality = p_limit) END
+    FROM get_audit_log_page(p_from, p_to, p_table_name, p_operation_type, p_user_id, p_record_id,
+                            p_after_time, p_after_log_id, p_limit + 1) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.details, p.log_id, api_timestamp(p.operation_time) AS operation_time, p.operation_type,
+               p.record_id, p.table_name, p.user_id, p.user_login
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+-- Изменения треков после курсора p_since одним документом JSON: upserted -
+-- добавленные и измененные треки (поля как в get_user_tracks_page_json),
+-- deleted - ID удаленных. Курсор и изменения берутся из одного
+-- снимка (функция STABLE), поэтому курсор возвращается вместе с ними.
+-- reset = TRUE (без изменений), если курсора нет, он старше границы удаленных
+-- меток или изменений больше p_limit: клиенту дешевле загрузить список заново.
+-- p_user_id = NULL - треки всех пользователей (администратор).
+CREATE OR REPLACE FUNCTION get_track_changes(
+    p_user_id INTEGER,
+    p_since BIGINT,
+    p_limit INTEGER
+)
+RETURNS TABLE(sync_cursor BIGINT, reset BOOLEAN, upserted TEXT, deleted TEXT) AS $$
+DECLARE
+    v_cursor BIGINT := txid_snapshot_xmin(txid_current_snapshot());
+    v_changes INTEGER;
+BEGIN
+    IF p_since IS NOT NULL AND p_since >= (SELECT h.pruned_xid FROM track_changes_horizon h) THEN
+        SELECT count(*) INTO v_changes
+        FROM (
+            SELECT 1 FROM track_changes c
+            WHERE (p_user_id IS NULL OR c.user_id = p_user_id)
+              AND c.change_xid >= p_since
+            LIMIT p_limit + 1
+        ) s;
+    END IF;
+
+    IF v_changes IS NULL OR v_changes > p_limit THEN
+        RETURN QUERY SELECT v_cursor, TRUE, '[]'::TEXT, '[]'::TEXT;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT v_cursor, FALSE,
+           '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY c.track_id)
+                               FILTER (WHERE t.track_id IS NOT NULL), '') || ']',
+           '[' || COALESCE(string_agg(c.track_id::TEXT, ',' ORDER BY c.track_id)
+                               FILTER (WHERE t.track_id IS NULL), '') || ']'
+    FROM track_changes c
+    LEFT JOIN tracks t ON t.track_id = c.track_id
+    LEFT JOIN artists a ON a.artist_id = t.artist_id
+    LEFT JOIN genres g ON g.genre_id = t.genre_id
+    CROSS JOIN LATERAL (
+        SELECT a.name AS artist_name, t.bpm, api_timestamp(t.created_at) AS created_at, t.duration_sec,
+               g.name AS genre_name, t.title, t.track_id
+    ) r
+    WHERE (p_user_id IS NULL OR c.user_id = p_user_id)
+      AND c.change_xid >= p_since;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Удаление меток удаленных треков старше p_retention. Курсоры, выданные до
+-- удаленных меток, становятся недействительными (reset в get_track_changes).
+-- Запускать периодически вместе с maintain_audit_log_partitions:
+--   SELECT prune_track_changes(INTERVAL '90 days');
+CREATE OR REPLACE FUNCTION prune_track_changes(p_retention INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_pruned_xid BIGINT;
+    v_count INTEGER;
+BEGIN
+    WITH pruned AS (
+        DELETE FROM track_changes
+        WHERE deleted AND changed_at < CURRENT_TIMESTAMP - p_retention
+        RETURNING change_xid
+    )
+    SELECT max(change_xid), count(*) INTO v_pruned_xid, v_count FROM pruned;
+
+    IF v_pruned_xid IS NOT NULL THEN
+        UPDATE track_changes_horizon SET pruned_xid = GREATEST(pruned_xid, v_pruned_xid + 1);
+    END IF;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Вставка начальных данных
 INSERT INTO genres (name) VALUES 
     ('Рок'), 
@@ -768,7 +2125,8 @@ ON CONFLICT (name) DO NOTHING;
 INSERT INTO "user" (login, password_hash, first_name, last_name, email, is_admin, is_active)
 VALUES (
     'admin',
-    pgp_sym_encrypt('admin', 'music_library_key'),
+    -- хэш werkzeug пароля 'admin'
+    'pbkdf2:sha256:600000$P4s6gUA8cXe7y5mc$ea2df7b51240bdb19a6e2c59589aa269c1d72e8ef767cc79dd6b4bb8088a5a52',
     'System',
     'Administrator',
     'admin@example.com',
@@ -780,7 +2138,8 @@ ON CONFLICT (login) DO NOTHING;
 INSERT INTO "user" (login, password_hash, first_name, last_name, email, is_admin, is_active)
 VALUES (
     'user',
-    pgp_sym_encrypt('user', 'music_library_key'),
+    -- хэш werkzeug пароля 'user'
+    'pbkdf2:sha256:600000$1vE8mxew9N0FSpQJ$ad6410ef78e98b475a51b8889f6cdcfb8fcba00d8d90864b0e79b8eac650972e',
     'Regular',
     'User',
     'user@example.com',
@@ -0,0 +1,297 @@
+"""Bounded PostgreSQL connection pool used by server.py"""
+
+import threading
+import time
+from functools import wraps
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out within the timeout"""
+
+
+# Calls that send a statement; fetches only add to the database time
+_STATEMENT_METHODS = ('execute', 'executemany', 'callproc', 'copy_expert', 'copy_from', 'copy_to')
+_TIMED_METHODS = _STATEMENT_METHODS + ('fetchone', 'fetchmany', 'fetchall')
+_timed_cursor_classes = {}
+
+
+def _timed(method, is_statement):
+    @wraps(method)
+    def timed(self, *args, **kwargs):
+        conn = self.connection
+        if conn.on_db_time is None and conn.on_query is None:
+            return method(self, *args, **kwargs)
+        error = None
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            if conn.on_db_time is not None:
+                conn.on_db_time(elapsed)
+            if is_statement and conn.on_query is not None:
+                conn.on_query(self, method.__name__, args, elapsed, error)
+    return timed
+
+
+def _timed_cursor_class(factory):
+    cls = _timed_cursor_classes.get(factory)
+    if cls is None:
+        namespace = {name: _timed(getattr(factory, name), name in _STATEMENT_METHODS)
+                     for name in _TIMED_METHODS}
+        cls = _timed_cursor_classes[factory] = type('Timed' + factory.__name__, (factory,), namespace)
+    return cls
+
+
+class TimedConnection(extensions.connection):
+    """Connection whose cursors report the time spent in database calls.
+
+    Whatever cursor class the caller asks for (e.g. RealDictCursor) is kept.
+    After every execute/callproc/fetch/copy the elapsed seconds are passed
+    to ``on_db_time``; statement calls are also reported to
+    ``on_query(cursor, method, args, seconds, error)`` for tracing.
+    Cursors created directly with ``extensions.cursor(conn)`` are not timed.
+    """
+
+    on_db_time = None
+    on_query = None
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool of psycopg2 connections.
+
+    Connections are opened lazily up to ``maxconn`` (``warm()`` opens the
+    first ``minconn`` eagerly); idle connections above ``minconn`` are closed
+    after ``max_idle`` seconds. A connection that has been idle longer than
+    ``validate_after`` seconds is checked with ``SELECT 1`` before it is
+    handed out, and broken connections are discarded on return.
+
+    With ``on_db_time`` or ``on_query`` the pool opens TimedConnection
+    objects that report every cursor call to these callbacks.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, validate_after=30.0, max_idle=300.0,
+                 on_db_time=None, on_query=None, **conn_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError('Invalid pool size: min=%s max=%s' % (minconn, maxconn))
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self.max_idle = max_idle
+        self.on_db_time = on_db_time
+        self.on_query = on_query
+        self.conn_kwargs = conn_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = []          # list of (connection, returned_at)
+        self._in_use = set()
+        self._opening = 0
+        self._closed = False
+
+        # Statistics
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+
+    def _connect(self):
+        if self.on_db_time is None and self.on_query is None:
+            conn = psycopg2.connect(**self.conn_kwargs)
+        else:
+            conn = psycopg2.connect(connection_factory=TimedConnection, **self.conn_kwargs)
+            conn.on_db_time = self.on_db_time
+            conn.on_query = self.on_query
+        conn.autocommit = True
+        return conn
+
+    def _is_usable(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for < self.validate_after:
+            return True
+        try:
+            # Plain cursor: pool housekeeping is not reported to the callbacks
+            with extensions.cursor(conn) as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        """Check out a connection, waiting up to ``timeout`` seconds"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError('Connection pool is closed')
+
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                    self._in_use.add(conn)
+                    break
+
+                if len(self._in_use) + self._opening < self.maxconn:
+                    self._opening += 1
+                    conn = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(
+                        'Timed out after %.1fs waiting for a database connection' % self.timeout)
+                waited = True
+                self._cond.wait(remaining)
+
+            waited_for = time.monotonic() - started
+            self._checkouts += 1
+            if waited:
+                self._waits += 1
+            self._wait_time_total += waited_for
+            self._wait_time_max = max(self._wait_time_max, waited_for)
+
+        if conn is None:
+            # Open the new connection outside the lock
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._opening -= 1
+                self._in_use.add(conn)
+            return conn
+
+        if self._is_usable(conn, time.monotonic() - returned_at):
+            return conn
+
+        # Stale connection: replace it with a fresh one in the same slot
+        with self._cond:
+            self._discard(conn)
+        try:
+            fresh = self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use.discard(conn)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._in_use.discard(conn)
+            self._in_use.add(fresh)
+        return fresh
+
+    def putconn(self, conn):
+        """Return a connection to the pool, resetting its session state"""
+        reusable = not conn.closed
+        if reusable:
+            try:
+                status = conn.info.transaction_status
+                if status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if not conn.autocommit:
+                    conn.autocommit = True
+            except psycopg2.Error:
+                reusable = False
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if reusable and not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._prune_idle()
+            else:
+                self._discard(conn)
+            self._cond.notify()
+
+    def _prune_idle(self):
+        # Idle connections are reused LIFO, so the oldest ones sit at the
+        # front; close those above the floor once they exceed max_idle.
+        now = time.monotonic()
+        while len(self._idle) > self.minconn and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.pop(0)
+            self._discard(conn)
+
+    def warm(self):
+        """Open connections until ``minconn`` are available"""
+        with self._cond:
+            missing = self.minconn - len(self._idle) - len(self._in_use) - self._opening
+            self._opening += max(missing, 0)
+        opened = []
+        try:
+            for _ in range(max(missing, 0)):
+                opened.append(self._connect())
+        finally:
+            with self._cond:
+                self._opening -= max(missing, 0)
+                now = time.monotonic()
+                self._idle.extend((conn, now) for conn in opened)
+                self._cond.notify_all()
+
+    def resize(self, minconn, maxconn):
+        """Change the pool bounds, closing idle connections above the new maximum.
+
+        Used by pre-forking servers to size each worker's share of the
+        database connection budget after fork.
+        """
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError('Invalid pool size: min=%s max=%s' % (minconn, maxconn))
+        with self._cond:
+            self.minconn = minconn
+            self.maxconn = maxconn
+            while self._idle and len(self._idle) + len(self._in_use) + self._opening > maxconn:
+                conn, _ = self._idle.pop(0)
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        """Snapshot of pool usage counters"""
+        with self._cond:
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'opening': self._opening,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'wait_time_total_ms': round(self._wait_time_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_time_max * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_time_total * 1000 / self._checkouts, 3)
+                                    if self._checkouts else 0.0,
+            }
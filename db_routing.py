@@ -0,0 +1,108 @@
+"""Read-replica routing with read-your-writes, used by server.py and async_server.py"""
+
+import asyncio
+import threading
+import time
+
+from cache import TTLCache
+
+# Cookie carrying the WAL position of the client's last write, so the
+# guarantee holds whichever worker process serves the next read
+LSN_COOKIE = 'db_write_lsn'
+
+CURRENT_LSN_SQL = 'SELECT pg_current_wal_lsn()::text'
+REPLAY_LSN_SQL = 'SELECT pg_last_wal_replay_lsn()::text'
+
+# Methods that never write; any other request is routed to the primary
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def parse_lsn(text):
+    """'16/B374D848' -> int; ValueError on anything else"""
+    high, low = text.split('/')
+    return (int(high, 16) << 32) | int(low, 16)
+
+
+def format_lsn(value):
+    return '%X/%X' % (value >> 32, value & 0xFFFFFFFF)
+
+
+class ReadYourWrites:
+    """Decides whether a read may be served by the replica.
+
+    After a successful mutation the primary's current WAL position is
+    recorded for the user (in-process) and returned to the client in
+    LSN_COOKIE. A later read uses the replica only once the replica has
+    replayed that position: the replica is polled for up to ``max_wait``
+    seconds, after which the read goes to the primary. Positions are kept for
+    ``ttl`` seconds; a replica lagging further behind than that is not
+    detected. A replica that is not in recovery (pg_last_wal_replay_lsn() is
+    NULL, e.g. the primary itself) always counts as caught up.
+    """
+
+    def __init__(self, ttl, max_wait, poll_interval=0.01, maxsize=100000):
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self._writes = TTLCache(maxsize, ttl)   # user_id -> last write LSN
+        self._lock = threading.Lock()
+        self.reads = {'replica': 0, 'primary_lag': 0, 'primary_unavailable': 0}
+        self.waits = 0
+
+    def record_write(self, user_id, lsn):
+        if user_id is None:
+            return
+        with self._lock:
+            self._writes.set(user_id, max(lsn, self._writes.get(user_id, 0)))
+
+    def required_lsn(self, user_id, cookie=None):
+        """Position the replica must have replayed before serving this user, or None"""
+        required = self._writes.get(user_id) if user_id is not None else None
+        if cookie:
+            try:
+                required = max(required or 0, parse_lsn(cookie))
+            except ValueError:
+                pass
+        return required
+
+    def _replayed(self, replayed, required):
+        return replayed is None or parse_lsn(replayed) >= required
+
+    def wait_for_replay(self, fetch_replay_lsn, required):
+        """True once fetch_replay_lsn() reaches ``required``, False after max_wait"""
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while not self._replayed(fetch_replay_lsn(), required):
+            if time.monotonic() + self.poll_interval > deadline:
+                return False
+            waited = True
+            time.sleep(self.poll_interval)
+        if waited:
+            self.count_wait()
+        return True
+
+    async def await_replay(self, fetch_replay_lsn, required):
+        """Async wait_for_replay; fetch_replay_lsn is a coroutine function"""
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while not self._replayed(await fetch_replay_lsn(), required):
+            if time.monotonic() + self.poll_interval > deadline:
+                return False
+            waited = True
+            await asyncio.sleep(self.poll_interval)
+        if waited:
+            self.count_wait()
+        return True
+
+    def count_read(self, target):
+        with self._lock:
+            self.reads[target] += 1
+
+    def count_wait(self):
+        with self._lock:
+            self.waits += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.reads, waits=self.waits, sticky_users=self._writes.stats()['size'],
+                        ttl_sec=self.ttl, max_wait_ms=self.max_wait * 1000)
@@ -0,0 +1,139 @@
+"""Constant-memory streaming of stored procedure results as NDJSON or CSV.
+
+The plain functions work on psycopg2 connections and regular iterators; the
+``a``-prefixed ones are their asyncio counterparts for asyncpg (used by
+async_server.py) and share the same encoders.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from psycopg2 import sql
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def iter_batches(conn, procedure, itersize):
+    """Yield (columns, rows) batches from ``SELECT * FROM procedure()``.
+
+    Uses a server-side (named) cursor, so at most ``itersize`` rows are held
+    in Python memory at a time. Named cursors need a transaction, so the
+    connection is switched out of autocommit for the duration of the export;
+    the pool restores it when the connection is returned.
+    """
+    conn.autocommit = False
+    cursor = conn.cursor(name=f'export_{procedure}')
+    cursor.itersize = itersize
+    try:
+        cursor.execute(sql.SQL('SELECT * FROM {}()').format(sql.Identifier(procedure)))
+        columns = None
+        while True:
+            rows = cursor.fetchmany(itersize)
+            if columns is None:
+                columns = [column.name for column in cursor.description]
+            if not rows:
+                if columns is not None:
+                    yield columns, []
+                break
+            yield columns, rows
+    finally:
+        cursor.close()
+        conn.rollback()
+
+
+def aiter_batches(conn, procedure, itersize):
+    """asyncpg version of ``iter_batches``; the caller must hold a transaction"""
+    query = 'SELECT * FROM "{}"()'.format(procedure.replace('"', '""'))
+
+    async def batches():
+        statement = await conn.prepare(query)
+        columns = [attribute.name for attribute in statement.get_attributes()]
+        cursor = await statement.cursor()
+        while True:
+            rows = await cursor.fetch(itersize)
+            yield columns, rows
+            if not rows:
+                break
+
+    return batches()
+
+
+def _ndjson_batch(columns, rows):
+    return ''.join(
+        json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + '\n'
+        for row in rows
+    )
+
+
+def _csv_batch(columns, rows, with_header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if with_header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([
+            json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+            for value in row
+        ])
+    return buffer.getvalue()
+
+
+def ndjson_chunks(batches):
+    """Encode batches as newline-delimited JSON, one chunk per batch"""
+    for columns, rows in batches:
+        if rows:
+            yield _ndjson_batch(columns, rows)
+
+
+def csv_chunks(batches):
+    """Encode batches as CSV with a header row, one chunk per batch"""
+    header_written = False
+    for columns, rows in batches:
+        chunk = _csv_batch(columns, rows, not header_written)
+        header_written = True
+        if chunk:
+            yield chunk
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of text chunks into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def andjson_chunks(batches):
+    async for columns, rows in batches:
+        if rows:
+            yield _ndjson_batch(columns, rows)
+
+
+async def acsv_chunks(batches):
+    header_written = False
+    async for columns, rows in batches:
+        chunk = _csv_batch(columns, rows, not header_written)
+        header_written = True
+        if chunk:
+            yield chunk
+
+
+async def agzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,95 @@
+"""Production launcher for server.py: gunicorn -c gunicorn.conf.py
+
+Pre-forks WEB_CONCURRENCY worker processes (default: CPU count) from a master
+that has already imported the app, so workers share its memory pages and a
+broken import fails before any worker starts. Each worker serves
+GUNICORN_THREADS requests concurrently and gets its own connection pool sized
+from the overall database budget, plus one LISTEN connection that keeps its
+in-process caches coherent with the other workers.
+
+Signals to the master process:
+  HUP   start fresh workers, then drain and stop the old ones
+  TERM  graceful shutdown: stop accepting, finish in-flight requests
+        within graceful_timeout, close pools
+  TTIN / TTOU  add / remove one worker
+"""
+
+import multiprocessing
+import os
+
+wsgi_app = 'server:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:%s' % os.environ.get('PORT', '5000'))
+
+# Import the app once in the master. The master must not touch the database:
+# connections and the NOTIFY listener thread are created lazily in workers.
+preload_app = True
+
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Password hashing is CPU-bound: split the cores between workers instead of
+# giving every worker a thread per core. Set before the preloaded app reads it.
+os.environ.setdefault('PASSWORD_HASH_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+
+# Recycle workers to bound memory growth; jitter keeps them from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+
+# Draining: in-flight requests get graceful_timeout seconds after HUP/TERM
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+
+
+# Connections each worker holds outside its pool: the cache invalidation listener
+LISTENER_CONNECTIONS = 1
+
+
+def worker_pool_size():
+    """Per-worker (min, max) pool size.
+
+    DB_POOL_MAX_TOTAL splits a total connection budget across workers, after
+    reserving each worker's listener connection; otherwise DB_POOL_MAX applies
+    per worker, defaulting to one connection per worker thread.
+    """
+    total = os.environ.get('DB_POOL_MAX_TOTAL')
+    if total:
+        maxconn = max(1, int(total) // workers - LISTENER_CONNECTIONS)
+    else:
+        maxconn = int(os.environ.get('DB_POOL_MAX', threads))
+    minconn = min(int(os.environ.get('DB_POOL_MIN', 1)), maxconn)
+    return minconn, maxconn
+
+
+def post_fork(server, worker):
+    from server import db_pool, replica_pool
+
+    minconn, maxconn = worker_pool_size()
+    db_pool.resize(minconn, maxconn)
+    if replica_pool is not None:
+        replica_pool.resize(minconn, maxconn)
+    server.log.info('Worker %s: database pool min=%s max=%s', worker.pid, minconn, maxconn)
+
+
+def post_worker_init(worker):
+    from server import db_pool, replica_pool
+
+    for pool in (db_pool, replica_pool):
+        if pool is None:
+            continue
+        try:
+            pool.warm()
+        except Exception as e:
+            # Not fatal: the pool opens connections on demand
+            worker.log.warning('Worker %s: could not warm database pool: %s', worker.pid, e)
+
+
+def worker_exit(server, worker):
+    from server import db_pool, replica_pool
+
+    db_pool.closeall()
+    if replica_pool is not None:
+        replica_pool.closeall()
@@ -0,0 +1,148 @@
+"""Minimal Prometheus text-format metrics used by server.py
+
+Counters and histograms are kept in process memory; each observation takes
+one short lock. Pool and cache figures are read by callbacks only when
+``/api/metrics`` is scraped, so they cost nothing on the request path.
+
+Values are not aggregated across processes. Under gunicorn every worker has
+its own counters, pools and caches, and a scrape reaches whichever worker
+accepts it. A registry created with ``process_label`` therefore adds the
+worker's PID to every series, so each worker's counters stay separate
+series instead of one series jumping between workers (which reads as
+counter resets). Sum them in the query, e.g.
+``sum without (pid) (rate(http_requests_total[5m]))``. The PID is read at
+render time because the app is imported in the gunicorn master before the
+workers are forked.
+"""
+
+import bisect
+import os
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Request latencies in seconds, from sub-millisecond cache hits to slow exports
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, *extra):
+    pairs = ['%s="%s"' % (name, _escape(value)) for name, value in zip(names, values)]
+    pairs.extend(label for label in extra if label)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self, const=''):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in sorted(items):
+            yield self.name, _labels(self.labelnames, labels, const), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}   # labels -> [per-bucket counts (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self, const=''):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (self.name + '_bucket',
+                       _labels(self.labelnames, labels, const, 'le="%s"' % _number(bound)), cumulative)
+            yield self.name + '_sum', _labels(self.labelnames, labels, const), total
+            yield self.name + '_count', _labels(self.labelnames, labels, const), cumulative
+
+
+class CallbackMetric:
+    """Gauge or counter read at scrape time: ``collect()`` returns {label values: value}"""
+
+    def __init__(self, name, documentation, kind, labelnames, collect):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def samples(self, const=''):
+        for labels, value in sorted(self.collect().items()):
+            yield self.name, _labels(self.labelnames, labels, const), value
+
+
+class Registry:
+    """Ordered set of metrics rendered together in the text exposition format
+
+    ``process_label`` names a label carrying the current PID on every series.
+    """
+
+    def __init__(self, process_label=None):
+        self._metrics = []
+        self.process_label = process_label
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, kind, labelnames, collect):
+        return self.register(CallbackMetric(name, documentation, kind, labelnames, collect))
+
+    def render(self):
+        const = '%s="%d"' % (self.process_label, os.getpid()) if self.process_label else ''
+        lines = []
+        for metric in self._metrics:
+            lines.append('# HELP %s %s' % (metric.name, _escape(metric.documentation)))
+            lines.append('# TYPE %s %s' % (metric.name, metric.kind))
+            for name, labels, value in metric.samples(const):
+                lines.append('%s%s %s' % (name, labels, _number(value)))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Версионированные миграции схемы и проверка планов хранимых процедур.
+
+Миграции лежат в каталоге migrations/ в файлах NNNN_описание.sql и
+применяются по возрастанию номера; примененные версии записываются в
+таблицу schema_migrations вместе с контрольной суммой файла. Повторный
+запуск применяет только новые миграции, а сами шаги пишутся идемпотентно
+(IF NOT EXISTS), поэтому прерванную миграцию достаточно запустить снова.
+
+Миграция выполняется в одной транзакции, если первая строка файла не
+"-- migrate: no-transaction". Такие файлы выполняются по одному оператору
+в режиме autocommit, как того требует CREATE INDEX CONCURRENTLY; индекс,
+оставшийся невалидным после прерванного построения, перед повторным
+построением удаляется. Одновременный запуск нескольких экземпляров
+исключается рекомендательной блокировкой.
+
+Команда check-plans вызывает каждую хранимую процедуру на PL/pgSQL с
+подобранными по именам параметров аргументами в транзакции, которая затем
+откатывается, и через auto_explain получает планы всех запросов внутри
+процедур. Последовательное сканирование таблицы, в которой по статистике
+не меньше --min-rows строк, считается проблемой (код завершения 1).
+Запускать на заполненной БД (benchmarks/generate_data.py) под
+суперпользователем: LOAD 'auto_explain' требует этих прав.
+
+Пример:
+    python migrate.py                  # применить новые миграции
+    python migrate.py status           # состояние миграций
+    python migrate.py check-plans --min-rows 10000
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+from collections import deque
+from datetime import date
+
+import psycopg2
+from psycopg2 import sql
+
+from sql_trace import explained_plans
+
+DB_CONFIG = {
+    'host': os.environ.get('DB_HOST', 'localhost'),
+    'database': os.environ.get('DB_NAME', 'music_library'),
+    'user': os.environ.get('DB_USER', 'postgres'),
+    'password': os.environ.get('DB_PASSWORD', 'password')
+}
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.sql$')
+NO_TRANSACTION = '-- migrate: no-transaction'
+CONCURRENT_INDEX = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)', re.IGNORECASE)
+LINE_COMMENT = re.compile(r'--[^\n]*')
+
+# Ключ рекомендательной блокировки, под которой применяются миграции
+MIGRATION_LOCK_KEY = 1907001
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INTEGER
+    )
+"""
+
+# Процедуры, которые по назначению читают таблицы целиком (выгрузки и полные списки)
+FULL_SCAN_PROCEDURES = frozenset(('export_tracks', 'export_audit_log', 'get_all_tracks_admin', 'get_audit_log'))
+
+AUTO_EXPLAIN_SETTINGS = (
+    ('auto_explain.log_min_duration', '0'),
+    ('auto_explain.log_nested_statements', 'on'),
+    ('auto_explain.log_level', 'notice'),
+    ('auto_explain.log_format', 'json'),
+    ('client_min_messages', 'notice'),
+)
+
+# Значения параметров, общие для всех процедур; идентификаторы берутся из БД
+CONSTANT_ARGUMENTS = {
+    'p_password': 'bench',
+    'p_password_hash': 'pbkdf2:sha256:600000$plan$check',
+    'p_name': 'Plan check',
+    'p_is_admin': True,
+    'p_is_favorite': False,
+    'p_is_active': True,
+    'p_limit': 50,
+    'p_offset': 0,
+    'p_bpm': 120,
+    'p_bpm_min': 110,
+    'p_bpm_max': 130,
+    'p_months_ahead': 0,
+    'p_since': 0,
+    'p_retention': '90 days',
+}
+
+# Подготовка перед вызовом процедур, которые читают временные таблицы сервера
+PROCEDURE_SETUP = {
+    'import_tracks_from_staging': """
+        CREATE TEMP TABLE track_import_staging (
+            line_no INTEGER,
+            title VARCHAR(255),
+            artist_name VARCHAR(100),
+            genre_name VARCHAR(100),
+            bpm INTEGER,
+            duration_sec INTEGER
+        ) ON COMMIT DROP;
+        INSERT INTO track_import_staging
+        SELECT 1, 'Plan check', a.name, g.name, 120, 200
+        FROM artists a, genres g
+        WHERE a.artist_id = %(artist_id)s AND g.genre_id = %(genre_id)s
+    """,
+}
+
+SAMPLE_QUERY = """
+    SELECT c.collection_id, c.user_id, u.login, t.track_id, t.title, t.artist_id, t.genre_id,
+           ARRAY(SELECT track_id FROM collection_tracks
+                 WHERE collection_id = c.collection_id ORDER BY track_id LIMIT 5) AS track_ids
+    FROM collections c
+    JOIN collection_tracks ct ON ct.collection_id = c.collection_id
+    JOIN tracks t ON t.track_id = ct.track_id
+    JOIN "user" u ON u.user_id = c.user_id
+    ORDER BY c.collection_id DESC
+    LIMIT 1
+"""
+
+PROCEDURES_QUERY = """
+    SELECT p.proname, p.pronargs, p.proargnames, p.proargtypes::regtype[]::text[]
+    FROM pg_proc p
+    JOIN pg_language l ON l.oid = p.prolang
+    WHERE p.pronamespace = 'public'::regnamespace
+      AND l.lanname = 'plpgsql'
+      AND p.prokind = 'f'
+      AND p.prorettype <> 'trigger'::regtype
+    ORDER BY p.proname
+"""
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        with open(path, encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+        self.transactional = not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+    @property
+    def label(self):
+        return f'{self.version:04d}_{self.name}'
+
+
+def load_migrations():
+    """Миграции из MIGRATIONS_DIR по возрастанию версии"""
+    migrations = {}
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise SystemExit(f"✗ Две миграции с версией {version}: {migrations[version].label}, {filename}")
+        migrations[version] = Migration(version, match.group(2), os.path.join(MIGRATIONS_DIR, filename))
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(text):
+    """Операторы миграции без транзакции (без тел функций и ';' внутри строк)"""
+    text = LINE_COMMENT.sub('', text)
+    return [statement.strip() for statement in text.split(';') if statement.strip()]
+
+
+def applied_migrations(cursor):
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute('SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version')
+    return {row[0]: row for row in cursor.fetchall()}
+
+
+def drop_invalid_index(cursor, name):
+    """Удалить индекс, оставшийся невалидным после прерванного CREATE INDEX CONCURRENTLY"""
+    cursor.execute("""
+        SELECT 1 FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s AND c.relnamespace = current_schema()::regnamespace AND NOT i.indisvalid
+    """, (name,))
+    if cursor.fetchone():
+        print(f"  удаление невалидного индекса {name}")
+        cursor.execute(sql.SQL('DROP INDEX CONCURRENTLY IF EXISTS {}').format(sql.Identifier(name)))
+
+
+def apply_migration(conn, migration):
+    started = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        if migration.transactional:
+            conn.autocommit = False
+            try:
+                cursor.execute(migration.sql)
+                record_migration(cursor, migration, started)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+        else:
+            for statement in split_statements(migration.sql):
+                match = CONCURRENT_INDEX.search(statement)
+                if match:
+                    drop_invalid_index(cursor, match.group(1))
+                cursor.execute(statement)
+            record_migration(cursor, migration, started)
+    finally:
+        cursor.close()
+    return time.perf_counter() - started
+
+
+def record_migration(cursor, migration, started):
+    cursor.execute("""
+        INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+        VALUES (%s, %s, %s, %s)
+    """, (migration.version, migration.name, migration.checksum,
+          round((time.perf_counter() - started) * 1000)))
+
+
+def migrate(conn):
+    migrations = load_migrations()
+    cursor = conn.cursor()
+    cursor.execute('SELECT pg_advisory_lock(%s)', (MIGRATION_LOCK_KEY,))
+    try:
+        applied = applied_migrations(cursor)
+        for migration in migrations:
+            row = applied.get(migration.version)
+            if row is not None and row[2] != migration.checksum:
+                print(f"⚠ Миграция {migration.label} изменена после применения")
+
+        pending = [migration for migration in migrations if migration.version not in applied]
+        if not pending:
+            print(f"✓ Схема актуальна, версия {max(applied, default=0):04d}")
+            return
+        for migration in pending:
+            print(f"Применение {migration.label}...")
+            elapsed = apply_migration(conn, migration)
+            print(f"  ✓ за {elapsed:.1f} с")
+        print(f"✓ Применено миграций: {len(pending)}")
+    finally:
+        cursor.execute('SELECT pg_advisory_unlock(%s)', (MIGRATION_LOCK_KEY,))
+        cursor.close()
+
+
+def status(conn):
+    migrations = load_migrations()
+    cursor = conn.cursor()
+    applied = applied_migrations(cursor)
+    cursor.close()
+    for migration in migrations:
+        row = applied.get(migration.version)
+        if row is None:
+            state = 'ожидает применения'
+        elif row[2] != migration.checksum:
+            state = f'применена {row[3]:%Y-%m-%d %H:%M}, файл изменен'
+        else:
+            state = f'применена {row[3]:%Y-%m-%d %H:%M}'
+        print(f"  {migration.label:<40} {state}")
+    known = {migration.version for migration in migrations}
+    for version, row in applied.items():
+        if version not in known:
+            print(f"  {version:04d}_{row[1]:<35} применена, файла нет")
+
+
+def procedure_arguments(names, types, sample):
+    """Аргументы вызова процедуры, подобранные по именам параметров"""
+    by_name = dict(CONSTANT_ARGUMENTS, **{
+        'p_user_id': sample['user_id'],
+        'p_login': sample['login'],
+        'p_collection_id': sample['collection_id'],
+        'p_track_id': sample['track_id'],
+        'p_artist_id': sample['artist_id'],
+        'p_genre_id': sample['genre_id'],
+        'p_track_ids': sample['track_ids'],
+        'p_artist_ids': [sample['artist_id']],
+        'p_genre_ids': [sample['genre_id']],
+        # Название существующего трека: поиск должен использовать индекс, а не читать все
+        'p_title': sample['title'],
+        'p_month': date.today(),
+    })
+    return [by_name.get(name) for name in names[:len(types)]]
+
+
+def seq_scans(plan):
+    """Узлы Seq Scan в плане (рекурсивно)"""
+    if plan.get('Node Type') == 'Seq Scan':
+        yield plan
+    for child in plan.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+def check_plans(conn, min_rows):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("LOAD 'auto_explain'")
+    except psycopg2.Error as e:
+        print(f"✗ Не удалось загрузить auto_explain (нужны модуль auto_explain и права "
+              f"суперпользователя): {str(e).strip()}")
+        return 2
+    for setting, value in AUTO_EXPLAIN_SETTINGS:
+        cursor.execute('SELECT set_config(%s, %s, false)', (setting, value))
+
+    cursor.execute("""
+        SELECT relname, reltuples FROM pg_class
+        WHERE relnamespace = 'public'::regnamespace AND relkind = 'r'
+    """)
+    table_rows = dict(cursor.fetchall())
+
+    cursor.execute(SAMPLE_QUERY)
+    row = cursor.fetchone()
+    if row is None:
+        print("✗ В БД нет коллекций с треками; заполните ее (benchmarks/generate_data.py)")
+        return 2
+    sample = dict(zip([column.name for column in cursor.description], row))
+
+    cursor.execute(PROCEDURES_QUERY)
+    procedures = cursor.fetchall()
+    conn.notices = deque()
+
+    problems = 0
+    conn.autocommit = False
+    try:
+        for name, nargs, arg_names, arg_types in procedures:
+            args = procedure_arguments(arg_names or [], arg_types, sample)
+            query = sql.SQL('SELECT * FROM {}({})').format(
+                sql.Identifier(name), sql.SQL(', ').join(sql.Placeholder() * nargs))
+            cursor.execute('SAVEPOINT plan_check')
+            conn.notices.clear()
+            error = None
+            try:
+                if name in PROCEDURE_SETUP:
+                    cursor.execute(PROCEDURE_SETUP[name], sample)
+                cursor.execute(query, args)
+            except psycopg2.Error as e:
+                error = (e.pgerror or str(e)).strip().splitlines()[0]
+            cursor.execute('ROLLBACK TO SAVEPOINT plan_check')
+
+            flagged = []
+            for plan in explained_plans(list(conn.notices)):
+                for node in seq_scans(plan['Plan']):
+                    rows = table_rows.get(node.get('Relation Name'), 0)
+                    if rows >= min_rows:
+                        flagged.append((node['Relation Name'], rows, plan.get('Query Text', '')))
+
+            if error is not None:
+                print(f"⚠ {name}: вызов завершился ошибкой: {error}")
+            if not flagged:
+                if error is None:
+                    print(f"✓ {name}")
+            elif name in FULL_SCAN_PROCEDURES:
+                tables = ', '.join(sorted({table for table, _, _ in flagged}))
+                print(f"· {name}: полное чтение ({tables}) по назначению")
+            else:
+                problems += 1
+                print(f"✗ {name}:")
+                for table, rows, text in flagged:
+                    text = ' '.join(text.split())
+                    print(f"    Seq Scan по {table} (~{rows:,.0f} строк): {text[:160]}")
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+        cursor.close()
+
+    if problems:
+        print(f"✗ Последовательное сканирование больших таблиц в {problems} процедурах")
+        return 1
+    print(f"✓ Последовательных сканирований таблиц от {min_rows:,} строк нет")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', default='up', choices=('up', 'status', 'check-plans'),
+                        help='up — применить миграции (по умолчанию), status — состояние, '
+                             'check-plans — проверить планы процедур')
+    parser.add_argument('--min-rows', type=int, default=10000,
+                        help='check-plans: таблицы от этого числа строк считаются большими')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DB_CONFIG)
+    conn.autocommit = True
+    try:
+        if args.command == 'up':
+            migrate(conn)
+        elif args.command == 'status':
+            status(conn)
+        else:
+            sys.exit(check_plans(conn, args.min_rows))
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
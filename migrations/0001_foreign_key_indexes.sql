@@ -0,0 +1,20 @@
+-- migrate: no-transaction
+-- Индексы по внешним ключам. Строятся с CONCURRENTLY, чтобы не блокировать
+-- запись в таблицы, поэтому миграция выполняется вне транзакции.
+-- tracks(user_id) уже покрыт idx_tracks_user_created (user_id — первый столбец).
+
+-- delete_artist() считает треки исполнителя; проверка внешнего ключа при удалении исполнителя
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_artist ON tracks (artist_id);
+
+-- Поиск по жанру; проверка внешнего ключа при удалении жанра
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_genre ON tracks (genre_id);
+
+-- get_user_collections(): фильтр по владельцу и сортировка по is_favorite DESC, name
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_collections_user ON collections (user_id, is_favorite DESC, name);
+
+-- Каскадное удаление трека из всех коллекций (ON DELETE CASCADE)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_collection_tracks_track ON collection_tracks (track_id);
+
+-- Каскадное удаление жанра и исполнителя из избранного
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_favorite_genres_genre ON user_favorite_genres (genre_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_user_favorite_artists_artist ON user_favorite_artists (artist_id);
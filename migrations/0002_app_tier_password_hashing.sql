@@ -0,0 +1,118 @@
+-- Проверка паролей на сервере приложения (хэши werkzeug) вместо authenticate_user():
+-- БД только возвращает хэш по логину, проверяет пароли старого формата
+-- (pgp_sym_encrypt) и заменяет их хэшем при первом входе.
+-- register_user() принимает готовый хэш: имя параметра меняется, поэтому функция
+-- пересоздается (в одной транзакции с остальными шагами).
+-- Существующие пароли не меняются: это делает сервер при входе.
+
+-- Процедура получения учетных данных для входа: один поиск по уникальному индексу login.
+-- Пароль проверяет сервер (хэш werkzeug в пуле потоков), а не БД;
+-- пароли старого формата (pgp_sym_encrypt) проверяет check_legacy_password()
+DROP FUNCTION IF EXISTS authenticate_user(VARCHAR, VARCHAR);
+
+CREATE OR REPLACE FUNCTION get_login_credentials(p_login VARCHAR(50))
+RETURNS TABLE(
+    user_id INTEGER,
+    login VARCHAR(50),
+    password_hash TEXT,
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    email VARCHAR(100),
+    avatar_url TEXT,
+    is_admin BOOLEAN
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT u.user_id, u.login, u.password_hash, u.first_name, u.last_name,
+           u.email, u.avatar_url, u.is_admin
+    FROM "user" u
+    WHERE u.login = p_login AND u.is_active = true;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Проверка пароля, сохраненного через pgp_sym_encrypt (до перехода на хэши werkzeug).
+-- Вызывается только при первом входе такого пользователя, после чего сервер
+-- заменяет значение хэшем через update_password_hash()
+CREATE OR REPLACE FUNCTION check_legacy_password(p_user_id INTEGER, p_password VARCHAR(255))
+RETURNS TABLE(success BOOLEAN) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT COALESCE(pgp_sym_decrypt(u.password_hash::bytea, 'music_library_key') = p_password, false)
+    FROM "user" u
+    WHERE u.user_id = p_user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Замена хэша пароля; не выполняется, если хэш изменился после p_old_hash
+CREATE OR REPLACE FUNCTION update_password_hash(p_user_id INTEGER, p_old_hash TEXT, p_new_hash TEXT)
+RETURNS TABLE(success BOOLEAN) AS $$
+BEGIN
+    UPDATE "user"
+    SET password_hash = p_new_hash
+    WHERE user_id = p_user_id AND password_hash = p_old_hash;
+    
+    RETURN QUERY SELECT FOUND;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура регистрации пользователя; p_password_hash - хэш werkzeug, вычисленный сервером
+DROP FUNCTION IF EXISTS register_user(VARCHAR, VARCHAR, VARCHAR, VARCHAR, VARCHAR);
+
+CREATE OR REPLACE FUNCTION register_user(
+    p_login VARCHAR(50),
+    p_password_hash VARCHAR(255),
+    p_first_name VARCHAR(100),
+    p_last_name VARCHAR(100),
+    p_email VARCHAR(100)
+)
+RETURNS TABLE(
+    success BOOLEAN,
+    user_id INTEGER,
+    login VARCHAR(50),
+    first_name VARCHAR(100),
+    last_name VARCHAR(100),
+    email VARCHAR(100),
+    avatar_url TEXT,
+    is_admin BOOLEAN
+) AS $$
+DECLARE
+    new_user_id INTEGER;
+BEGIN
+    INSERT INTO "user" (login, password_hash, first_name, last_name, email, is_admin)
+    VALUES (p_login, p_password_hash, p_first_name, p_last_name, p_email, false)
+    RETURNING "user".user_id INTO new_user_id;
+    
+    IF new_user_id IS NOT NULL THEN
+        RETURN QUERY SELECT 
+            true::BOOLEAN AS success,
+            new_user_id,
+            p_login,
+            p_first_name,
+            p_last_name,
+            p_email,
+            NULL::TEXT,
+            false::BOOLEAN;
+    ELSE
+        RETURN QUERY SELECT 
+            false::BOOLEAN AS success,
+            NULL::INTEGER,
+            NULL::VARCHAR(50),
+            NULL::VARCHAR(100),
+            NULL::VARCHAR(100),
+            NULL::VARCHAR(100),
+            NULL::TEXT,
+            NULL::BOOLEAN;
+    END IF;
+EXCEPTION
+    WHEN unique_violation THEN
+        RETURN QUERY SELECT 
+            false::BOOLEAN AS success,
+            NULL::INTEGER,
+            NULL::VARCHAR(50),
+            NULL::VARCHAR(100),
+            NULL::VARCHAR(100),
+            NULL::VARCHAR(100),
+            NULL::TEXT,
+            NULL::BOOLEAN;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,96 @@
+-- Страницы списков одним документом JSON. Функции *_json вызывают
+-- постраничные процедуры с p_limit + 1 и возвращают items - готовый массив
+-- JSON из p_limit строк (ключи по алфавиту, даты в формате HTTP, как в
+-- ответах API), который сервер приложения передает клиенту без разбора, и
+-- ключ следующей страницы (NULL - страница последняя). items имеет тип TEXT,
+-- чтобы драйверы не декодировали JSON.
+
+-- Дата в формате HTTP (RFC 7231), как ее выводит JSON-сериализатор Flask
+CREATE OR REPLACE FUNCTION api_timestamp(p_value TIMESTAMP)
+RETURNS TEXT AS $$
+    SELECT to_char(p_value, 'Dy, DD Mon YYYY HH24:MI:SS "GMT"');
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_user_tracks_page_json(
+    p_user_id INTEGER,
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(items TEXT, next_created_at TIMESTAMP, next_track_id INTEGER) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           CASE WHEN count(*) > p_limit THEN max(p.created_at) FILTER (WHERE p.ordinality = p_limit) END,
+           CASE WHEN count(*) > p_limit THEN max(p.track_id) FILTER (WHERE p.ordinality = p_limit) END
+    FROM get_user_tracks_page(p_user_id, p_after_created_at, p_after_track_id, p_limit + 1) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.artist_name, p.bpm, api_timestamp(p.created_at) AS created_at, p.duration_sec,
+               p.genre_name, p.title, p.track_id
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_all_tracks_admin_page_json(
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(items TEXT, next_created_at TIMESTAMP, next_track_id INTEGER) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           CASE WHEN count(*) > p_limit THEN max(p.created_at) FILTER (WHERE p.ordinality = p_limit) END,
+           CASE WHEN count(*) > p_limit THEN max(p.track_id) FILTER (WHERE p.ordinality = p_limit) END
+    FROM get_all_tracks_admin_page(p_after_created_at, p_after_track_id, p_limit + 1) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.artist_name, p.bpm, api_timestamp(p.created_at) AS created_at, p.duration_sec,
+               p.genre_name, p.title, p.track_id, p.user_login
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+-- has_more - есть ли результаты после p_offset + p_limit
+CREATE OR REPLACE FUNCTION search_tracks_ranked_json(
+    p_title VARCHAR(255),
+    p_artist VARCHAR(100),
+    p_genre_id INTEGER,
+    p_bpm_min INTEGER,
+    p_bpm_max INTEGER,
+    p_duration_min INTEGER,
+    p_duration_max INTEGER,
+    p_user_id INTEGER,
+    p_limit INTEGER,
+    p_offset INTEGER
+)
+RETURNS TABLE(items TEXT, has_more BOOLEAN) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           count(*) > p_limit
+    FROM search_tracks_ranked(p_title, p_artist, p_genre_id, p_bpm_min, p_bpm_max,
+                              p_duration_min, p_duration_max, p_user_id, p_limit + 1, p_offset) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.artist_name, p.bpm, api_timestamp(p.created_at) AS created_at, p.duration_sec,
+               p.genre_name, p.rank, p.title, p.track_id
+    ) r;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION get_audit_log_page_json(
+    p_from TIMESTAMP,
+    p_to TIMESTAMP,
+    p_table_name VARCHAR(50),
+    p_operation_type VARCHAR(20),
+    p_user_id INTEGER,
+    p_record_id INTEGER,
+    p_after_time TIMESTAMP,
+    p_after_log_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(items TEXT, next_operation_time TIMESTAMP, next_log_id INTEGER) AS $$
+    SELECT '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY p.ordinality)
+                               FILTER (WHERE p.ordinality <= p_limit), '') || ']',
+           CASE WHEN count(*) > p_limit THEN max(p.operation_time) FILTER (WHERE p.ordinality = p_limit) END,
+           CASE WHEN count(*) > p_limit THEN max(p.log_id) FILTER (WHERE p.ordinality = p_limit) END
+    FROM get_audit_log_page(p_from, p_to, p_table_name, p_operation_type, p_user_id, p_record_id,
+                            p_after_time, p_after_log_id, p_limit + 1) WITH ORDINALITY p
+    CROSS JOIN LATERAL (
+        SELECT p.details, p.log_id, api_timestamp(p.operation_time) AS operation_time, p.operation_type,
+               p.record_id, p.table_name, p.user_id, p.user_login
+    ) r;
+$$ LANGUAGE sql STABLE;
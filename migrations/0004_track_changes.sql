@@ -0,0 +1,194 @@
+-- Журнал изменений треков для синхронизации клиентов (GET /api/tracks/changes):
+-- таблицы track_changes и track_changes_horizon, триггеры, которые их заполняют,
+-- и процедуры get_track_changes / prune_track_changes.
+-- Изменения, сделанные до миграции, в журнале отсутствуют, поэтому граница
+-- удаленных меток ставится на текущую транзакцию: курсор, выданный раньше,
+-- не считается полным, и клиент загружает список заново.
+
+-- Журнал изменений треков для синхронизации клиентов (GET /api/tracks/changes).
+-- На каждый трек хранится одна строка с номером транзакции (txid_current())
+-- его последнего изменения; удаленный трек остается меткой (deleted = TRUE).
+-- Курсор клиента - xmin снимка, в котором он получил изменения: транзакции
+-- с меньшим номером к этому моменту уже завершены, поэтому следующий запрос
+-- изменений с номером >= курсора не пропустит записи, зафиксированные позже.
+CREATE TABLE IF NOT EXISTS track_changes (
+    track_id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    change_xid BIGINT NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    deleted BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE INDEX IF NOT EXISTS idx_track_changes_user ON track_changes (user_id, change_xid);
+-- Изменения всех треков (администратор)
+CREATE INDEX IF NOT EXISTS idx_track_changes_xid ON track_changes (change_xid);
+
+-- Граница удаленных меток (prune_track_changes): курсор меньше pruned_xid
+-- мог пропустить удаление, и клиент загружает список заново
+CREATE TABLE IF NOT EXISTS track_changes_horizon (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    pruned_xid BIGINT NOT NULL DEFAULT 0
+);
+-- Изменения до создания журнала в нем отсутствуют: граница - текущая транзакция
+INSERT INTO track_changes_horizon (pruned_xid) VALUES (txid_current()) ON CONFLICT DO NOTHING;
+
+-- Отметка измененных оператором треков (уровень оператора, по таблицам переходов)
+CREATE OR REPLACE FUNCTION record_track_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP = 'DELETE') THEN
+        INSERT INTO track_changes (track_id, user_id, change_xid, deleted)
+        SELECT o.track_id, o.user_id, txid_current(), TRUE
+        FROM old_rows o
+        ORDER BY o.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, change_xid = EXCLUDED.change_xid,
+            changed_at = EXCLUDED.changed_at, deleted = EXCLUDED.deleted;
+    ELSE
+        INSERT INTO track_changes (track_id, user_id, change_xid, deleted)
+        SELECT n.track_id, n.user_id, txid_current(), FALSE
+        FROM new_rows n
+        ORDER BY n.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET user_id = EXCLUDED.user_id, change_xid = EXCLUDED.change_xid,
+            changed_at = EXCLUDED.changed_at, deleted = EXCLUDED.deleted;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Переименование исполнителя или жанра меняет artist_name / genre_name в
+-- строках треков, поэтому их треки тоже отмечаются измененными
+CREATE OR REPLACE FUNCTION record_reference_track_changes()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_TABLE_NAME = 'artists') THEN
+        INSERT INTO track_changes (track_id, user_id, change_xid)
+        SELECT t.track_id, t.user_id, txid_current()
+        FROM new_rows n
+        JOIN old_rows o ON o.artist_id = n.artist_id
+        JOIN tracks t ON t.artist_id = n.artist_id
+        WHERE o.name IS DISTINCT FROM n.name
+        ORDER BY t.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET change_xid = EXCLUDED.change_xid, changed_at = EXCLUDED.changed_at;
+    ELSE
+        INSERT INTO track_changes (track_id, user_id, change_xid)
+        SELECT t.track_id, t.user_id, txid_current()
+        FROM new_rows n
+        JOIN old_rows o ON o.genre_id = n.genre_id
+        JOIN tracks t ON t.genre_id = n.genre_id
+        WHERE o.name IS DISTINCT FROM n.name
+        ORDER BY t.track_id
+        ON CONFLICT (track_id) DO UPDATE
+        SET change_xid = EXCLUDED.change_xid, changed_at = EXCLUDED.changed_at;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS track_changes_insert ON tracks;
+DROP TRIGGER IF EXISTS track_changes_update ON tracks;
+DROP TRIGGER IF EXISTS track_changes_delete ON tracks;
+DROP TRIGGER IF EXISTS artists_track_changes ON artists;
+DROP TRIGGER IF EXISTS genres_track_changes ON genres;
+
+CREATE TRIGGER track_changes_insert
+    AFTER INSERT ON tracks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_track_changes();
+
+CREATE TRIGGER track_changes_update
+    AFTER UPDATE ON tracks
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_track_changes();
+
+CREATE TRIGGER track_changes_delete
+    AFTER DELETE ON tracks
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_track_changes();
+
+CREATE TRIGGER artists_track_changes
+    AFTER UPDATE ON artists
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_reference_track_changes();
+
+CREATE TRIGGER genres_track_changes
+    AFTER UPDATE ON genres
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_reference_track_changes();
+
+-- Изменения треков после курсора p_since одним документом JSON: upserted -
+-- добавленные и измененные треки (поля как в get_user_tracks_page_json),
+-- deleted - ID удаленных. Курсор и изменения берутся из одного
+-- снимка (функция STABLE), поэтому курсор возвращается вместе с ними.
+-- reset = TRUE (без изменений), если курсора нет, он старше границы удаленных
+-- меток или изменений больше p_limit: клиенту дешевле загрузить список заново.
+-- p_user_id = NULL - треки всех пользователей (администратор).
+CREATE OR REPLACE FUNCTION get_track_changes(
+    p_user_id INTEGER,
+    p_since BIGINT,
+    p_limit INTEGER
+)
+RETURNS TABLE(sync_cursor BIGINT, reset BOOLEAN, upserted TEXT, deleted TEXT) AS $$
+DECLARE
+    v_cursor BIGINT := txid_snapshot_xmin(txid_current_snapshot());
+    v_changes INTEGER;
+BEGIN
+    IF p_since IS NOT NULL AND p_since >= (SELECT h.pruned_xid FROM track_changes_horizon h) THEN
+        SELECT count(*) INTO v_changes
+        FROM (
+            SELECT 1 FROM track_changes c
+            WHERE (p_user_id IS NULL OR c.user_id = p_user_id)
+              AND c.change_xid >= p_since
+            LIMIT p_limit + 1
+        ) s;
+    END IF;
+
+    IF v_changes IS NULL OR v_changes > p_limit THEN
+        RETURN QUERY SELECT v_cursor, TRUE, '[]'::TEXT, '[]'::TEXT;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    SELECT v_cursor, FALSE,
+           '[' || COALESCE(string_agg(row_to_json(r)::TEXT, ',' ORDER BY c.track_id)
+                               FILTER (WHERE t.track_id IS NOT NULL), '') || ']',
+           '[' || COALESCE(string_agg(c.track_id::TEXT, ',' ORDER BY c.track_id)
+                               FILTER (WHERE t.track_id IS NULL), '') || ']'
+    FROM track_changes c
+    LEFT JOIN tracks t ON t.track_id = c.track_id
+    LEFT JOIN artists a ON a.artist_id = t.artist_id
+    LEFT JOIN genres g ON g.genre_id = t.genre_id
+    CROSS JOIN LATERAL (
+        SELECT a.name AS artist_name, t.bpm, api_timestamp(t.created_at) AS created_at, t.duration_sec,
+               g.name AS genre_name, t.title, t.track_id
+    ) r
+    WHERE (p_user_id IS NULL OR c.user_id = p_user_id)
+      AND c.change_xid >= p_since;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Удаление меток удаленных треков старше p_retention. Курсоры, выданные до
+-- удаленных меток, становятся недействительными (reset в get_track_changes).
+-- Запускать периодически вместе с maintain_audit_log_partitions:
+--   SELECT prune_track_changes(INTERVAL '90 days');
+CREATE OR REPLACE FUNCTION prune_track_changes(p_retention INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_pruned_xid BIGINT;
+    v_count INTEGER;
+BEGIN
+    WITH pruned AS (
+        DELETE FROM track_changes
+        WHERE deleted AND changed_at < CURRENT_TIMESTAMP - p_retention
+        RETURNING change_xid
+    )
+    SELECT max(change_xid), count(*) INTO v_pruned_xid, v_count FROM pruned;
+
+    IF v_pruned_xid IS NOT NULL THEN
+        UPDATE track_changes_horizon SET pruned_xid = GREATEST(pruned_xid, v_pruned_xid + 1);
+    END IF;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
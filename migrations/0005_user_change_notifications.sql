@@ -0,0 +1,41 @@
+-- Уведомление серверов приложения об изменении пользователей (канал user_changed).
+-- Полезная нагрузка - user_id; серверы сбрасывают кэш этого пользователя во всех
+-- процессах (блокировка и смена роли действуют сразу). Изменение только хэша
+-- пароля или updated_at уведомления не вызывает. Если затронуто больше 100
+-- пользователей, отправляется '*' - сбросить кэш целиком.
+CREATE OR REPLACE FUNCTION notify_user_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_ids INTEGER[];
+BEGIN
+    IF (TG_OP = 'UPDATE') THEN
+        SELECT array_agg(n.user_id) INTO v_user_ids
+        FROM new_rows n
+        JOIN old_rows o ON o.user_id = n.user_id
+        WHERE (o.login, o.first_name, o.last_name, o.email, o.avatar_url, o.is_admin, o.is_active)
+              IS DISTINCT FROM
+              (n.login, n.first_name, n.last_name, n.email, n.avatar_url, n.is_admin, n.is_active);
+    ELSE
+        SELECT array_agg(o.user_id) INTO v_user_ids FROM old_rows o;
+    END IF;
+
+    IF cardinality(v_user_ids) > 100 THEN
+        PERFORM pg_notify('user_changed', '*');
+    ELSIF v_user_ids IS NOT NULL THEN
+        PERFORM pg_notify('user_changed', u::TEXT) FROM unnest(v_user_ids) u;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS user_notify_update ON "user";
+CREATE TRIGGER user_notify_update
+    AFTER UPDATE ON "user"
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_changed();
+
+DROP TRIGGER IF EXISTS user_notify_delete ON "user";
+CREATE TRIGGER user_notify_delete
+    AFTER DELETE ON "user"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_user_changed();
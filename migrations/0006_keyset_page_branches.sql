@@ -0,0 +1,88 @@
+-- Keyset-пагинация треков: первая и следующие страницы выполняются отдельными
+-- запросами. В общем (generic) плане условие "p_after_track_id IS NULL OR
+-- (created_at, track_id) < (...)" не может быть условием индекса, и глубокие
+-- страницы читали индекс с начала с фильтрацией.
+
+-- Процедура постраничного получения треков пользователя (keyset-пагинация)
+-- Курсор - пара (created_at, track_id) последнего трека предыдущей страницы.
+-- Первая и следующие страницы - отдельные запросы: у каждого свой кэшированный
+-- план, и условие по курсору остается условием индекса и в общем (generic) плане
+CREATE OR REPLACE FUNCTION get_user_tracks_page(
+    p_user_id INTEGER,
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    track_id INTEGER,
+    title VARCHAR(255),
+    artist_name VARCHAR(100),
+    genre_name VARCHAR(100),
+    bpm INTEGER,
+    duration_sec INTEGER,
+    created_at TIMESTAMP
+) AS $$
+BEGIN
+    IF p_after_track_id IS NULL THEN
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        WHERE t.user_id = p_user_id
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    ELSE
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        WHERE t.user_id = p_user_id
+          AND (t.created_at, t.track_id) < (p_after_created_at, p_after_track_id)
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура постраничного получения всех треков (для администраторов)
+CREATE OR REPLACE FUNCTION get_all_tracks_admin_page(
+    p_after_created_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    track_id INTEGER,
+    title VARCHAR(255),
+    artist_name VARCHAR(100),
+    genre_name VARCHAR(100),
+    bpm INTEGER,
+    duration_sec INTEGER,
+    created_at TIMESTAMP,
+    user_login VARCHAR(50)
+) AS $$
+BEGIN
+    IF p_after_track_id IS NULL THEN
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at, u.login
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        JOIN "user" u ON t.user_id = u.user_id
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    ELSE
+        RETURN QUERY
+        SELECT t.track_id, t.title, a.name, g.name, t.bpm, t.duration_sec, t.created_at, u.login
+        FROM tracks t
+        JOIN artists a ON t.artist_id = a.artist_id
+        JOIN genres g ON t.genre_id = g.genre_id
+        JOIN "user" u ON t.user_id = u.user_id
+        WHERE (t.created_at, t.track_id) < (p_after_created_at, p_after_track_id)
+        ORDER BY t.created_at DESC, t.track_id DESC
+        LIMIT p_limit;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
@@ -0,0 +1,160 @@
+-- Секционирование журнала аудита на существующей базе: несекционированная
+-- таблица audit_log заменяется секционированной с переносом строк, а
+-- create_audit_log_partition переносит строки месяца из секции по умолчанию
+-- перед созданием его секции. На базе, где журнал уже секционирован,
+-- заменяются только функции обслуживания.
+
+-- Журнал аудита из схемы до секционирования - обычная таблица. CREATE TABLE
+-- IF NOT EXISTS ее не заменит, поэтому она переименовывается в audit_log_legacy,
+-- а строки переносятся в секционированную таблицу ниже, после создания функций
+-- обслуживания секций. Имена первичного ключа, внешнего ключа, последовательности
+-- и индексов освобождаются для новой таблицы
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class
+               WHERE oid = to_regclass('audit_log') AND relkind = 'r') THEN
+        ALTER TABLE audit_log RENAME TO audit_log_legacy;
+        ALTER TABLE audit_log_legacy RENAME CONSTRAINT audit_log_pkey TO audit_log_legacy_pkey;
+        ALTER TABLE audit_log_legacy DROP CONSTRAINT IF EXISTS audit_log_user_id_fkey;
+        ALTER SEQUENCE IF EXISTS audit_log_log_id_seq RENAME TO audit_log_legacy_log_id_seq;
+        DROP INDEX IF EXISTS idx_audit_log_time;
+        DROP INDEX IF EXISTS idx_audit_log_record;
+        DROP INDEX IF EXISTS idx_audit_log_user;
+    END IF;
+END $$;
+
+-- Таблица аудита (секционирована по месяцам по operation_time)
+CREATE TABLE IF NOT EXISTS audit_log (
+    log_id SERIAL,
+    user_id INTEGER,
+    operation_type VARCHAR(20) NOT NULL, -- 'INSERT', 'UPDATE', 'DELETE'
+    table_name VARCHAR(50) NOT NULL,
+    record_id INTEGER,
+    operation_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    details JSONB,
+    PRIMARY KEY (log_id, operation_time),
+    FOREIGN KEY (user_id) REFERENCES "user"(user_id)
+) PARTITION BY RANGE (operation_time);
+
+-- Секция по умолчанию для записей вне созданных месячных секций
+CREATE TABLE IF NOT EXISTS audit_log_default PARTITION OF audit_log DEFAULT;
+
+-- Индексы журнала аудита (создаются в каждой секции). CREATE INDEX CONCURRENTLY
+-- для секционированной таблицы PostgreSQL не поддерживает, поэтому индексы
+-- строятся только на новой пустой таблице - до переноса строк ниже, без
+-- сканирования данных. Уже секционированный журнал получил их из database_schema.sql
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM audit_log) THEN
+        RETURN;
+    END IF;
+    -- Постраничный вывод и фильтр по времени: (operation_time, log_id) в порядке убывания
+    CREATE INDEX IF NOT EXISTS idx_audit_log_time ON audit_log (operation_time DESC, log_id DESC);
+    -- История конкретной записи
+    CREATE INDEX IF NOT EXISTS idx_audit_log_record ON audit_log (table_name, record_id);
+    -- Действия конкретного пользователя
+    CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log (user_id, operation_time DESC);
+END $$;
+
+-- Создание месячной секции журнала аудита.
+-- Если секция не была создана вовремя, строки этого месяца уже лежат в секции
+-- по умолчанию, и CREATE TABLE ... PARTITION OF завершился бы ошибкой. Поэтому
+-- секция создается отдельной таблицей, строки месяца переносятся в нее из
+-- audit_log_default, и только затем она присоединяется. Секция по умолчанию
+-- блокируется до конца транзакции, чтобы новые строки месяца не попали в нее
+-- между переносом и присоединением
+CREATE OR REPLACE FUNCTION create_audit_log_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_start DATE := date_trunc('month', p_month)::DATE;
+    v_end DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+    v_name TEXT := 'audit_log_' || to_char(p_month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+    
+    LOCK TABLE audit_log_default IN SHARE ROW EXCLUSIVE MODE;
+    EXECUTE format('CREATE TABLE %I (LIKE audit_log INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+    EXECUTE format('WITH moved AS (
+                        DELETE FROM audit_log_default
+                        WHERE operation_time >= %L AND operation_time < %L
+                        RETURNING *
+                    )
+                    INSERT INTO %I SELECT * FROM moved',
+                   v_start, v_end, v_name);
+    EXECUTE format('ALTER TABLE audit_log ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                   v_name, v_start, v_end);
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Обслуживание секций: создание секций на p_months_ahead месяцев вперед
+-- и удаление секций старше p_retention_months месяцев (NULL - хранить все).
+-- Запускать периодически, например раз в сутки:
+--   SELECT * FROM maintain_audit_log_partitions(3, 12);
+CREATE OR REPLACE FUNCTION maintain_audit_log_partitions(
+    p_months_ahead INTEGER,
+    p_retention_months INTEGER
+)
+RETURNS TABLE(action TEXT, partition_name TEXT) AS $$
+DECLARE
+    v_current DATE := date_trunc('month', CURRENT_DATE)::DATE;
+    v_partition RECORD;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        action := 'ensured';
+        partition_name := create_audit_log_partition((v_current + make_interval(months => i))::DATE);
+        RETURN NEXT;
+    END LOOP;
+    
+    IF p_retention_months IS NOT NULL THEN
+        FOR v_partition IN
+            SELECT c.relname
+            FROM pg_inherits inh
+            JOIN pg_class c ON c.oid = inh.inhrelid
+            WHERE inh.inhparent = 'audit_log'::regclass
+              AND c.relname ~ '^audit_log_[0-9]{4}_[0-9]{2}$'
+        LOOP
+            IF to_date(substring(v_partition.relname FROM 11), 'YYYY_MM')
+               < (v_current - make_interval(months => p_retention_months))::DATE THEN
+                EXECUTE format('DROP TABLE %I', v_partition.relname);
+                action := 'dropped';
+                partition_name := v_partition.relname;
+                RETURN NEXT;
+            END IF;
+        END LOOP;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT * FROM maintain_audit_log_partitions(3, NULL);
+
+-- Перенос строк журнала из несекционированной таблицы (см. переименование выше).
+-- Для каждого месяца со строками создается своя секция; log_id сохраняются,
+-- последовательность продолжает нумерацию. Строки без operation_time
+-- (в старой схеме столбец допускал NULL) получают время переноса
+DO $$
+DECLARE
+    v_month DATE;
+BEGIN
+    IF to_regclass('audit_log_legacy') IS NULL THEN
+        RETURN;
+    END IF;
+    
+    FOR v_month IN
+        SELECT DISTINCT date_trunc('month', COALESCE(operation_time, CURRENT_TIMESTAMP))::DATE
+        FROM audit_log_legacy
+    LOOP
+        PERFORM create_audit_log_partition(v_month);
+    END LOOP;
+    
+    INSERT INTO audit_log (log_id, user_id, operation_type, table_name, record_id, operation_time, details)
+    SELECT log_id, user_id, operation_type, table_name, record_id,
+           COALESCE(operation_time, CURRENT_TIMESTAMP), details
+    FROM audit_log_legacy;
+    
+    PERFORM setval(pg_get_serial_sequence('audit_log', 'log_id'),
+                   COALESCE((SELECT MAX(log_id) FROM audit_log), 0) + 1, false);
+    DROP TABLE audit_log_legacy;
+END $$;
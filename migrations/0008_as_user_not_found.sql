@@ -0,0 +1,248 @@
+-- Процедуры *_as_user больше не различают "нет такой строки" и "строка чужая":
+-- в обоих случаях возвращается not_found (HTTP 404), и по ответу нельзя узнать,
+-- существует ли чужой трек или коллекция. Пакетное добавление треков так же
+-- возвращает not_found для чужих треков, а пакетные процедуры - для чужой
+-- коллекции.
+
+-- Процедура обновления трека с проверкой прав.
+-- Проверка владельца и изменение выполняются одним UPDATE; статусы: ok, not_found.
+-- Чужой трек для не-администратора - тоже not_found: ответ не раскрывает,
+-- существует ли трек
+CREATE OR REPLACE FUNCTION update_track_as_user(
+    p_track_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN,
+    p_title VARCHAR(255),
+    p_artist_id INTEGER,
+    p_genre_id INTEGER,
+    p_bpm INTEGER,
+    p_duration_sec INTEGER
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    UPDATE tracks t
+    SET title = p_title,
+        artist_id = p_artist_id,
+        genre_id = p_genre_id,
+        bpm = p_bpm,
+        duration_sec = p_duration_sec
+    WHERE t.track_id = p_track_id AND (p_is_admin OR t.user_id = p_user_id);
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура удаления трека с проверкой прав; статусы: ok, not_found (в том числе чужой трек)
+CREATE OR REPLACE FUNCTION delete_track_as_user(
+    p_track_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    DELETE FROM tracks t
+    WHERE t.track_id = p_track_id AND (p_is_admin OR t.user_id = p_user_id);
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура обновления коллекции с проверкой прав.
+-- Коллекцию может изменить только ее владелец; статусы: ok, not_found
+-- (в том числе чужая коллекция)
+CREATE OR REPLACE FUNCTION update_collection_as_user(
+    p_collection_id INTEGER,
+    p_user_id INTEGER,
+    p_name VARCHAR(255),
+    p_is_favorite BOOLEAN
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    UPDATE collections c
+    SET name = p_name,
+        is_favorite = p_is_favorite
+    WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура удаления коллекции с проверкой прав; статусы: ok, not_found (в том числе чужая коллекция)
+CREATE OR REPLACE FUNCTION delete_collection_as_user(
+    p_collection_id INTEGER,
+    p_user_id INTEGER
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    DELETE FROM collections c
+    WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура добавления трека в коллекцию с проверкой прав.
+-- Коллекция должна принадлежать пользователю, трек - пользователю (или любой
+-- для администратора); проверка и вставка выполняются одним INSERT ... SELECT.
+-- Повторное добавление не считается ошибкой. Статусы: ok, not_found (коллекции
+-- или трека нет либо они чужие)
+CREATE OR REPLACE FUNCTION add_track_to_collection_as_user(
+    p_collection_id INTEGER,
+    p_track_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    INSERT INTO collection_tracks (collection_id, track_id)
+    SELECT c.collection_id, t.track_id
+    FROM collections c
+    JOIN tracks t ON t.track_id = p_track_id
+    WHERE c.collection_id = p_collection_id
+      AND c.user_id = p_user_id
+      AND (p_is_admin OR t.user_id = p_user_id)
+    ON CONFLICT DO NOTHING;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSIF EXISTS (
+        -- Вставки не было: трек уже в коллекции или коллекция/трек недоступны
+        SELECT 1 FROM collection_tracks ct
+        JOIN collections c ON c.collection_id = ct.collection_id
+        JOIN tracks t ON t.track_id = ct.track_id
+        WHERE ct.collection_id = p_collection_id
+          AND ct.track_id = p_track_id
+          AND c.user_id = p_user_id
+          AND (p_is_admin OR t.user_id = p_user_id)
+    ) THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20); -- Уже добавлено
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура удаления трека из коллекции с проверкой прав.
+-- Статусы: ok, not_found (коллекции нет, она чужая или трека в ней нет)
+CREATE OR REPLACE FUNCTION remove_track_from_collection_as_user(
+    p_collection_id INTEGER,
+    p_track_id INTEGER,
+    p_user_id INTEGER
+)
+RETURNS TABLE(status VARCHAR(20)) AS $$
+BEGIN
+    DELETE FROM collection_tracks ct
+    USING collections c
+    WHERE ct.collection_id = p_collection_id
+      AND ct.track_id = p_track_id
+      AND c.collection_id = ct.collection_id
+      AND c.user_id = p_user_id;
+    
+    IF FOUND THEN
+        RETURN QUERY SELECT 'ok'::VARCHAR(20);
+    ELSE
+        RETURN QUERY SELECT 'not_found'::VARCHAR(20);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура пакетного добавления треков в коллекцию.
+-- Коллекция должна принадлежать пользователю; треки - пользователю (или любые
+-- для администратора). Владение всеми треками проверяется одним запросом,
+-- вставка выполняется одним INSERT ... ON CONFLICT DO NOTHING.
+-- Статусы: added, already_present, not_found (трека нет или он чужой);
+-- строка с track_id = NULL и статусом not_found - коллекции нет или она чужая.
+CREATE OR REPLACE FUNCTION add_tracks_to_collection_batch(
+    p_collection_id INTEGER,
+    p_user_id INTEGER,
+    p_is_admin BOOLEAN,
+    p_track_ids INTEGER[]
+)
+RETURNS TABLE(track_id INTEGER, status VARCHAR(20)) AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM collections c
+        WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT NULL::INTEGER, 'not_found'::VARCHAR(20);
+        RETURN;
+    END IF;
+    
+    RETURN QUERY
+    WITH requested AS (
+        SELECT DISTINCT r.track_id FROM unnest(p_track_ids) AS r(track_id)
+    ),
+    existing AS (
+        SELECT t.track_id, (p_is_admin OR t.user_id = p_user_id) AS allowed
+        FROM tracks t
+        WHERE t.track_id = ANY(p_track_ids)
+    ),
+    inserted AS (
+        INSERT INTO collection_tracks (collection_id, track_id)
+        SELECT p_collection_id, e.track_id FROM existing e WHERE e.allowed
+        ON CONFLICT DO NOTHING
+        RETURNING collection_tracks.track_id
+    )
+    SELECT r.track_id,
+           (CASE
+               WHEN i.track_id IS NOT NULL THEN 'added'
+               WHEN e.track_id IS NULL OR NOT e.allowed THEN 'not_found'
+               ELSE 'already_present'
+           END)::VARCHAR(20)
+    FROM requested r
+    LEFT JOIN existing e ON e.track_id = r.track_id
+    LEFT JOIN inserted i ON i.track_id = r.track_id
+    ORDER BY r.track_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Процедура пакетного удаления треков из коллекции.
+-- Статусы: removed, not_in_collection; строка с track_id = NULL и статусом
+-- not_found - коллекции нет или она чужая.
+CREATE OR REPLACE FUNCTION remove_tracks_from_collection_batch(
+    p_collection_id INTEGER,
+    p_user_id INTEGER,
+    p_track_ids INTEGER[]
+)
+RETURNS TABLE(track_id INTEGER, status VARCHAR(20)) AS $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM collections c
+        WHERE c.collection_id = p_collection_id AND c.user_id = p_user_id
+    ) THEN
+        RETURN QUERY SELECT NULL::INTEGER, 'not_found'::VARCHAR(20);
+        RETURN;
+    END IF;
+    
+    RETURN QUERY
+    WITH requested AS (
+        SELECT DISTINCT r.track_id FROM unnest(p_track_ids) AS r(track_id)
+    ),
+    deleted AS (
+        DELETE FROM collection_tracks ct
+        WHERE ct.collection_id = p_collection_id AND ct.track_id = ANY(p_track_ids)
+        RETURNING ct.track_id
+    )
+    SELECT r.track_id,
+           (CASE WHEN d.track_id IS NOT NULL THEN 'removed' ELSE 'not_in_collection' END)::VARCHAR(20)
+    FROM requested r
+    LEFT JOIN deleted d ON d.track_id = r.track_id
+    ORDER BY r.track_id;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,77 @@
+-- get_collection_detail: даты коллекции и треков в JSON выводятся в формате HTTP
+-- (api_timestamp), как в остальных ответах API, а условие по курсору страницы
+-- добавляется динамически и остается условием индекса в общем плане.
+
+-- Процедура получения коллекции с треками одним запросом.
+-- Коллекция и страница ее треков (с именами исполнителей и жанров) собираются
+-- в один JSON через json_agg; треки упорядочены по (added_at, track_id).
+-- Даты в JSON - в формате HTTP (api_timestamp), как в остальных ответах API.
+-- next_added_at / next_track_id - ключ следующей страницы (NULL - страница последняя).
+-- Условие по курсору добавляется в запрос только для следующих страниц
+-- (динамический SQL), чтобы оно оставалось условием индекса
+-- idx_collection_tracks_order и в общем (generic) плане
+CREATE OR REPLACE FUNCTION get_collection_detail(
+    p_collection_id INTEGER,
+    p_after_added_at TIMESTAMP,
+    p_after_track_id INTEGER,
+    p_limit INTEGER
+)
+RETURNS TABLE(
+    owner_id INTEGER,
+    collection JSON,
+    next_added_at TIMESTAMP,
+    next_track_id INTEGER
+) AS $$
+DECLARE
+    v_sql TEXT;
+BEGIN
+    v_sql := 'WITH page AS (
+                  SELECT ct.track_id, t.title, a.name AS artist_name, g.name AS genre_name,
+                         t.bpm, t.duration_sec, ct.added_at,
+                         row_number() OVER (ORDER BY ct.added_at, ct.track_id) AS rn
+                  FROM collection_tracks ct
+                  JOIN tracks t ON t.track_id = ct.track_id
+                  JOIN artists a ON a.artist_id = t.artist_id
+                  JOIN genres g ON g.genre_id = t.genre_id
+                  WHERE ct.collection_id = $1';
+    IF p_after_track_id IS NOT NULL THEN
+        v_sql := v_sql || ' AND (ct.added_at, ct.track_id) > ($2, $3)';
+    END IF;
+    v_sql := v_sql || '
+                  ORDER BY ct.added_at, ct.track_id
+                  LIMIT $4 + 1
+              ),
+              last_row AS (
+                  SELECT p.added_at, p.track_id FROM page p
+                  WHERE p.rn = $4 AND EXISTS (SELECT 1 FROM page x WHERE x.rn > $4)
+              )
+              SELECT c.user_id,
+                     json_build_object(
+                         ''collection_id'', c.collection_id,
+                         ''name'', c.name,
+                         ''is_favorite'', c.is_favorite,
+                         ''created_at'', api_timestamp(c.created_at),
+                         ''tracks_count'', c.tracks_count,
+                         ''tracks'', COALESCE((
+                             SELECT json_agg(json_build_object(
+                                        ''track_id'', p.track_id,
+                                        ''title'', p.title,
+                                        ''artist_name'', p.artist_name,
+                                        ''genre_name'', p.genre_name,
+                                        ''bpm'', p.bpm,
+                                        ''duration_sec'', p.duration_sec,
+                                        ''added_at'', api_timestamp(p.added_at)
+                                    ) ORDER BY p.rn)
+                             FROM page p
+                             WHERE p.rn <= $4
+                         ), ''[]''::json)
+                     ),
+                     (SELECT l.added_at FROM last_row l),
+                     (SELECT l.track_id FROM last_row l)
+              FROM collections c
+              WHERE c.collection_id = $1';
+    
+    RETURN QUERY EXECUTE v_sql
+        USING p_collection_id, p_after_added_at, p_after_track_id, p_limit;
+END;
+$$ LANGUAGE plpgsql;
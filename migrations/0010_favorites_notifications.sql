@@ -0,0 +1,48 @@
+-- Кэш профилей на серверах приложения сбрасывается во всех процессах: изменение
+-- любимых жанров и исполнителей уведомляет по каналу user_changed.
+
+-- Избранное входит в кэшируемый профиль, поэтому его изменение тоже
+-- уведомляет серверы по каналу user_changed (полезная нагрузка - user_id)
+CREATE OR REPLACE FUNCTION notify_favorites_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_user_ids INTEGER[];
+BEGIN
+    IF (TG_OP = 'INSERT') THEN
+        SELECT array_agg(DISTINCT n.user_id) INTO v_user_ids FROM new_rows n;
+    ELSE
+        SELECT array_agg(DISTINCT o.user_id) INTO v_user_ids FROM old_rows o;
+    END IF;
+
+    IF cardinality(v_user_ids) > 100 THEN
+        PERFORM pg_notify('user_changed', '*');
+    ELSIF v_user_ids IS NOT NULL THEN
+        PERFORM pg_notify('user_changed', u::TEXT) FROM unnest(v_user_ids) u;
+    END IF;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS user_favorite_genres_notify_insert ON user_favorite_genres;
+CREATE TRIGGER user_favorite_genres_notify_insert
+    AFTER INSERT ON user_favorite_genres
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+DROP TRIGGER IF EXISTS user_favorite_genres_notify_delete ON user_favorite_genres;
+CREATE TRIGGER user_favorite_genres_notify_delete
+    AFTER DELETE ON user_favorite_genres
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+DROP TRIGGER IF EXISTS user_favorite_artists_notify_insert ON user_favorite_artists;
+CREATE TRIGGER user_favorite_artists_notify_insert
+    AFTER INSERT ON user_favorite_artists
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
+
+DROP TRIGGER IF EXISTS user_favorite_artists_notify_delete ON user_favorite_artists;
+CREATE TRIGGER user_favorite_artists_notify_delete
+    AFTER DELETE ON user_favorite_artists
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_favorites_changed();
@@ -0,0 +1,24 @@
+-- migrate: no-transaction
+-- Индексы постраничного вывода и поиска треков. Раньше их создавал
+-- database_schema.sql обычным CREATE INDEX, который при повторном запуске на
+-- существующей БД блокировал запись в таблицы на все время построения. Теперь
+-- они строятся только здесь, с CONCURRENTLY, поэтому миграция выполняется вне
+-- транзакции. Индексы, уже созданные прежней версией схемы, пропускаются.
+
+-- Операторный класс gin_trgm_ops для триграммных индексов
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Постраничный вывод треков пользователя и всех треков
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_user_created ON tracks (user_id, created_at DESC, track_id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_created ON tracks (created_at DESC, track_id DESC);
+
+-- Подстрочный поиск (ILIKE '%...%') и ранжирование по сходству
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_title_trgm ON tracks USING gin (title gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_artists_name_trgm ON artists USING gin (name gin_trgm_ops);
+
+-- Диапазоны BPM и длительности
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_bpm ON tracks (bpm);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_tracks_duration ON tracks (duration_sec);
+
+-- Порядок треков внутри коллекции для постраничного вывода
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_collection_tracks_order ON collection_tracks (collection_id, added_at, track_id);
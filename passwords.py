@@ -0,0 +1,88 @@
+"""Password hashing and verification off the request path, used by server.py and async_server.py"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Prefixes of werkzeug hashes; anything else in "user".password_hash is a
+# legacy pgp_sym_encrypt value that only the database can check
+HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many hash operations are already queued"""
+
+
+def is_legacy_hash(stored):
+    return not stored.startswith(HASH_PREFIXES)
+
+
+class PasswordHasher:
+    """Runs werkzeug hashing in a bounded thread pool.
+
+    At most ``workers`` hashes are computed at once (hashlib releases the
+    GIL, so they run in parallel with request threads), and at most
+    ``max_pending`` may be queued or running; beyond that submissions fail
+    fast with PasswordPoolBusy instead of piling up behind a login burst.
+    Threads are started on first use, i.e. after a pre-fork server forked.
+    """
+
+    def __init__(self, workers, max_pending, method='pbkdf2'):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.method = method
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordPoolBusy('Too many password checks in progress')
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+            if _future is not None:
+                self.completed += 1
+        self._slots.release()
+
+    def hash(self, password):
+        return self._submit(generate_password_hash, password, self.method).result()
+
+    def verify(self, stored, password):
+        return self._submit(check_password_hash, stored, password).result()
+
+    async def ahash(self, password):
+        return await asyncio.wrap_future(self._submit(generate_password_hash, password, self.method))
+
+    async def averify(self, stored, password):
+        return await asyncio.wrap_future(self._submit(check_password_hash, stored, password))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': self._pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+            }
@@ -1,14 +1,36 @@
-from flask import Flask, request, jsonify, session, render_template, send_from_directory
+from flask import Flask, request, jsonify, session, render_template, send_from_directory, g, Response, stream_with_context, has_app_context, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from werkzeug.security import generate_password_hash, check_password_hash
+import hmac
 import os
+import time
+import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import jwt
 from functools import wraps
 from flask_cors import CORS
 
+from cache import TTLCache, ReferenceDataCache, NotificationListener
+from db_pool import ConnectionPool, PoolTimeoutError
+from db_routing import ReadYourWrites, LSN_COOKIE, CURRENT_LSN_SQL, REPLAY_LSN_SQL, READ_METHODS, parse_lsn
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from sql_trace import QueryTracer
+from static_assets import StaticAssets
+from passwords import PasswordHasher, PasswordPoolBusy, is_legacy_hash
+from export_stream import iter_batches, ndjson_chunks, csv_chunks, gzip_chunks
+from bulk_import import CopySource, iter_records
+from api_helpers import (
+    page_limit, encode_cursor, decode_cursor, decode_offset_cursor, build_page, offset_page,
+    has_track_filters, track_filters, search_args, COLLECTION_BATCH_MAX, parse_track_ids,
+    batch_result, can_view_collection, int_param, mutation_result, parse_favorite_ids, user_payload,
+    JSON_PASSTHROUGH, build_json_page, offset_json_page,
+    TRACK_CHANGES_MAX, decode_sync_cursor, changes_body,
+    EXPORT_PROCEDURES, EXPORT_ITERSIZE
+)
+
 app = Flask(__name__, static_folder='client', template_folder='client')
 CORS(app)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
@@ -24,46 +46,312 @@ DB_CONFIG = {
     'password': os.environ.get('DB_PASSWORD', 'password')
 }
 
+# Connection pool configuration
+DB_POOL_CONFIG = {
+    'minconn': int(os.environ.get('DB_POOL_MIN', 1)),
+    'maxconn': int(os.environ.get('DB_POOL_MAX', 10)),
+    'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+    'validate_after': float(os.environ.get('DB_POOL_VALIDATE_AFTER', 30)),
+    'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+}
+
+# Optional streaming replica for read-only routes; unset DB_REPLICA_HOST keeps
+# every query on the primary
+DB_REPLICA_CONFIG = dict(DB_CONFIG, host=os.environ['DB_REPLICA_HOST']) if os.environ.get('DB_REPLICA_HOST') else None
+if DB_REPLICA_CONFIG and os.environ.get('DB_REPLICA_PORT'):
+    DB_REPLICA_CONFIG['port'] = int(os.environ['DB_REPLICA_PORT'])
+
+# Request metrics, served at /api/metrics. Each request's wall time is also
+# split into phases: auth (token check and principal lookup), db (pool
+# checkout and cursor calls outside auth) and serialize (JSON encoding).
+# Every series carries the worker's pid: gunicorn workers keep separate values.
+metrics = Registry(process_label='pid')
+http_requests = metrics.counter(
+    'http_requests_total', 'HTTP requests by route and status code', ('method', 'route', 'status'))
+http_request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Time until the view returned its response', ('method', 'route'))
+http_request_phase = metrics.histogram(
+    'http_request_phase_seconds', 'Request time spent in auth, database calls and JSON serialization',
+    ('route', 'phase'))
+http_request_queries = metrics.histogram(
+    'http_request_queries', 'SQL statements issued per request', ('route',),
+    buckets=(1, 2, 3, 5, 10, 20, 50, 100))
+REQUEST_PHASES = ('auth', 'db', 'serialize')
+
+def add_phase_time(phase, seconds):
+    """Attribute time to a phase of the current request; ignored outside requests"""
+    timings = g.get('phase_times') if has_app_context() else None
+    if timings is not None:
+        timings[phase] += seconds
+
+@contextmanager
+def auth_phase():
+    """Time a block as 'auth'; database calls made inside it are not counted as 'db'"""
+    timings = g.get('phase_times')
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    db_before = timings['db']
+    try:
+        yield
+    finally:
+        timings['db'] = db_before
+        timings['auth'] += time.perf_counter() - started
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that counts encoding time towards the 'serialize' phase"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            add_phase_time('serialize', time.perf_counter() - started)
+
+app.json = TimedJSONProvider(app)
+
+# SQL tracing: structured slow-query log (logger 'sql.slow'), per-request
+# statement counts and sampled EXPLAIN plans, listed at /api/admin/slow-queries.
+# SQL_TRACE=1 also logs every call (logger 'sql.trace').
+query_tracer = QueryTracer(
+    slow_ms=float(os.environ.get('SLOW_QUERY_MS', 200)),
+    query_count_warn=int(os.environ.get('QUERY_COUNT_WARN', 20)),
+    explain_procedures=[name for name in os.environ.get(
+        'EXPLAIN_PROCEDURES', 'search_tracks,search_tracks_ranked,get_all_tracks_admin,get_all_tracks_admin_page'
+    ).split(',') if name],
+    explain_sample_rate=float(os.environ.get('EXPLAIN_SAMPLE_RATE', 0)),
+    keep=int(os.environ.get('SLOW_QUERY_KEEP', 100))
+)
+if os.environ.get('SQL_TRACE') == '1':
+    logging.basicConfig(format='%(name)s %(message)s')
+    logging.getLogger('sql.trace').setLevel(logging.DEBUG)
+
+def request_route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+def trace_query(cursor, method, args, seconds, error):
+    """Pool callback: trace a statement and count it against the current request"""
+    if not has_request_context():
+        query_tracer.trace(cursor, method, args, seconds, error)
+        return
+    name = query_tracer.trace(cursor, method, args, seconds, error,
+                              {'route': request_route(), 'http_method': request.method})
+    queries = g.get('queries')
+    if queries is not None:
+        queries[name] = queries.get(name, 0) + 1
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.phase_times = dict.fromkeys(REQUEST_PHASES, 0.0)
+    g.queries = {}
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        route = request_route()
+        http_requests.inc((request.method, route, str(response.status_code)))
+        http_request_duration.observe((request.method, route), time.perf_counter() - started)
+        for phase, seconds in g.phase_times.items():
+            http_request_phase.observe((route, phase), seconds)
+        query_count = query_tracer.request_finished({'route': route, 'http_method': request.method}, g.queries)
+        http_request_queries.observe((route,), query_count)
+    return response
+
+db_pool = ConnectionPool(**DB_POOL_CONFIG, **DB_CONFIG,
+                         on_db_time=lambda seconds: add_phase_time('db', seconds),
+                         on_query=trace_query)
+
+replica_pool = ConnectionPool(**DB_POOL_CONFIG, **DB_REPLICA_CONFIG,
+                              on_db_time=lambda seconds: add_phase_time('db', seconds),
+                              on_query=trace_query) if DB_REPLICA_CONFIG else None
+
+# Read-your-writes: a user's reads stay on the primary until the replica has
+# replayed their last write (optionally waiting REPLICA_MAX_WAIT_MS for it)
+read_your_writes = ReadYourWrites(
+    ttl=float(os.environ.get('REPLICA_STICKY_SECONDS', 30)),
+    max_wait=float(os.environ.get('REPLICA_MAX_WAIT_MS', 0)) / 1000
+)
+
 def get_db_connection():
-    """Create a database connection"""
-    conn = psycopg2.connect(**DB_CONFIG)
+    """Get the pooled primary connection bound to the current request"""
+    if 'db_conn' not in g:
+        started = time.perf_counter()
+        g.db_conn = db_pool.getconn()
+        add_phase_time('db', time.perf_counter() - started)
+    return g.db_conn
+
+def checkout_replica():
+    """A replica connection that has replayed the user's last write, or None"""
+    required = read_your_writes.required_lsn(g.get('user_id'), request.cookies.get(LSN_COOKIE))
+    started = time.perf_counter()
+    try:
+        conn = replica_pool.getconn()
+    except (PoolTimeoutError, psycopg2.Error) as e:
+        add_phase_time('db', time.perf_counter() - started)
+        print(f"Replica unavailable: {str(e)}")
+        read_your_writes.count_read('primary_unavailable')
+        return None
+    add_phase_time('db', time.perf_counter() - started)
+    
+    def replay_lsn():
+        cursor = conn.cursor()
+        cursor.execute(REPLAY_LSN_SQL)
+        return cursor.fetchone()[0]
+    
+    try:
+        caught_up = required is None or read_your_writes.wait_for_replay(replay_lsn, required)
+    except psycopg2.Error as e:
+        replica_pool.putconn(conn)
+        print(f"Replica unavailable: {str(e)}")
+        read_your_writes.count_read('primary_unavailable')
+        return None
+    if not caught_up:
+        replica_pool.putconn(conn)
+        read_your_writes.count_read('primary_lag')
+        return None
+    read_your_writes.count_read('replica')
     return conn
 
+def get_read_connection():
+    """Connection for read-only handlers.
+
+    The replica when one is configured and has caught up with the user's
+    writes; otherwise (or if the request already holds a primary connection)
+    the request's primary connection.
+    """
+    if replica_pool is None or 'db_conn' in g:
+        return get_db_connection()
+    if 'replica_conn' not in g:
+        g.replica_conn = checkout_replica()
+    return g.replica_conn or get_db_connection()
+
+@app.after_request
+def record_write_position(response):
+    """After a successful mutation, remember the primary's WAL position for the user's reads"""
+    if replica_pool is None or request.method in READ_METHODS or 'db_conn' not in g \
+            or response.status_code >= 400:
+        return response
+    try:
+        cursor = g.db_conn.cursor()
+        cursor.execute(CURRENT_LSN_SQL)
+        lsn = cursor.fetchone()[0]
+    except psycopg2.Error as e:
+        print(f"Write position error: {str(e)}")
+        return response
+    read_your_writes.record_write(g.get('user_id'), parse_lsn(lsn))
+    response.set_cookie(LSN_COOKIE, lsn, max_age=int(read_your_writes.ttl), path='/api',
+                        httponly=True, samesite='Lax')
+    return response
+
+def release_request_connection():
+    """Return the request's connections to their pools.
+
+    Runs at teardown; a view may call it earlier to give the connections back
+    before slow work that needs no database.
+    """
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        db_pool.putconn(conn)
+    conn = g.pop('replica_conn', None)
+    if conn is not None:
+        replica_pool.putconn(conn)
+
+@app.teardown_appcontext
+def release_db_connection(exception):
+    release_request_connection()
+
+# Invalidation of in-process caches by changes made in any process: one
+# LISTEN connection per worker, see the notify_* triggers in database_schema.sql
+cache_listener = NotificationListener(lambda: psycopg2.connect(**DB_CONFIG))
+
+# Cache of authenticated users (user row incl. is_admin/is_active) keyed by user_id.
+# user_changed notifications carry a user_id, or '*' when many users changed
+USER_CHANGED_CHANNEL = 'user_changed'
+principal_cache = TTLCache(
+    maxsize=int(os.environ.get('PRINCIPAL_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+)
+
+def on_user_changed(cache):
+    def invalidate(payload):
+        if payload == '*':
+            cache.clear()
+        else:
+            cache.invalidate(int(payload))
+    return invalidate
+
+cache_listener.subscribe(USER_CHANGED_CHANNEL, on_user_changed(principal_cache), principal_cache.clear)
+
+def get_principal(user_id, fresh=False):
+    """Load an active user by id, served from principal_cache when warm.
+
+    The cache is used only while cache_listener is connected, so a user
+    blocked or demoted by another worker is not served from a stale entry;
+    ``fresh`` reads the row regardless (write requests).
+    """
+    cache_listener.start()
+    use_cache = cache_listener.connected
+    principal = principal_cache.get(user_id) if use_cache and not fresh else None
+    if principal is None:
+        version = principal_cache.version()
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor.execute("SELECT user_id, login, first_name, last_name, email, avatar_url, is_admin, is_active FROM \"user\" WHERE user_id = %s", (user_id,))
+        principal = cursor.fetchone()
+        cursor.close()
+        if principal is None:
+            return None
+        principal = dict(principal)
+        if use_cache:
+            principal_cache.set(user_id, principal, version)
+    if not principal['is_active']:
+        return None
+    return dict(principal)
+
+def invalidate_principal(user_id):
+    """Drop a cached user after their row has changed"""
+    principal_cache.invalidate(user_id)
+
+def decode_auth_token():
+    """Return (user_id, None) for a valid bearer token or (None, error response)"""
+    token = None
+    
+    if 'Authorization' in request.headers:
+        auth_header = request.headers['Authorization']
+        try:
+            token = auth_header.split(" ")[1]  # Bearer token
+        except IndexError:
+            return None, (jsonify({'message': 'Invalid token format'}), 401)
+    
+    if not token:
+        return None, (jsonify({'message': 'Token is missing'}), 401)
+    
+    try:
+        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
+    except jwt.ExpiredSignatureError:
+        return None, (jsonify({'message': 'Token has expired'}), 401)
+    except jwt.InvalidTokenError:
+        return None, (jsonify({'message': 'Invalid token'}), 401)
+    
+    return data['user_id'], None
+
 def token_required(f):
     """Decorator to protect routes that require authentication"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]  # Bearer token
-            except IndexError:
-                return jsonify({'message': 'Invalid token format'}), 401
+        with auth_phase():
+            current_user_id, error = decode_auth_token()
+            g.user_id = current_user_id
+            # Check if user still exists in database; writes re-read is_active
+            current_user = get_principal(current_user_id, fresh=request.method not in READ_METHODS) if not error else None
+        if error:
+            return error
         
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
-        
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
-            
-            # Check if user still exists in database
-            conn = get_db_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute("SELECT user_id, login, first_name, last_name, email, avatar_url FROM \"user\" WHERE user_id = %s AND is_active = true", (current_user_id,))
-            current_user = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            
-            if not current_user:
-                return jsonify({'message': 'User no longer exists'}), 401
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+        if not current_user:
+            return jsonify({'message': 'User no longer exists'}), 401
         
         return f(current_user, *args, **kwargs)
     
@@ -73,42 +361,86 @@ def admin_required(f):
     """Decorator to ensure only admin users can access certain routes"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]  # Bearer token
-            except IndexError:
-                return jsonify({'message': 'Invalid token format'}), 401
+        with auth_phase():
+            current_user_id, error = decode_auth_token()
+            g.user_id = current_user_id
+            # Check if user is admin; writes re-read is_admin/is_active
+            current_user = get_principal(current_user_id, fresh=request.method not in READ_METHODS) if not error else None
+        if error:
+            return error
         
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
-        
-        try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user_id = data['user_id']
-            
-            # Check if user is admin
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT is_admin FROM \"user\" WHERE user_id = %s AND is_active = true", (current_user_id,))
-            result = cursor.fetchone()
-            cursor.close()
-            conn.close()
-            
-            if not result or not result[0]:
-                return jsonify({'message': 'Admin access required'}), 403
-                
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+        if not current_user or not current_user['is_admin']:
+            return jsonify({'message': 'Admin access required'}), 403
         
         return f(*args, **kwargs)
     
     return decorated
 
+# Request parsing bound to Flask's request; the logic lives in api_helpers
+def get_page_limit():
+    """Read the ?limit= query parameter clamped to [1, PAGE_SIZE_MAX]"""
+    return page_limit(request.args)
+
+def read_track_filters():
+    """Collect track search filters from the query string; ValueError on bad numbers"""
+    return track_filters(request.args)
+
+def json_body_response(body):
+    return Response(body, mimetype='application/json')
+
+def keyset_page_response(cursor, procedure, args, limit, sort_key, id_key):
+    """One keyset page of a *_page procedure as a response.
+
+    In JSON passthrough mode the procedure's *_json variant serializes the
+    page and its bytes are sent as they are; otherwise rows are fetched as
+    dicts and encoded by jsonify.
+    """
+    if JSON_PASSTHROUGH:
+        cursor.callproc(procedure + '_json', args + (limit,))
+        return json_body_response(build_json_page(cursor.fetchone(), 'next_' + sort_key, 'next_' + id_key))
+    cursor.callproc(procedure, args + (limit + 1,))
+    return jsonify(build_page(cursor.fetchall(), limit, sort_key, id_key)), 200
+
+def search_tracks_response(cursor, filters, user_id, limit, offset):
+    """Run search_tracks_ranked and return one page with the next-page token"""
+    if JSON_PASSTHROUGH:
+        cursor.callproc('search_tracks_ranked_json', search_args(filters, user_id, limit, offset))
+        return json_body_response(offset_json_page(cursor.fetchone(), limit, offset))
+    cursor.callproc('search_tracks_ranked', search_args(filters, user_id, limit + 1, offset))
+    return jsonify(offset_page(cursor.fetchall(), limit, offset)), 200
+
+# Password hashes are computed and checked in a bounded thread pool in the
+# app tier, so login bursts do not cost database CPU
+password_hasher = PasswordHasher(
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1)),
+    max_pending=int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64)),
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2')
+)
+
+def verify_password(user, password):
+    """Check a password against a get_login_credentials row.
+
+    Legacy pgp_sym_encrypt values are checked by the database once and
+    replaced with a werkzeug hash, so later logins skip the database check.
+    The rehash is best-effort: with the hash pool full the login still
+    succeeds and the value is replaced on a later login.
+    """
+    stored = user['password_hash']
+    if not is_legacy_hash(stored):
+        return password_hasher.verify(stored, password)
+    
+    cursor = get_db_connection().cursor(cursor_factory=RealDictCursor)
+    cursor.callproc('check_legacy_password', (user['user_id'], password))
+    result = cursor.fetchone()
+    if not (result and result['success']):
+        return False
+    try:
+        new_hash = password_hasher.hash(password)
+    except PasswordPoolBusy:
+        return True
+    cursor.callproc('update_password_hash', (user['user_id'], stored, new_hash))
+    return True
+
 # Authentication routes
 @app.route('/api/auth/login', methods=['POST'])
 def login():
@@ -123,12 +455,13 @@ def login():
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Call stored procedure to authenticate user
-        cursor.callproc('authenticate_user', (login, password))
-        result = cursor.fetchone()
+        # One lookup by login; the password itself is checked in the app tier
+        cursor.callproc('get_login_credentials', (login,))
+        user_data = cursor.fetchone()
+        # Give the connection back before the (slow) hash check
+        release_request_connection()
         
-        if result and result['success']:
-            user_data = result
+        if user_data and verify_password(user_data, password):
             
             # Generate JWT token
             token = jwt.encode({
@@ -136,27 +469,15 @@ def login():
                 'exp': datetime.utcnow() + timedelta(hours=24)
             }, app.config['SECRET_KEY'], algorithm='HS256')
             
-            return jsonify({
-                'token': token,
-                'user': {
-                    'user_id': user_data['user_id'],
-                    'login': user_data['login'],
-                    'first_name': user_data['first_name'],
-                    'last_name': user_data['last_name'],
-                    'email': user_data['email'],
-                    'avatar_url': user_data['avatar_url'],
-                    'is_admin': user_data['is_admin']
-                }
-            }), 200
+            return jsonify({'token': token, 'user': user_payload(user_data)}), 200
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
             
+    except PasswordPoolBusy:
+        return jsonify({'message': 'Too many login attempts, try again later'}), 503, {'Retry-After': '1'}
     except Exception as e:
         print(f"Login error: {str(e)}")
         return jsonify({'message': 'Authentication failed'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/auth/register', methods=['POST'])
 def register():
@@ -171,11 +492,12 @@ def register():
         return jsonify({'message': 'Login and password required'}), 400
     
     try:
+        password_hash = password_hasher.hash(password)
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         # Call stored procedure to register user
-        cursor.callproc('register_user', (login, password, first_name, last_name, email))
+        cursor.callproc('register_user', (login, password_hash, first_name, last_name, email))
         result = cursor.fetchone()
         
         if result and result['success']:
@@ -187,63 +509,52 @@ def register():
                 'exp': datetime.utcnow() + timedelta(hours=24)
             }, app.config['SECRET_KEY'], algorithm='HS256')
             
-            return jsonify({
-                'token': token,
-                'user': {
-                    'user_id': user_data['user_id'],
-                    'login': user_data['login'],
-                    'first_name': user_data['first_name'],
-                    'last_name': user_data['last_name'],
-                    'email': user_data['email'],
-                    'avatar_url': user_data['avatar_url'],
-                    'is_admin': user_data['is_admin']
-                }
-            }), 201
+            return jsonify({'token': token, 'user': user_payload(user_data)}), 201
         else:
             return jsonify({'message': 'Registration failed'}), 400
             
+    except PasswordPoolBusy:
+        return jsonify({'message': 'Too many requests, try again later'}), 503, {'Retry-After': '1'}
     except Exception as e:
         print(f"Registration error: {str(e)}")
         return jsonify({'message': 'Registration failed'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 # User profile routes
+# Profiles with favorites, keyed by user_id. user_changed is also sent when the
+# favorites change; any genre or artist change clears the whole cache
+profile_cache = TTLCache(
+    maxsize=int(os.environ.get('PROFILE_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL', 300))
+)
+cache_listener.subscribe(USER_CHANGED_CHANNEL, on_user_changed(profile_cache), profile_cache.clear)
+
 @app.route('/api/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Get user profile with favorite genres and artists
-        cursor.callproc('get_user_profile', (current_user['user_id'],))
-        profile = cursor.fetchone()
-        
-        if profile:
-            # Get favorite genres
-            cursor.callproc('get_user_favorite_genres', (current_user['user_id'],))
-            favorite_genres = cursor.fetchall()
-            
-            # Get favorite artists
-            cursor.callproc('get_user_favorite_artists', (current_user['user_id'],))
-            favorite_artists = cursor.fetchall()
+        # Served from the cache only while invalidations from other workers arrive
+        use_cache = cache_listener.connected
+        profile = profile_cache.get(current_user['user_id']) if use_cache else None
+        if profile is None:
+            version = profile_cache.version()
+            conn = get_db_connection()
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
             
-            profile_result = dict(profile)
-            profile_result['favorite_genres'] = favorite_genres
-            profile_result['favorite_artists'] = favorite_artists
+            # Profile with favorite genres and artists as JSON arrays in one row
+            cursor.callproc('get_user_profile_full', (current_user['user_id'],))
+            profile = cursor.fetchone()
             
-            return jsonify(profile_result), 200
-        else:
-            return jsonify({'message': 'User not found'}), 404
+            if not profile:
+                return jsonify({'message': 'User not found'}), 404
+            profile = dict(profile)
+            if use_cache:
+                profile_cache.set(current_user['user_id'], profile, version)
+        
+        return jsonify(profile), 200
             
     except Exception as e:
         print(f"Get profile error: {str(e)}")
         return jsonify({'message': 'Failed to get profile'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/profile', methods=['PUT'])
 @token_required
@@ -266,6 +577,8 @@ def update_profile(current_user):
         result = cursor.fetchone()
         
         if result and result['success']:
+            invalidate_principal(current_user['user_id'])
+            profile_cache.invalidate(current_user['user_id'])
             return jsonify({'message': 'Profile updated successfully'}), 200
         else:
             return jsonify({'message': 'Failed to update profile'}), 400
@@ -273,50 +586,80 @@ def update_profile(current_user):
     except Exception as e:
         print(f"Update profile error: {str(e)}")
         return jsonify({'message': 'Failed to update profile'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-# Genre routes
-@app.route('/api/genres', methods=['GET'])
+@app.route('/api/profile/favorites', methods=['PUT'])
 @token_required
-def get_genres(current_user):
+def update_favorites(current_user):
+    try:
+        genre_ids, artist_ids = parse_favorite_ids(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.callproc('get_all_genres')
-        genres = cursor.fetchall()
+        cursor.callproc('set_user_favorites', (current_user['user_id'], genre_ids, artist_ids))
+        result = cursor.fetchone()
         
-        return jsonify(genres), 200
+        if result and result['success']:
+            profile_cache.invalidate(current_user['user_id'])
+            return jsonify({'message': 'Favorites updated successfully'}), 200
+        else:
+            return jsonify({'message': 'Failed to update favorites'}), 400
+            
+    except Exception as e:
+        print(f"Update favorites error: {str(e)}")
+        return jsonify({'message': 'Failed to update favorites'}), 500
+
+# Reference data (genres, artists): serialized once, revalidated by ETag and
+# invalidated via NOTIFY on REFERENCE_DATA_CHANNEL so all workers stay coherent
+REFERENCE_DATA_CHANNEL = 'reference_data'
+reference_cache = ReferenceDataCache(ttl=float(os.environ.get('REFERENCE_CACHE_TTL', 300)))
+cache_listener.subscribe(REFERENCE_DATA_CHANNEL, reference_cache.invalidate, reference_cache.clear)
+cache_listener.subscribe(REFERENCE_DATA_CHANNEL, lambda table: profile_cache.clear(), profile_cache.clear)
+
+def load_reference_data(procedure):
+    """Call a no-argument listing procedure and serialize its rows to JSON bytes"""
+    conn = get_db_connection()
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.callproc(procedure)
+    rows = cursor.fetchall()
+    cursor.close()
+    return app.json.dumps(rows).encode('utf-8')
+
+def reference_data_response(name, procedure):
+    """Serve cached reference data, answering If-None-Match with 304"""
+    cache_listener.start()
+    body, etag = reference_cache.get(name, lambda: load_reference_data(procedure))
+    
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+# Genre routes
+@app.route('/api/genres', methods=['GET'])
+@token_required
+def get_genres(current_user):
+    try:
+        return reference_data_response('genres', 'get_all_genres')
         
     except Exception as e:
         print(f"Get genres error: {str(e)}")
         return jsonify({'message': 'Failed to get genres'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 # Artist routes
 @app.route('/api/artists', methods=['GET'])
 @token_required
 def get_artists(current_user):
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
         # Get all artists
-        cursor.callproc('get_all_artists')
-        artists = cursor.fetchall()
-        
-        return jsonify(artists), 200
+        return reference_data_response('artists', 'get_all_artists')
         
     except Exception as e:
         print(f"Get artists error: {str(e)}")
         return jsonify({'message': 'Failed to get artists'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/artists', methods=['POST'])
 @token_required
@@ -335,6 +678,7 @@ def add_artist(current_user):
         result = cursor.fetchone()
         
         if result and result['artist_id']:
+            reference_cache.invalidate('artists')
             return jsonify(result), 201
         else:
             return jsonify({'message': 'Failed to add artist'}), 400
@@ -342,9 +686,6 @@ def add_artist(current_user):
     except Exception as e:
         print(f"Add artist error: {str(e)}")
         return jsonify({'message': 'Failed to add artist'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/artists/<int:artist_id>', methods=['PUT'])
 @token_required
@@ -363,6 +704,8 @@ def update_artist(current_user, artist_id):
         result = cursor.fetchone()
         
         if result and result['success']:
+            reference_cache.invalidate('artists')
+            profile_cache.clear()
             return jsonify({'message': 'Artist updated successfully'}), 200
         else:
             return jsonify({'message': 'Failed to update artist'}), 400
@@ -370,9 +713,6 @@ def update_artist(current_user, artist_id):
     except Exception as e:
         print(f"Update artist error: {str(e)}")
         return jsonify({'message': 'Failed to update artist'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/artists/<int:artist_id>', methods=['DELETE'])
 @token_required
@@ -385,6 +725,8 @@ def delete_artist(current_user, artist_id):
         result = cursor.fetchone()
         
         if result and result['success']:
+            reference_cache.invalidate('artists')
+            profile_cache.clear()
             return jsonify({'message': 'Artist deleted successfully'}), 200
         else:
             return jsonify({'message': 'Failed to delete artist'}), 400
@@ -392,9 +734,11 @@ def delete_artist(current_user, artist_id):
     except Exception as e:
         print(f"Delete artist error: {str(e)}")
         return jsonify({'message': 'Failed to delete artist'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+def mutation_response(result, ok_message, not_found_message):
+    """Map the status returned by an *_as_user procedure to an HTTP response"""
+    body, status = mutation_result(result, ok_message, not_found_message)
+    return jsonify(body), status
 
 # Track routes
 @app.route('/api/tracks', methods=['GET'])
@@ -404,33 +748,63 @@ def get_tracks(current_user):
     is_admin = current_user.get('is_admin', False)
     user_id = current_user['user_id'] if not is_admin else None
     
-    # Get filters from query parameters
-    title_filter = request.args.get('title')
-    artist_filter = request.args.get('artist')
-    genre_filter = request.args.get('genre_id')
-    bpm_filter = request.args.get('bpm')
-    duration_filter = request.args.get('duration')
+    # Get filters from query parameters; filtered listings go through the search procedure
+    has_filters = has_track_filters(request.args)
     
+    limit = get_page_limit()
     try:
-        conn = get_db_connection()
+        filters = read_track_filters()
+        if has_filters:
+            offset = decode_offset_cursor(request.args.get('cursor'))
+        else:
+            after_created_at, after_track_id = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor or filter value'}), 400
+    
+    try:
+        conn = get_read_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
+        if has_filters:
+            return search_tracks_response(cursor, filters, user_id, limit, offset)
+        
         # Call appropriate stored procedure based on admin status
         if is_admin:
-            cursor.callproc('get_all_tracks_admin')
-        else:
-            cursor.callproc('get_user_tracks', (user_id,))
-        
-        tracks = cursor.fetchall()
-        
-        return jsonify(tracks), 200
+            return keyset_page_response(cursor, 'get_all_tracks_admin_page', (after_created_at, after_track_id),
+                                        limit, 'created_at', 'track_id')
+        return keyset_page_response(cursor, 'get_user_tracks_page', (user_id, after_created_at, after_track_id),
+                                    limit, 'created_at', 'track_id')
         
     except Exception as e:
         print(f"Get tracks error: {str(e)}")
         return jsonify({'message': 'Failed to get tracks'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+@app.route('/api/tracks/changes', methods=['GET'])
+@token_required
+def get_track_changes(current_user):
+    """Tracks added, changed and deleted since ?since=<cursor> (the same scope as GET /api/tracks).
+
+    The client patches its local copy of the list and keeps the returned
+    cursor for the next call. reset=true means it must reload the list
+    instead: it has no cursor, the cursor is too old, or there are more than
+    TRACK_CHANGES_MAX changes.
+    """
+    user_id = None if current_user.get('is_admin', False) else current_user['user_id']
+    try:
+        since = decode_sync_cursor(request.args.get('since'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        # Cursor and changes come from one snapshot, so the body is always built by the database
+        cursor.callproc('get_track_changes', (user_id, since, TRACK_CHANGES_MAX))
+        return json_body_response(changes_body(cursor.fetchone()))
+        
+    except Exception as e:
+        print(f"Get track changes error: {str(e)}")
+        return jsonify({'message': 'Failed to get track changes'}), 500
 
 @app.route('/api/tracks', methods=['POST'])
 @token_required
@@ -463,9 +837,62 @@ def add_track(current_user):
     except Exception as e:
         print(f"Add track error: {str(e)}")
         return jsonify({'message': 'Failed to add track'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+# Bulk import: at most this many per-row errors are returned in the response
+BULK_IMPORT_MAX_ERRORS = int(os.environ.get('BULK_IMPORT_MAX_ERRORS', 1000))
+
+@app.route('/api/tracks/bulk', methods=['POST'])
+@token_required
+def bulk_import_tracks(current_user):
+    content_type = request.mimetype
+    if content_type not in ('text/csv', 'application/x-ndjson'):
+        return jsonify({'message': 'Content-Type must be text/csv or application/x-ndjson'}), 415
+    
+    started = time.perf_counter()
+    source = CopySource(iter_records(request.stream, content_type), BULK_IMPORT_MAX_ERRORS)
+    
+    try:
+        conn = get_db_connection()
+        # Staging, COPY and the final insert run as one transaction
+        conn.autocommit = False
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        cursor.execute("""
+            CREATE TEMP TABLE track_import_staging (
+                line_no INTEGER,
+                title VARCHAR(255),
+                artist_name VARCHAR(100),
+                genre_name VARCHAR(100),
+                bpm INTEGER,
+                duration_sec INTEGER
+            ) ON COMMIT DROP
+        """)
+        cursor.copy_expert(
+            "COPY track_import_staging (line_no, title, artist_name, genre_name, bpm, duration_sec) "
+            "FROM STDIN WITH (FORMAT csv)", source)
+        
+        cursor.callproc('import_tracks_from_staging', (current_user['user_id'],))
+        result = cursor.fetchone()
+        conn.commit()
+        
+        if result['artists_created'] or result['genres_created']:
+            reference_cache.invalidate('artists')
+            reference_cache.invalidate('genres')
+        
+        elapsed = time.perf_counter() - started
+        return jsonify({
+            'inserted': result['inserted_count'],
+            'rejected': source.rejected,
+            'errors': source.errors,
+            'artists_created': result['artists_created'],
+            'genres_created': result['genres_created'],
+            'elapsed_sec': round(elapsed, 3),
+            'rows_per_sec': round(result['inserted_count'] / elapsed, 1) if elapsed > 0 else None
+        }), 200 if source.accepted else 400
+        
+    except Exception as e:
+        print(f"Bulk import error: {str(e)}")
+        return jsonify({'message': 'Bulk import failed', 'rejected': source.rejected, 'errors': source.errors}), 500
 
 @app.route('/api/tracks/<int:track_id>', methods=['PUT'])
 @token_required
@@ -485,29 +912,18 @@ def update_track(current_user, track_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # First, check if the track belongs to the current user (unless admin)
-        if not current_user.get('is_admin'):
-            cursor.execute("SELECT user_id FROM tracks WHERE track_id = %s", (track_id,))
-            track_owner = cursor.fetchone()
-            if not track_owner or track_owner['user_id'] != current_user['user_id']:
-                return jsonify({'message': 'Not authorized to modify this track'}), 403
-        
-        cursor.callproc('update_track', (
-            track_id, title, artist_id, genre_id, bpm, duration_sec
+        cursor.callproc('update_track_as_user', (
+            track_id, current_user['user_id'], current_user['is_admin'],
+            title, artist_id, genre_id, bpm, duration_sec
         ))
         result = cursor.fetchone()
         
-        if result and result['success']:
-            return jsonify({'message': 'Track updated successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to update track'}), 400
+        return mutation_response(result, 'Track updated successfully',
+                                 'Track not found')
             
     except Exception as e:
         print(f"Update track error: {str(e)}")
         return jsonify({'message': 'Failed to update track'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/tracks/<int:track_id>', methods=['DELETE'])
 @token_required
@@ -516,34 +932,24 @@ def delete_track(current_user, track_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # First, check if the track belongs to the current user (unless admin)
-        if not current_user.get('is_admin'):
-            cursor.execute("SELECT user_id FROM tracks WHERE track_id = %s", (track_id,))
-            track_owner = cursor.fetchone()
-            if not track_owner or track_owner['user_id'] != current_user['user_id']:
-                return jsonify({'message': 'Not authorized to delete this track'}), 403
-        
-        cursor.callproc('delete_track', (track_id,))
+        cursor.callproc('delete_track_as_user', (
+            track_id, current_user['user_id'], current_user['is_admin']
+        ))
         result = cursor.fetchone()
         
-        if result and result['success']:
-            return jsonify({'message': 'Track deleted successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to delete track'}), 400
+        return mutation_response(result, 'Track deleted successfully',
+                                 'Track not found')
             
     except Exception as e:
         print(f"Delete track error: {str(e)}")
         return jsonify({'message': 'Failed to delete track'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 # Collection routes
 @app.route('/api/collections', methods=['GET'])
 @token_required
 def get_collections(current_user):
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         cursor.callproc('get_user_collections', (current_user['user_id'],))
@@ -554,9 +960,6 @@ def get_collections(current_user):
     except Exception as e:
         print(f"Get collections error: {str(e)}")
         return jsonify({'message': 'Failed to get collections'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/collections', methods=['POST'])
 @token_required
@@ -584,9 +987,34 @@ def add_collection(current_user):
     except Exception as e:
         print(f"Add collection error: {str(e)}")
         return jsonify({'message': 'Failed to create collection'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+@app.route('/api/collections/<int:collection_id>', methods=['GET'])
+@token_required
+def get_collection(current_user, collection_id):
+    limit = get_page_limit()
+    try:
+        after_added_at, after_track_id = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        cursor.callproc('get_collection_detail', (collection_id, after_added_at, after_track_id, limit))
+        result = cursor.fetchone()
+        
+        if not result or not can_view_collection(result['owner_id'], current_user):
+            return jsonify({'message': 'Collection not found'}), 404
+        
+        collection = result['collection']
+        collection['next'] = (encode_cursor(result['next_added_at'], result['next_track_id'])
+                              if result['next_track_id'] is not None else None)
+        return jsonify(collection), 200
+        
+    except Exception as e:
+        print(f"Get collection error: {str(e)}")
+        return jsonify({'message': 'Failed to get collection'}), 500
 
 @app.route('/api/collections/<int:collection_id>', methods=['PUT'])
 @token_required
@@ -603,26 +1031,17 @@ def update_collection(current_user, collection_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # First, check if the collection belongs to the current user
-        cursor.execute("SELECT user_id FROM collections WHERE collection_id = %s", (collection_id,))
-        collection_owner = cursor.fetchone()
-        if not collection_owner or collection_owner['user_id'] != current_user['user_id']:
-            return jsonify({'message': 'Not authorized to modify this collection'}), 403
-        
-        cursor.callproc('update_collection', (collection_id, name, is_favorite))
+        cursor.callproc('update_collection_as_user', (
+            collection_id, current_user['user_id'], name, is_favorite
+        ))
         result = cursor.fetchone()
         
-        if result and result['success']:
-            return jsonify({'message': 'Collection updated successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to update collection'}), 400
+        return mutation_response(result, 'Collection updated successfully',
+                                 'Collection not found')
             
     except Exception as e:
         print(f"Update collection error: {str(e)}")
         return jsonify({'message': 'Failed to update collection'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/collections/<int:collection_id>', methods=['DELETE'])
 @token_required
@@ -631,26 +1050,15 @@ def delete_collection(current_user, collection_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # First, check if the collection belongs to the current user
-        cursor.execute("SELECT user_id FROM collections WHERE collection_id = %s", (collection_id,))
-        collection_owner = cursor.fetchone()
-        if not collection_owner or collection_owner['user_id'] != current_user['user_id']:
-            return jsonify({'message': 'Not authorized to delete this collection'}), 403
-        
-        cursor.callproc('delete_collection', (collection_id,))
+        cursor.callproc('delete_collection_as_user', (collection_id, current_user['user_id']))
         result = cursor.fetchone()
         
-        if result and result['success']:
-            return jsonify({'message': 'Collection deleted successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to delete collection'}), 400
+        return mutation_response(result, 'Collection deleted successfully',
+                                 'Collection not found')
             
     except Exception as e:
         print(f"Delete collection error: {str(e)}")
         return jsonify({'message': 'Failed to delete collection'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 # Add track to collection
 @app.route('/api/collections/<int:collection_id>/tracks', methods=['POST'])
@@ -666,33 +1074,17 @@ def add_track_to_collection(current_user, collection_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Check if collection belongs to user
-        cursor.execute("SELECT user_id FROM collections WHERE collection_id = %s", (collection_id,))
-        collection_owner = cursor.fetchone()
-        if not collection_owner or collection_owner['user_id'] != current_user['user_id']:
-            return jsonify({'message': 'Not authorized to modify this collection'}), 403
-        
-        # Check if track belongs to user (or if admin)
-        if not current_user.get('is_admin'):
-            cursor.execute("SELECT user_id FROM tracks WHERE track_id = %s", (track_id,))
-            track_owner = cursor.fetchone()
-            if not track_owner or track_owner['user_id'] != current_user['user_id']:
-                return jsonify({'message': 'Not authorized to add this track to collection'}), 403
-        
-        cursor.callproc('add_track_to_collection', (collection_id, track_id))
+        cursor.callproc('add_track_to_collection_as_user', (
+            collection_id, track_id, current_user['user_id'], current_user['is_admin']
+        ))
         result = cursor.fetchone()
         
-        if result and result['success']:
-            return jsonify({'message': 'Track added to collection successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to add track to collection'}), 400
+        return mutation_response(result, 'Track added to collection successfully',
+                                 'Collection or track not found')
             
     except Exception as e:
         print(f"Add track to collection error: {str(e)}")
         return jsonify({'message': 'Failed to add track to collection'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 # Remove track from collection
 @app.route('/api/collections/<int:collection_id>/tracks/<int:track_id>', methods=['DELETE'])
@@ -702,60 +1094,97 @@ def remove_track_from_collection(current_user, collection_id, track_id):
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Check if collection belongs to user
-        cursor.execute("SELECT user_id FROM collections WHERE collection_id = %s", (collection_id,))
-        collection_owner = cursor.fetchone()
-        if not collection_owner or collection_owner['user_id'] != current_user['user_id']:
-            return jsonify({'message': 'Not authorized to modify this collection'}), 403
-        
-        cursor.callproc('remove_track_from_collection', (collection_id, track_id))
+        cursor.callproc('remove_track_from_collection_as_user', (
+            collection_id, track_id, current_user['user_id']
+        ))
         result = cursor.fetchone()
         
-        if result and result['success']:
-            return jsonify({'message': 'Track removed from collection successfully'}), 200
-        else:
-            return jsonify({'message': 'Failed to remove track from collection'}), 400
+        return mutation_response(result, 'Track removed from collection successfully',
+                                 'Track is not in this collection')
             
     except Exception as e:
         print(f"Remove track from collection error: {str(e)}")
         return jsonify({'message': 'Failed to remove track from collection'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+# Batch add/remove of tracks in a collection
+def read_track_ids():
+    """Return the list of track IDs from the JSON body, or None if it is malformed"""
+    return parse_track_ids(request.get_json(silent=True))
+
+@app.route('/api/collections/<int:collection_id>/tracks/batch', methods=['POST'])
+@token_required
+def add_tracks_to_collection_batch(current_user, collection_id):
+    track_ids = read_track_ids()
+    if track_ids is None:
+        return jsonify({'message': f'track_ids must be a non-empty list of at most {COLLECTION_BATCH_MAX} integers'}), 400
+    
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        cursor.callproc('add_tracks_to_collection_batch', (
+            collection_id, current_user['user_id'], current_user['is_admin'], track_ids
+        ))
+        rows = cursor.fetchall()
+        
+        body, status = batch_result(rows, ('added', 'already_present'), 'Collection not found')
+        return jsonify(body), status
+        
+    except Exception as e:
+        print(f"Batch add tracks to collection error: {str(e)}")
+        return jsonify({'message': 'Failed to add tracks to collection'}), 500
+
+@app.route('/api/collections/<int:collection_id>/tracks/batch', methods=['DELETE'])
+@token_required
+def remove_tracks_from_collection_batch(current_user, collection_id):
+    track_ids = read_track_ids()
+    if track_ids is None:
+        return jsonify({'message': f'track_ids must be a non-empty list of at most {COLLECTION_BATCH_MAX} integers'}), 400
+    
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        
+        cursor.callproc('remove_tracks_from_collection_batch', (
+            collection_id, current_user['user_id'], track_ids
+        ))
+        rows = cursor.fetchall()
+        
+        body, status = batch_result(rows, ('removed',), 'Collection not found')
+        return jsonify(body), status
+        
+    except Exception as e:
+        print(f"Batch remove tracks from collection error: {str(e)}")
+        return jsonify({'message': 'Failed to remove tracks from collection'}), 500
 
 # Search routes
 @app.route('/api/search/tracks', methods=['GET'])
 @token_required
 def search_tracks(current_user):
-    title = request.args.get('title')
-    artist = request.args.get('artist')
-    genre_id = request.args.get('genre_id')
-    bpm = request.args.get('bpm')
-    duration = request.args.get('duration')
+    limit = get_page_limit()
+    try:
+        filters = read_track_filters()
+        offset = decode_offset_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor or filter value'}), 400
     
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        # Call search procedure
-        cursor.callproc('search_tracks', (title, artist, genre_id, bpm, duration))
-        results = cursor.fetchall()
-        
-        return jsonify(results), 200
+        # Call search procedure (all users' tracks, best matches first)
+        return search_tracks_response(cursor, filters, None, limit, offset)
         
     except Exception as e:
         print(f"Search tracks error: {str(e)}")
         return jsonify({'message': 'Search failed'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 # Admin routes
 @app.route('/api/admin/users', methods=['GET'])
 @admin_required
 def get_all_users():
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         cursor.callproc('get_all_users_admin')
@@ -766,82 +1195,232 @@ def get_all_users():
     except Exception as e:
         print(f"Get all users error: {str(e)}")
         return jsonify({'message': 'Failed to get users'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
-@app.route('/api/admin/tracks', methods=['GET'])
+@app.route('/api/admin/users/<int:user_id>/active', methods=['PUT'])
 @admin_required
-def get_all_tracks_admin():
+def set_user_active(user_id):
+    data = request.get_json()
+    is_active = data.get('is_active')
+    
+    if not isinstance(is_active, bool):
+        return jsonify({'message': 'is_active must be true or false'}), 400
+    
     try:
         conn = get_db_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.callproc('get_all_tracks_admin')
-        tracks = cursor.fetchall()
+        cursor.callproc('set_user_active', (user_id, is_active))
+        result = cursor.fetchone()
+        
+        if result and result['success']:
+            invalidate_principal(user_id)
+            profile_cache.invalidate(user_id)
+            return jsonify({'message': 'User status updated successfully'}), 200
+        else:
+            return jsonify({'message': 'User not found'}), 404
+            
+    except Exception as e:
+        print(f"Set user active error: {str(e)}")
+        return jsonify({'message': 'Failed to update user status'}), 500
+
+@app.route('/api/admin/tracks', methods=['GET'])
+@admin_required
+def get_all_tracks_admin():
+    limit = get_page_limit()
+    try:
+        after_created_at, after_track_id = decode_cursor(request.args.get('cursor'))
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor'}), 400
+    
+    try:
+        conn = get_read_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        return jsonify(tracks), 200
+        return keyset_page_response(cursor, 'get_all_tracks_admin_page', (after_created_at, after_track_id),
+                                    limit, 'created_at', 'track_id')
         
     except Exception as e:
         print(f"Get all tracks admin error: {str(e)}")
         return jsonify({'message': 'Failed to get tracks'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 @app.route('/api/admin/audit', methods=['GET'])
 @admin_required
 def get_audit_log():
+    limit = get_page_limit()
     try:
-        conn = get_db_connection()
+        after_time, after_log_id = decode_cursor(request.args.get('cursor'))
+        time_from = request.args.get('from')
+        time_from = datetime.fromisoformat(time_from) if time_from else None
+        time_to = request.args.get('to')
+        time_to = datetime.fromisoformat(time_to) if time_to else None
+        filter_user_id = int_param(request.args, 'user_id')
+        record_id = int_param(request.args, 'record_id')
+    except ValueError:
+        return jsonify({'message': 'Invalid cursor, time range or ID filter'}), 400
+    
+    table_name = request.args.get('table_name') or None
+    operation_type = request.args.get('operation_type') or None
+    
+    try:
+        conn = get_read_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
-        cursor.callproc('get_audit_log')
-        audit_entries = cursor.fetchall()
-        
-        return jsonify(audit_entries), 200
+        return keyset_page_response(cursor, 'get_audit_log_page', (
+            time_from, time_to, table_name, operation_type, filter_user_id, record_id,
+            after_time, after_log_id
+        ), limit, 'operation_time', 'log_id')
         
     except Exception as e:
         print(f"Get audit log error: {str(e)}")
         return jsonify({'message': 'Failed to get audit log'}), 500
-    finally:
-        if 'conn' in locals():
-            conn.close()
+
+# Streaming exports (EXPORT_PROCEDURES maps dataset name -> export procedure)
+@app.route('/api/admin/export/<dataset>', methods=['GET'])
+@admin_required
+def export_dataset(dataset):
+    procedure = EXPORT_PROCEDURES.get(dataset)
+    if not procedure:
+        return jsonify({'message': 'Unknown export dataset'}), 404
+    
+    export_format = request.args.get('format', 'ndjson')
+    if export_format == 'ndjson':
+        encode, mimetype = ndjson_chunks, 'application/x-ndjson'
+    elif export_format == 'csv':
+        encode, mimetype = csv_chunks, 'text/csv'
+    else:
+        return jsonify({'message': 'Format must be ndjson or csv'}), 400
+    
+    use_gzip = request.args.get('compress') == 'gzip'
+    filename = f"{dataset}.{export_format}" + ('.gz' if use_gzip else '')
+    
+    def generate():
+        try:
+            chunks = encode(iter_batches(get_read_connection(), procedure, EXPORT_ITERSIZE))
+            if use_gzip:
+                yield from gzip_chunks(chunks)
+            else:
+                for chunk in chunks:
+                    yield chunk.encode('utf-8')
+        except Exception as e:
+            # Headers are already sent, so the only option is to cut the stream short
+            print(f"Export {dataset} error: {str(e)}")
+    
+    response = Response(stream_with_context(generate()),
+                        mimetype='application/gzip' if use_gzip else mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/admin/db-pool', methods=['GET'])
+@admin_required
+def get_db_pool_stats():
+    stats = db_pool.stats()
+    if replica_pool is not None:
+        stats['replica'] = dict(replica_pool.stats(), routing=read_your_writes.stats())
+    return jsonify(stats), 200
+
+@app.route('/api/admin/slow-queries', methods=['GET'])
+@admin_required
+def get_slow_queries():
+    return jsonify({'stats': query_tracer.stats(), 'items': query_tracer.recent()}), 200
+
+# Built client files (build_assets.py); without a build the sources in client/ are served
+assets = StaticAssets(os.path.join(app.root_path, 'client'), os.path.join(app.root_path, 'client', 'dist'))
+
+
+def send_static(static_file):
+    response = send_from_directory(static_file.directory, static_file.filename, mimetype=static_file.mimetype)
+    # Werkzeug names the file on disk (index.html.br) here; the URL is the right name
+    response.headers.pop('Content-Disposition', None)
+    response.headers.update(static_file.headers)
+    return response
 
 # Serve static files (CSS, JS, images)
 @app.route('/static/<path:filename>')
 def static_files(filename):
-    return send_from_directory('client', filename)
+    static_file = assets.lookup(filename, request.headers.get('Accept-Encoding'))
+    if static_file is None:
+        return send_from_directory('client', filename)
+    return send_static(static_file)
 
 # Serve HTML files
 @app.route('/')
 def index():
-    return send_from_directory('client', 'index.html')
+    return send_static(assets.page('index.html', request.headers.get('Accept-Encoding')))
 
 @app.route('/login-page')
+@app.route('/login')
 def login_page():
-    return send_from_directory('client', 'login.html')
+    return send_static(assets.page('login.html', request.headers.get('Accept-Encoding')))
 
 @app.route('/register-page')
+@app.route('/register')
 def register_page():
-    return send_from_directory('client', 'register.html')
+    return send_static(assets.page('register.html', request.headers.get('Accept-Encoding')))
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow()}), 200
 
-@app.route('/')
-def index():
-    return app.send_static_file('index.html')
+# Pool and cache figures, read from their stats() only when /api/metrics is scraped
+CACHES = {'principal': principal_cache, 'profile': profile_cache, 'reference': reference_cache}
 
-@app.route('/login')
-def login_page():
-    return app.send_static_file('login.html')
+def pool_stat(key, scale=1):
+    return lambda: {(): db_pool.stats()[key] * scale}
 
-@app.route('/register')
-def register_page():
-    return app.send_static_file('register.html')
+def cache_stat(key):
+    return lambda: {(name,): cache.stats()[key] for name, cache in CACHES.items()}
+
+metrics.callback('db_pool_connections', 'Database connections by state', 'gauge', ('state',),
+                 lambda: {(state,): value for state, value in db_pool.stats().items() if state in ('in_use', 'idle')})
+metrics.callback('db_pool_max_connections', 'Maximum size of the connection pool', 'gauge', (),
+                 pool_stat('max_size'))
+metrics.callback('db_pool_checkouts_total', 'Connections checked out of the pool', 'counter', (),
+                 pool_stat('checkouts'))
+metrics.callback('db_pool_waits_total', 'Checkouts that had to wait for a free connection', 'counter', (),
+                 pool_stat('waits'))
+metrics.callback('db_pool_timeouts_total', 'Checkouts that timed out', 'counter', (),
+                 pool_stat('timeouts'))
+metrics.callback('db_pool_wait_seconds_total', 'Total time spent waiting for a connection', 'counter', (),
+                 pool_stat('wait_time_total_ms', 0.001))
+if replica_pool is not None:
+    metrics.callback('db_replica_pool_connections', 'Replica connections by state', 'gauge', ('state',),
+                     lambda: {(state,): value for state, value in replica_pool.stats().items()
+                              if state in ('in_use', 'idle')})
+    metrics.callback('db_read_routing_total', 'Reads by target: replica, or primary because of lag or errors',
+                     'counter', ('target',),
+                     lambda: {(target,): count for target, count in read_your_writes.stats().items()
+                              if target in read_your_writes.reads})
+    metrics.callback('db_replica_waits_total', 'Reads that waited for the replica to replay a write',
+                     'counter', (), lambda: {(): read_your_writes.stats()['waits']})
+metrics.callback('password_hash_pending', 'Password hash operations queued or running', 'gauge', (),
+                 lambda: {(): password_hasher.stats()['pending']})
+metrics.callback('password_hash_rejected_total', 'Password hash operations refused as the pool was full',
+                 'counter', (), lambda: {(): password_hasher.stats()['rejected']})
+metrics.callback('cache_hits_total', 'In-process cache hits', 'counter', ('cache',), cache_stat('hits'))
+metrics.callback('cache_misses_total', 'In-process cache misses', 'counter', ('cache',), cache_stat('misses'))
+metrics.callback('cache_hit_ratio', 'Hits / lookups since process start', 'gauge', ('cache',),
+                 cache_stat('hit_rate'))
+metrics.callback('cache_listener_connected', 'Whether the cache invalidation listener is connected',
+                 'gauge', (), lambda: {(): int(cache_listener.connected)})
+
+# Route and pool figures are operational data: /api/metrics is served to
+# admins, or to a scraper presenting METRICS_TOKEN as its bearer token
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+def render_metrics():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+admin_metrics = admin_required(render_metrics)
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    if METRICS_TOKEN and hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        return render_metrics()
+    return admin_metrics()
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; in production run gunicorn -c gunicorn.conf.py
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
@@ -5,11 +5,15 @@
 echo "Установка зависимостей..."
 pip install -r requirements.txt
 
+echo "Сборка клиентских файлов (client/dist)..."
+python build_assets.py
+
 echo "Создание базы данных (требуется PostgreSQL)..."
 echo "Пожалуйста, убедитесь, что PostgreSQL запущен и доступен"
 echo "Для создания базы данных выполните:"
 echo "  createdb music_library"
 echo "  psql -d music_library -f database_schema.sql"
+echo "  python migrate.py"
 echo
 
 echo "Для быстрого запуска выполните:"
@@ -18,7 +22,7 @@ echo "  export DB_NAME=music_library"
 echo "  export DB_USER=postgres"
 echo "  export DB_PASSWORD=ваш_пароль"
 echo "  export SECRET_KEY=ваш_секретный_ключ"
-echo "  python server.py"
+echo "  gunicorn -c gunicorn.conf.py   # или python server.py для разработки"
 echo
 
 echo "Готово! Не забудьте настроить переменные окружения перед запуском сервера."
\ No newline at end of file
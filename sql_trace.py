@@ -0,0 +1,204 @@
+"""Tracing of SQL calls made through TimedConnection cursors (see db_pool.py)
+
+QueryTracer turns each callproc/execute/copy reported by the pool into a
+trace entry: procedure or statement name, redacted parameters, duration
+and row count. Every entry goes to the ``sql.trace`` logger at DEBUG level
+(built only when that level is enabled); calls slower than ``slow_ms`` are
+written to the ``sql.slow`` logger as one JSON object per line and kept in
+a bounded in-memory list. A sampled share of slow calls to read-only
+procedures can be re-run with auto_explain to attach the plans of the
+statements inside the procedure. Requests that issue more than ``query_count_warn`` statements are
+logged with their most frequent calls, which is how N+1 loops show up.
+"""
+
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+
+from psycopg2 import extensions, sql
+
+trace_log = logging.getLogger('sql.trace')
+slow_query_log = logging.getLogger('sql.slow')
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Transaction-local auto_explain settings for sampled plans: every statement
+# run inside the procedure is logged with its actual rows and buffers.
+# log_min_duration comes last so the set_config calls are not logged themselves
+AUTO_EXPLAIN_SETTINGS = (
+    ('client_min_messages', 'notice'),
+    ('auto_explain.log_analyze', 'on'),
+    ('auto_explain.log_buffers', 'on'),
+    ('auto_explain.log_nested_statements', 'on'),
+    ('auto_explain.log_format', 'json'),
+    ('auto_explain.log_level', 'notice'),
+    ('auto_explain.log_min_duration', '0'),
+)
+
+
+def redact(value):
+    """Keep numbers, booleans, dates and NULLs; hide the contents of strings and blobs"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return '<str:%d>' % len(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return '<bytes:%d>' % len(value)
+    if isinstance(value, (list, tuple)):
+        return '<list:%d>' % len(value)
+    return '<%s>' % type(value).__name__
+
+
+def statement_name(cursor, query):
+    """Short single-line form of a statement for logs (parameters stay as %s)"""
+    if isinstance(query, sql.Composable):
+        query = query.as_string(cursor)
+    elif isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    query = _WHITESPACE.sub(' ', str(query)).strip()
+    return query if len(query) <= 120 else query[:117] + '...'
+
+
+def explained_plans(notices):
+    """Plans from auto_explain notices ("duration: ... plan:\\n{json}")"""
+    for notice in notices:
+        _, marker, body = notice.partition('plan:')
+        if marker:
+            yield json.loads(body)
+
+
+class QueryTracer:
+    """Collects slow SQL calls and optional EXPLAIN plans for them"""
+
+    def __init__(self, slow_ms, query_count_warn, explain_procedures=(), explain_sample_rate=0.0,
+                 keep=100):
+        self.slow_ms = slow_ms
+        self.query_count_warn = query_count_warn
+        self.explain_procedures = frozenset(explain_procedures)
+        self.explain_sample_rate = explain_sample_rate
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self.slow_calls = 0
+
+    def trace(self, cursor, method, args, seconds, error, context=None):
+        """Trace one call and return its procedure or statement name.
+
+        ``method`` and ``args`` are the cursor method and its positional
+        arguments as reported by TimedConnection; ``context`` (e.g. the
+        route) is merged into the log entry.
+        """
+        if method == 'callproc':
+            name = args[0]
+            params = args[1] if len(args) > 1 else ()
+        else:
+            name = statement_name(cursor, args[0]) if args else method
+            params = args[1] if len(args) > 1 and method == 'execute' else ()
+
+        duration_ms = seconds * 1000
+        slow = duration_ms >= self.slow_ms
+        if not slow and not trace_log.isEnabledFor(logging.DEBUG):
+            return name
+
+        if isinstance(params, dict):
+            redacted = {key: redact(value) for key, value in params.items()}
+        else:
+            redacted = [redact(value) for value in params or ()]
+
+        entry = {
+            'event': 'slow_query' if slow else 'query',
+            'time': datetime.utcnow().isoformat(),
+            'method': method,
+            'name': name,
+            'params': redacted,
+            'duration_ms': round(duration_ms, 3),
+            'rows': cursor.rowcount,
+        }
+        if error is not None:
+            entry['error'] = type(error).__name__
+        if context:
+            entry.update(context)
+        if not slow:
+            trace_log.debug(json.dumps(entry, default=str))
+            return name
+
+        if (method == 'callproc' and error is None and name in self.explain_procedures
+                and random.random() < self.explain_sample_rate):
+            entry['plan'] = self._explain(cursor.connection, name, params)
+
+        with self._lock:
+            self.slow_calls += 1
+            self._recent.append(entry)
+        slow_query_log.warning(json.dumps(entry, default=str))
+        return name
+
+    def request_finished(self, context, queries):
+        """Log a request whose ``queries`` ({name: count}) exceed query_count_warn"""
+        total = sum(queries.values())
+        if total > self.query_count_warn:
+            top = sorted(queries.items(), key=lambda item: item[1], reverse=True)[:5]
+            entry = {'event': 'many_queries', 'queries': total,
+                     'top': [{'name': name, 'count': count} for name, count in top]}
+            entry.update(context)
+            slow_query_log.warning(json.dumps(entry, default=str))
+        return total
+
+    def _explain(self, conn, procedure, params):
+        """Re-run a procedure in a read-only transaction and collect the plans of its statements.
+
+        EXPLAIN of the wrapping SELECT would only show a Function Scan, so the
+        queries inside the procedure are planned by auto_explain with nested
+        statements enabled; its settings are transaction-local and the plans
+        arrive as notices. LOAD 'auto_explain' needs superuser rights unless
+        the module is already preloaded.
+        """
+        if not conn.autocommit or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return {'skipped': 'connection is inside a transaction'}
+        params = list(params or ())
+        query = sql.SQL('SELECT * FROM {}({})').format(
+            sql.Identifier(procedure), sql.SQL(', ').join(sql.Placeholder() * len(params)))
+        started = time.perf_counter()
+        # A plain cursor, so the re-run itself is neither timed nor traced
+        cursor = extensions.cursor(conn)
+        notices, conn.notices = conn.notices, deque()
+        try:
+            cursor.execute('BEGIN TRANSACTION READ ONLY')
+            try:
+                cursor.execute("LOAD 'auto_explain'")
+                for setting, value in AUTO_EXPLAIN_SETTINGS:
+                    cursor.execute('SELECT set_config(%s, %s, true)', (setting, value))
+                cursor.execute(query, params)
+                statement = cursor.query.decode('utf-8', 'replace')
+            finally:
+                cursor.execute('ROLLBACK')
+            plans = [plan for plan in explained_plans(conn.notices)
+                     if plan.get('Query Text') != statement]
+        except Exception as e:
+            return {'error': str(e).strip()}
+        finally:
+            conn.notices = notices
+            cursor.close()
+        return {'explain_ms': round((time.perf_counter() - started) * 1000, 3), 'plans': plans}
+
+    def recent(self):
+        """Slow calls kept in memory, newest first"""
+        with self._lock:
+            return list(reversed(self._recent))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'slow_calls': self.slow_calls,
+                'slow_ms': self.slow_ms,
+                'query_count_warn': self.query_count_warn,
+                'explain_sample_rate': self.explain_sample_rate,
+            }
@@ -0,0 +1,114 @@
+"""Serving of the built client files (build_assets.py), used by server.py and async_server.py"""
+
+import json
+import mimetypes
+import os
+from collections import namedtuple
+
+MANIFEST_NAME = 'manifest.json'
+
+# Precompressed variants in order of preference: (Content-Encoding, file suffix)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Hashed names never change content; pages keep their names and are revalidated
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+StaticFile = namedtuple('StaticFile', 'directory filename mimetype headers')
+
+
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding header allows (q > 0)"""
+    accepted = set()
+    refused = set()
+    wildcard = False
+    for part in (header or '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding == '*':
+            wildcard = quality > 0
+        elif quality > 0:
+            accepted.add(coding)
+        else:
+            refused.add(coding)
+    if wildcard:
+        accepted |= {coding for coding, _ in ENCODINGS} - refused
+    return accepted
+
+
+class StaticAssets:
+    """Maps static requests to built files and their caching headers.
+
+    build_assets.py writes minified, content-hashed copies of the client
+    files with .br/.gz variants into ``build_dir``. Hashed names are served
+    as immutable for a year; pages keep their names and are revalidated with
+    their ETag on every load. The variant is picked from Accept-Encoding.
+    Hashed files left by earlier builds are still served, so pages loaded
+    before a deploy get the versions they reference. Without a build (no
+    manifest) everything is served from ``source_dir`` as before.
+    """
+
+    def __init__(self, source_dir, build_dir):
+        self.source_dir = source_dir
+        self.build_dir = build_dir
+        self.pages = ()
+        self._variants = {}   # built file name -> available codings
+        manifest_path = os.path.join(build_dir, MANIFEST_NAME)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                self.pages = tuple(json.load(f)['pages'])
+
+    @property
+    def built(self):
+        return bool(self.pages)
+
+    def _codings(self, filename):
+        """Codings available for a built file, or None if there is no such file.
+
+        Only existing files are remembered, so files from a later build are
+        found without a restart.
+        """
+        codings = self._variants.get(filename)
+        if codings is None:
+            path = os.path.join(self.build_dir, filename)
+            if not os.path.isfile(path):
+                return None
+            codings = tuple(coding for coding, suffix in ENCODINGS if os.path.isfile(path + suffix))
+            self._variants[filename] = codings
+        return codings
+
+    def lookup(self, filename, accept_encoding):
+        """StaticFile for /static/<filename>, or None if it is not a built file"""
+        # Build output is flat; anything else is a source path
+        if not self.built or '/' in filename or '\\' in filename or filename.startswith('.') \
+                or filename == MANIFEST_NAME:
+            return None
+        codings = self._codings(filename)
+        if codings is None:
+            return None
+        headers = {
+            'Cache-Control': REVALIDATE if filename in self.pages else IMMUTABLE,
+            'Vary': 'Accept-Encoding',
+        }
+        mimetype = mimetypes.guess_type(filename)[0]
+        accepted = accepted_encodings(accept_encoding)
+        for coding, suffix in ENCODINGS:
+            if coding in codings and coding in accepted:
+                headers['Content-Encoding'] = coding
+                return StaticFile(self.build_dir, filename + suffix, mimetype, headers)
+        return StaticFile(self.build_dir, filename, mimetype, headers)
+
+    def page(self, name, accept_encoding):
+        """StaticFile for an HTML page such as 'index.html'"""
+        return (self.lookup(name, accept_encoding)
+                or StaticFile(self.source_dir, name, None, {}))
@@ -0,0 +1,130 @@
+"""
+Тесты разбора параметров запросов и курсоров страниц (api_helpers.py)
+"""
+
+import base64
+import json
+from datetime import datetime
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from api_helpers import (
+    PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, batch_result, build_page, can_view_collection, decode_cursor,
+    decode_offset_cursor, encode_cursor, encode_offset_cursor, int_param, mutation_result,
+    offset_page, page_limit
+)
+
+
+def token(value):
+    """Курсор из произвольного JSON, как его мог бы подделать клиент"""
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+
+def test_page_limit_is_clamped():
+    assert page_limit(MultiDict()) == PAGE_SIZE_DEFAULT
+    assert page_limit(MultiDict({'limit': '0'})) == 1
+    assert page_limit(MultiDict({'limit': '-5'})) == 1
+    assert page_limit(MultiDict({'limit': str(PAGE_SIZE_MAX + 1)})) == PAGE_SIZE_MAX
+    # Не число - значение по умолчанию
+    assert page_limit(MultiDict({'limit': 'abc'})) == PAGE_SIZE_DEFAULT
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 17, 12, 30, 45, 123456)
+    cursor = encode_cursor(created_at, 42)
+    assert '=' not in cursor
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+def test_missing_cursor_is_first_page():
+    assert decode_cursor(None) == (None, None)
+    assert decode_cursor('') == (None, None)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    token('2024-01-01T00:00:00'),
+    token(['2024-01-01T00:00:00']),
+    token(['yesterday', 1]),
+    token(['2024-01-01T00:00:00', 'x']),
+    token({'offset': 5}),
+    base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_offset_cursor_round_trip():
+    assert decode_offset_cursor(None) == 0
+    assert decode_offset_cursor(encode_offset_cursor(150)) == 150
+
+
+@pytest.mark.parametrize('cursor', [
+    token({'offset': -1}),
+    token({'offset': 'x'}),
+    token({'page': 2}),
+    token([1, 2]),
+    'garbage',
+])
+def test_tampered_offset_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_offset_cursor(cursor)
+
+
+def test_build_page_trims_extra_row():
+    rows = [{'created_at': datetime(2024, 1, day), 'track_id': day} for day in (3, 2, 1)]
+    page = build_page(rows, 2, 'created_at', 'track_id')
+    assert page['items'] == rows[:2]
+    assert decode_cursor(page['next']) == (datetime(2024, 1, 2), 2)
+
+
+def test_build_page_last_page_has_no_cursor():
+    rows = [{'created_at': datetime(2024, 1, 1), 'track_id': 1}]
+    assert build_page(rows, 2, 'created_at', 'track_id') == {'items': rows, 'next': None}
+
+
+def test_offset_page():
+    page = offset_page(list(range(11)), 10, 20)
+    assert page['items'] == list(range(10))
+    assert decode_offset_cursor(page['next']) == 30
+    assert offset_page([1], 10, 0)['next'] is None
+
+
+def test_mutation_result_hides_foreign_rows():
+    assert mutation_result({'status': 'ok'}, 'Done', 'Missing') == ({'message': 'Done'}, 200)
+    assert mutation_result({'status': 'not_found'}, 'Done', 'Missing') == ({'message': 'Missing'}, 404)
+    assert mutation_result(None, 'Done', 'Missing') == ({'message': 'Missing'}, 404)
+
+
+def test_foreign_collection_is_not_found():
+    # GET /api/collections/<id>: чужая коллекция неотличима от несуществующей
+    owner = {'user_id': 1, 'is_admin': False}
+    assert can_view_collection(1, owner)
+    assert not can_view_collection(2, owner)
+    assert can_view_collection(2, {'user_id': 1, 'is_admin': True})
+    # POST и DELETE /tracks/batch: процедура возвращает (NULL, 'not_found')
+    sentinel = [{'track_id': None, 'status': 'not_found'}]
+    for ok_statuses in (('added', 'already_present'), ('removed',)):
+        assert batch_result(sentinel, ok_statuses, 'Collection not found') == (
+            {'message': 'Collection not found'}, 404)
+
+
+def test_batch_result_splits_statuses():
+    rows = [{'track_id': 1, 'status': 'added'}, {'track_id': 2, 'status': 'already_present'},
+            {'track_id': 3, 'status': 'not_found'}]
+    assert batch_result(rows, ('added', 'already_present'), 'Missing') == (
+        {'succeeded': [1, 2], 'rejected': [{'track_id': 3, 'reason': 'not_found'}]}, 200)
+
+
+def test_int_param():
+    assert int_param(MultiDict({'user_id': '42'}), 'user_id') == 42
+    assert int_param(MultiDict({'user_id': ''}), 'user_id') is None
+    assert int_param(MultiDict(), 'user_id') is None
+
+
+@pytest.mark.parametrize('value', ['abc', '1.5', str(2 ** 31)])
+def test_int_param_rejects_invalid(value):
+    with pytest.raises(ValueError):
+        int_param(MultiDict({'record_id': value}), 'record_id')
@@ -0,0 +1,48 @@
+"""
+Тесты минификации клиентских файлов (build_assets.py)
+"""
+
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from build_assets import SOURCE_DIR, minify_css, minify_js
+
+
+def test_comments_are_removed_but_strings_kept():
+    source = "const url = 'http://x/y'; // comment\nlet s = \"a /* not */ b\";\n/* block */ f();\n"
+    assert minify_js(source) == 'const url=\'http://x/y\';let s="a /* not */ b";f();\n'
+
+
+def test_template_literals_with_nested_expressions():
+    source = "const t = `a  ${ {x: 1}.x }  b ${`in ${ y }`}`;\n"
+    assert minify_js(source) == 'const t=`a  ${{x:1}.x}  b ${`in ${y}`}`;\n'
+
+
+def test_regex_and_division():
+    source = "const r = /[/]\\/ab/g.test(s);\nconst d = a / b / c;\nreturn /x y/.test(q)\n"
+    assert minify_js(source) == 'const r=/[/]\\/ab/g.test(s);const d=a / b / c;return /x y/.test(q)\n'
+
+
+def test_newlines_kept_where_asi_applies():
+    source = "let a = b\n++c\nx = y + +z\nfoo(\n  1,\n  2\n)\n"
+    assert minify_js(source) == 'let a=b\n++c\nx=y + +z\nfoo(1,2\n)\n'
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_minified_client_script_is_valid(tmp_path):
+    with open(os.path.join(SOURCE_DIR, 'script.js'), encoding='utf-8') as f:
+        minified = minify_js(f.read())
+    path = tmp_path / 'script.min.js'
+    path.write_text(minified, encoding='utf-8')
+    result = subprocess.run(['node', '--check', str(path)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def test_minify_css():
+    source = ("/* c */\n.a > .b , .c {\n  color : red ;\n  margin: 0 auto;\n}\n"
+              "@media screen and (max-width: 600px) { .a { display: none; } }\n")
+    assert minify_css(source) == ('.a>.b,.c{color:red;margin:0 auto}'
+                                  '@media screen and (max-width:600px){.a{display:none}}\n')
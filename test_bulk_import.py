@@ -0,0 +1,108 @@
+"""
+Тесты разбора и проверки строк массового импорта треков (bulk_import.py)
+"""
+
+import csv
+import io
+
+import pytest
+
+from bulk_import import MAX_INTEGER, CopySource, iter_records, validate_record
+
+
+def record(**fields):
+    base = {'title': 'Song', 'artist': 'Artist', 'genre': 'Rock', 'bpm': '120', 'duration_sec': '200'}
+    base.update(fields)
+    return base
+
+
+def copy_rows(records, max_errors=10):
+    """Прочитать CopySource небольшими порциями и разобрать результат как CSV"""
+    source = CopySource(iter(records), max_errors)
+    chunks = []
+    while True:
+        chunk = source.read(7)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    text = b''.join(chunks).decode('utf-8')
+    return source, list(csv.reader(io.StringIO(text, newline='')))
+
+
+def test_validate_record_normalizes_fields():
+    assert validate_record(record(title='  Song  ', bpm='', duration_sec=None)) == \
+        ('Song', 'Artist', 'Rock', None, None)
+    assert validate_record(record(bpm=128, duration_sec=180.0)) == ('Song', 'Artist', 'Rock', 128, 180)
+
+
+@pytest.mark.parametrize('fields, message', [
+    ({'title': '   '}, 'title is required'),
+    ({'artist': 5}, 'artist must be a string'),
+    ({'title': 0}, 'title must be a string'),
+    ({'genre': 'x' * 101}, 'genre is longer than 100 characters'),
+    ({'bpm': 'fast'}, 'bpm must be an integer'),
+    ({'bpm': '-1'}, 'bpm must not be negative'),
+    ({'bpm': True}, 'bpm must be an integer'),
+    ({'duration_sec': 12.5}, 'duration_sec must be an integer'),
+    ({'duration_sec': float('inf')}, 'duration_sec must be an integer'),
+    ({'duration_sec': str(MAX_INTEGER + 1)}, f'duration_sec must not exceed {MAX_INTEGER}'),
+])
+def test_validate_record_rejects(fields, message):
+    with pytest.raises(ValueError, match=message):
+        validate_record(record(**fields))
+
+
+def test_validate_record_accepts_int32_maximum():
+    assert validate_record(record(bpm=str(MAX_INTEGER)))[3] == MAX_INTEGER
+
+
+def test_unparsed_line_is_reraised():
+    with pytest.raises(ValueError, match='Invalid JSON'):
+        validate_record(ValueError('Invalid JSON: x'))
+
+
+def test_copy_source_escapes_csv():
+    title = 'Say "Hi", then\nleave, Привет'
+    source, rows = copy_rows([(1, record(title=title, bpm=''))])
+    assert rows == [['1', title, 'Artist', 'Rock', '', '200']]
+    assert source.accepted == 1
+
+
+def test_copy_source_collects_errors():
+    records = [
+        (2, record(bpm='99999999999')),
+        (3, record()),
+        (4, ValueError('Each line must be a JSON object')),
+        (5, record(title='')),
+    ]
+    source, rows = copy_rows(records, max_errors=2)
+    assert [row[0] for row in rows] == ['3']
+    assert (source.accepted, source.rejected) == (1, 3)
+    assert source.errors == [
+        {'line': 2, 'message': f'bpm must not exceed {MAX_INTEGER}'},
+        {'line': 4, 'message': 'Each line must be a JSON object'},
+    ]
+
+
+def test_iter_records_csv_and_ndjson():
+    csv_stream = io.BytesIO('title,artist,genre,bpm,duration_sec\nA,B,C,1,2\n'.encode())
+    assert [(n, r['title']) for n, r in iter_records(csv_stream, 'text/csv')] == [(2, 'A')]
+    ndjson = io.BytesIO(b'{"title": "A"}\n\nnot json\n[1]\n')
+    parsed = list(iter_records(ndjson, 'application/x-ndjson'))
+    assert parsed[0] == (1, {'title': 'A'})
+    assert [n for n, _ in parsed] == [1, 3, 4]
+    assert all(isinstance(r, ValueError) for _, r in parsed[1:])
+
+
+def test_invalid_utf8_csv_row_is_rejected():
+    stream = io.BytesIO(b'title,artist,genre\nGood,B,C\n\xff\xfe,B,C\nNext,B,C\n')
+    source, rows = copy_rows(iter_records(stream, 'text/csv'))
+    assert [row[1] for row in rows] == ['Good', 'Next']
+    assert source.errors == [{'line': 3, 'message': 'Line is not valid UTF-8'}]
+
+
+def test_invalid_utf8_ndjson_line_is_rejected():
+    stream = io.BytesIO(b'{"title": "A", "artist": "B", "genre": "C"}\n{"title": "\xff"}\n')
+    source, rows = copy_rows(iter_records(stream, 'application/x-ndjson'))
+    assert [row[0] for row in rows] == ['1']
+    assert source.errors == [{'line': 2, 'message': 'Line is not valid UTF-8'}]
@@ -0,0 +1,118 @@
+"""
+Тесты кэшей в памяти процесса (cache.py)
+"""
+
+from collections import namedtuple
+
+import pytest
+
+import cache
+from cache import NotificationListener, ReferenceDataCache, TTLCache
+
+Notify = namedtuple('Notify', 'channel payload')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
+
+
+def test_ttl_cache_expiry(clock):
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set('a', 1)
+    clock.now += 59
+    assert ttl_cache.get('a') == 1
+    clock.now += 2
+    assert ttl_cache.get('a') is None
+    assert ttl_cache.stats()['size'] == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    ttl_cache = TTLCache(maxsize=2, ttl=60)
+    ttl_cache.set('a', 1)
+    ttl_cache.set('b', 2)
+    ttl_cache.get('a')
+    ttl_cache.set('c', 3)
+    assert ttl_cache.get('b') is None
+    assert ttl_cache.get('a') == 1
+    assert ttl_cache.get('c') == 3
+
+
+def test_ttl_cache_stats():
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    ttl_cache.set('a', 1)
+    ttl_cache.get('a')
+    ttl_cache.get('b')
+    stats = ttl_cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
+
+
+def test_ttl_cache_skips_value_loaded_before_invalidation():
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    version = ttl_cache.version()
+    # Другой процесс изменил запись, пока она загружалась
+    ttl_cache.invalidate('a')
+    ttl_cache.set('a', 'stale', version)
+    assert ttl_cache.get('a') is None
+    ttl_cache.set('a', 'fresh', ttl_cache.version())
+    assert ttl_cache.get('a') == 'fresh'
+
+
+def test_ttl_cache_clear_changes_version():
+    ttl_cache = TTLCache(maxsize=10, ttl=60)
+    version = ttl_cache.version()
+    ttl_cache.clear()
+    assert ttl_cache.version() != version
+
+
+def test_reference_cache_etag_and_invalidation():
+    reference_cache = ReferenceDataCache(ttl=60)
+    loads = []
+
+    def loader():
+        loads.append(1)
+        return b'[1]'
+
+    body, etag = reference_cache.get('genres', loader)
+    assert reference_cache.get('genres', loader) == (body, etag)
+    assert len(loads) == 1
+    reference_cache.invalidate('genres')
+    assert reference_cache.get('genres', loader)[1] == etag
+    assert len(loads) == 2
+
+
+def test_reference_cache_drops_snapshot_invalidated_while_loading():
+    reference_cache = ReferenceDataCache(ttl=60)
+
+    def loader():
+        reference_cache.invalidate('artists')
+        return b'[]'
+
+    reference_cache.get('artists', loader)
+    assert reference_cache.stats()['entries'] == 0
+
+
+def test_listener_dispatches_by_channel():
+    listener = NotificationListener(connect=None)
+    received = []
+    resets = []
+    listener.subscribe('user_changed', received.append, lambda: resets.append('user'))
+    listener.subscribe('reference_data', lambda payload: received.append(('ref', payload)),
+                       lambda: resets.append('ref'))
+    listener._dispatch(Notify('user_changed', '42'))
+    listener._dispatch(Notify('reference_data', 'genres'))
+    listener._dispatch(Notify('other', 'x'))
+    assert received == ['42', ('ref', 'genres')]
+    listener._reset()
+    assert sorted(resets) == ['ref', 'user']
+    assert not listener.connected
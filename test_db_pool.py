@@ -0,0 +1,128 @@
+"""
+Тесты пула соединений (db_pool.py) без базы данных: соединения подменяются
+объектами с нужным подмножеством интерфейса psycopg2
+"""
+
+import threading
+
+import pytest
+from psycopg2 import extensions
+
+from db_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeInfo:
+    def __init__(self):
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = True
+        self.info = FakeInfo()
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(minconn=0, maxconn=2, timeout=0.1, **kwargs):
+    pool = ConnectionPool(minconn, maxconn, timeout, **kwargs)
+    pool.opened = []
+
+    def connect():
+        conn = FakeConnection()
+        pool.opened.append(conn)
+        return conn
+
+    pool._connect = connect
+    return pool
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        ConnectionPool(3, 2, 1.0)
+    with pytest.raises(ValueError):
+        ConnectionPool(0, 0, 1.0)
+
+
+def test_connections_are_reused():
+    pool = make_pool()
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert len(pool.opened) == 1
+
+
+def test_checkout_times_out_at_max_size():
+    pool = make_pool(maxconn=1, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiter_gets_returned_connection():
+    pool = make_pool(maxconn=1, timeout=2.0)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    pool.putconn(conn)
+    waiter.join(2.0)
+    assert got == [conn]
+    assert pool.stats()['waits'] == 1
+
+
+def test_open_transaction_is_rolled_back_on_return():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+    conn.autocommit = False
+    pool.putconn(conn)
+    assert conn.rollbacks == 1
+    assert conn.autocommit is True
+
+
+def test_closed_connection_is_discarded():
+    pool = make_pool()
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+    assert pool.stats()['idle'] == 0
+    assert pool.getconn() is not conn
+
+
+def test_stale_connection_is_replaced():
+    pool = make_pool(validate_after=0.0)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    # Проверка SELECT 1 не проходит: соединение закрыто сервером
+    conn.closed = 2
+    fresh = pool.getconn()
+    assert fresh is not conn
+    assert pool.stats()['in_use'] == 1
+
+
+def test_resize_closes_idle_above_maximum():
+    pool = make_pool(maxconn=3)
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        pool.putconn(conn)
+    pool.resize(0, 1)
+    assert pool.stats()['idle'] == 1
+    assert sum(1 for conn in conns if conn.closed) == 2
+
+
+def test_closeall_refuses_checkouts():
+    pool = make_pool()
+    pool.putconn(pool.getconn())
+    pool.closeall()
+    assert all(conn.closed for conn in pool.opened)
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
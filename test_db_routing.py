@@ -0,0 +1,66 @@
+"""
+Тесты маршрутизации чтения на реплику с гарантией read-your-writes (db_routing.py)
+"""
+
+import asyncio
+
+import pytest
+
+from db_routing import ReadYourWrites, format_lsn, parse_lsn
+
+
+def test_parse_lsn_compares_numerically():
+    # Строковое сравнение дало бы обратный порядок: '9/0' > '10/0'
+    assert parse_lsn('10/0') > parse_lsn('9/FFFFFFFF')
+    assert parse_lsn('0/A') > parse_lsn('0/9')
+    assert parse_lsn('16/B374D848') == (0x16 << 32) | 0xB374D848
+
+
+def test_format_lsn_round_trip():
+    assert format_lsn(parse_lsn('16/B374D848')) == '16/B374D848'
+    assert parse_lsn(format_lsn(0)) == 0
+
+
+@pytest.mark.parametrize('text', ['', 'garbage', '1/2/3', 'G/0', '1/'])
+def test_parse_lsn_rejects_malformed(text):
+    with pytest.raises(ValueError):
+        parse_lsn(text)
+
+
+def test_required_lsn_takes_latest_write_and_cookie():
+    routing = ReadYourWrites(ttl=60, max_wait=0)
+    assert routing.required_lsn(1) is None
+    routing.record_write(1, parse_lsn('0/200'))
+    routing.record_write(1, parse_lsn('0/100'))
+    assert routing.required_lsn(1) == parse_lsn('0/200')
+    assert routing.required_lsn(1, cookie='0/300') == parse_lsn('0/300')
+    # Поддельная cookie игнорируется
+    assert routing.required_lsn(1, cookie='not-an-lsn') == parse_lsn('0/200')
+    assert routing.required_lsn(None, cookie='1/0') == parse_lsn('1/0')
+
+
+def test_wait_for_replay_polls_until_caught_up():
+    routing = ReadYourWrites(ttl=60, max_wait=1.0, poll_interval=0.001)
+    positions = iter(['0/100', '0/1FF', '0/200'])
+    assert routing.wait_for_replay(lambda: next(positions), parse_lsn('0/200'))
+    assert routing.stats()['waits'] == 1
+
+
+def test_wait_for_replay_gives_up_after_max_wait():
+    routing = ReadYourWrites(ttl=60, max_wait=0.01, poll_interval=0.005)
+    assert not routing.wait_for_replay(lambda: '0/1', parse_lsn('0/2'))
+
+
+def test_replica_not_in_recovery_counts_as_caught_up():
+    routing = ReadYourWrites(ttl=60, max_wait=0)
+    assert routing.wait_for_replay(lambda: None, parse_lsn('FF/0'))
+
+
+def test_await_replay():
+    routing = ReadYourWrites(ttl=60, max_wait=1.0, poll_interval=0.001)
+    positions = iter(['0/1', '0/2'])
+
+    async def fetch():
+        return next(positions)
+
+    assert asyncio.run(routing.await_replay(fetch, parse_lsn('0/2')))
@@ -0,0 +1,70 @@
+"""
+Тесты вывода метрик в текстовом формате Prometheus (metrics.py)
+"""
+
+import os
+
+from metrics import Registry
+
+
+def test_counter_rendering_and_label_escaping():
+    registry = Registry()
+    counter = registry.counter('requests_total', 'Requests by "route"\nand status', ('route', 'status'))
+    counter.inc(('/api/b', '200'))
+    counter.inc(('/api/a"\\x\ny', '404'), 2)
+    counter.inc(('/api/b', '200'))
+    assert registry.render() == (
+        '# HELP requests_total Requests by \\"route\\"\\nand status\n'
+        '# TYPE requests_total counter\n'
+        'requests_total{route="/api/a\\"\\\\x\\ny",status="404"} 2\n'
+        'requests_total{route="/api/b",status="200"} 2\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram('latency_seconds', 'Latency', ('route',), buckets=(0.5, 0.1))
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(('/x',), value)
+    lines = registry.render().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{route="/x",le="0.1"} 2',
+        'latency_seconds_bucket{route="/x",le="0.5"} 3',
+        'latency_seconds_bucket{route="/x",le="+Inf"} 4',
+        'latency_seconds_sum{route="/x"} 2.45',
+        'latency_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_callback_is_read_at_render_time():
+    registry = Registry()
+    state = {'idle': 1}
+    registry.callback('pool_connections', 'Connections', 'gauge', ('state',),
+                      lambda: {(name,): value for name, value in state.items()})
+    registry.callback('listener_connected', 'Listener', 'gauge', (), lambda: {(): 1})
+    state['in_use'] = 3
+    assert registry.render().splitlines() == [
+        '# HELP pool_connections Connections',
+        '# TYPE pool_connections gauge',
+        'pool_connections{state="idle"} 1',
+        'pool_connections{state="in_use"} 3',
+        '# HELP listener_connected Listener',
+        '# TYPE listener_connected gauge',
+        'listener_connected 1',
+    ]
+
+
+def test_process_label_is_added_to_every_series():
+    registry = Registry(process_label='pid')
+    registry.counter('requests_total', 'Requests', ('route',)).inc(('/x',))
+    registry.histogram('latency_seconds', 'Latency', (), buckets=(1,)).observe((), 0.5)
+    registry.callback('pool_max', 'Pool', 'gauge', (), lambda: {(): 4})
+    pid = 'pid="%d"' % os.getpid()
+    assert [line for line in registry.render().splitlines() if not line.startswith('#')] == [
+        'requests_total{route="/x",%s} 1' % pid,
+        'latency_seconds_bucket{%s,le="1"} 1' % pid,
+        'latency_seconds_bucket{%s,le="+Inf"} 1' % pid,
+        'latency_seconds_sum{%s} 0.5' % pid,
+        'latency_seconds_count{%s} 1' % pid,
+        'pool_max{%s} 4' % pid,
+    ]
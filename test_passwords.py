@@ -0,0 +1,64 @@
+"""
+Тесты хэширования паролей в пуле потоков (passwords.py)
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from passwords import PasswordHasher, PasswordPoolBusy, is_legacy_hash
+
+# Мало итераций, чтобы тесты не тратили время на стойкость хэша
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=2, max_pending=2, method=FAST_METHOD)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    stored = hasher.hash('secret')
+    assert stored.startswith('pbkdf2:sha256:1000$')
+    assert hasher.verify(stored, 'secret')
+    assert not hasher.verify(stored, 'Secret')
+
+
+def test_async_hash_and_verify(hasher):
+    async def run():
+        stored = await hasher.ahash('secret')
+        return await hasher.averify(stored, 'secret'), await hasher.averify(stored, 'other')
+
+    assert asyncio.run(run()) == (True, False)
+
+
+@pytest.mark.parametrize('stored, legacy', [
+    ('pbkdf2:sha256:600000$salt$hash', False),
+    ('scrypt:32768:8:1$salt$hash', False),
+    ('\\xc30d04070302', True),
+    ('', True),
+])
+def test_is_legacy_hash(stored, legacy):
+    assert is_legacy_hash(stored) is legacy
+
+
+def test_full_queue_is_rejected(hasher):
+    release = threading.Event()
+    blocked = [hasher._submit(release.wait) for _ in range(hasher.max_pending)]
+    with pytest.raises(PasswordPoolBusy):
+        hasher.hash('secret')
+    release.set()
+    for future in blocked:
+        future.result(timeout=5)
+    # Слот освобождается в done-callback, который может выполниться после result()
+    deadline = time.monotonic() + 5
+    while hasher.stats()['pending'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = hasher.stats()
+    assert (stats['rejected'], stats['pending']) == (1, 0)
+    # Слоты освобождены: следующая операция принимается
+    assert hasher.verify(hasher.hash('secret'), 'secret')
@@ -0,0 +1,73 @@
+"""
+Тесты выбора собранных клиентских файлов и их сжатых вариантов (static_assets.py)
+"""
+
+import json
+
+import pytest
+
+from static_assets import IMMUTABLE, MANIFEST_NAME, REVALIDATE, StaticAssets, accepted_encodings
+
+
+@pytest.mark.parametrize('header, expected', [
+    (None, set()),
+    ('', set()),
+    ('gzip, br', {'gzip', 'br'}),
+    ('GZIP;q=0.5, br;q=1.0', {'gzip', 'br'}),
+    ('br;q=0, gzip', {'gzip'}),
+    ('br; q=0.0, gzip;q=0.001', {'gzip'}),
+    ('gzip;q=abc', set()),
+    ('*', {'gzip', 'br'}),
+    ('*;q=0.5, br;q=0', {'gzip'}),
+    ('*;q=0, gzip', {'gzip'}),
+    ('identity, deflate', {'identity', 'deflate'}),
+])
+def test_accepted_encodings(header, expected):
+    assert accepted_encodings(header) == expected
+
+
+@pytest.fixture
+def assets(tmp_path):
+    source = tmp_path / 'client'
+    build = source / 'dist'
+    build.mkdir(parents=True)
+    (build / MANIFEST_NAME).write_text(json.dumps({'pages': ['index.html']}), encoding='utf-8')
+    for name in ('index.html', 'index.html.gz', 'script.0123abcd.js', 'script.0123abcd.js.br',
+                 'script.0123abcd.js.gz', 'styles.89abcdef.css'):
+        (build / name).write_bytes(b'x')
+    return StaticAssets(str(source), str(build))
+
+
+def test_hashed_file_prefers_brotli(assets):
+    static = assets.lookup('script.0123abcd.js', 'gzip, br')
+    assert static.filename == 'script.0123abcd.js.br'
+    assert static.mimetype in ('application/javascript', 'text/javascript')
+    assert static.headers == {'Cache-Control': IMMUTABLE, 'Vary': 'Accept-Encoding',
+                              'Content-Encoding': 'br'}
+
+
+def test_refused_coding_falls_back(assets):
+    assert assets.lookup('script.0123abcd.js', 'br;q=0, gzip').filename == 'script.0123abcd.js.gz'
+    static = assets.lookup('script.0123abcd.js', 'identity')
+    assert static.filename == 'script.0123abcd.js'
+    assert 'Content-Encoding' not in static.headers
+    # Для файла без сжатых вариантов выдается сам файл
+    assert assets.lookup('styles.89abcdef.css', 'br, gzip').filename == 'styles.89abcdef.css'
+
+
+def test_pages_are_revalidated(assets):
+    static = assets.page('index.html', 'gzip')
+    assert static.filename == 'index.html.gz'
+    assert static.headers['Cache-Control'] == REVALIDATE
+
+
+@pytest.mark.parametrize('filename', ['missing.js', MANIFEST_NAME, '../secret', 'sub/file.js', '.hidden'])
+def test_non_build_files_are_not_served(assets, filename):
+    assert assets.lookup(filename, 'gzip') is None
+
+
+def test_without_build_pages_come_from_source(tmp_path):
+    assets = StaticAssets(str(tmp_path), str(tmp_path / 'dist'))
+    assert not assets.built
+    assert assets.lookup('script.js', 'gzip') is None
+    assert assets.page('index.html', 'gzip') == (str(tmp_path), 'index.html', None, {})